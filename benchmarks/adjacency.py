@@ -0,0 +1,107 @@
+"""
+Benchmark the hot paths that touch a member's children and partners -
+loading rows the way ``CacheHandler.cache_setup`` does, disowning (all at
+once and one at a time), and iterating children and partners.
+
+Run from the repository root with ``python -m benchmarks.adjacency``. To
+compare two versions, run it on each of them.
+"""
+
+from __future__ import annotations
+
+import time
+
+from cogs.cache_handler import CacheHandler
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+from benchmarks.families import reset_family_cache
+
+
+MARRIAGE_COUNT = 200_000
+PARENT_COUNT = 199
+CHILDREN_PER_PARENT = 1_000
+DISOWNALL_USERS = 20
+ITERATIONS = 200
+
+
+def best_of(label: str, func, repeats: int = 1) -> None:
+    """
+    Print the best time out of a number of runs of a function.
+    """
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:55} {best * 1000:9.1f}ms")
+
+
+def main():
+
+    # Rows for a large cache_setup - couples with no children, and a few
+    # parents with a lot of children each
+    marriages = [
+        {"user_id": i, "partner_id": i + 1, "guild_id": 0}
+        for i in range(1, MARRIAGE_COUNT * 2, 2)
+    ]
+    parents = []
+    child_id = 10 ** 7
+    for parent_id in range(1, PARENT_COUNT + 1):
+        for _ in range(CHILDREN_PER_PARENT):
+            parents.append({"parent_id": parent_id, "child_id": child_id, "guild_id": 0})
+            child_id += 1
+
+    def cache_setup():
+        reset_family_cache()
+        for row in marriages:
+            CacheHandler.handle_partner(row)
+        for row in parents:
+            CacheHandler.handle_parent(row)
+
+    best_of(
+        f"cache_setup ({len(marriages)} marriages, {len(parents)} parents)",
+        cache_setup,
+    )
+
+    # Disownall does the same as the command
+    def disownall():
+        for parent_id in range(1, DISOWNALL_USERS + 1):
+            user = FamilyTreeMember.get(parent_id)
+            for child in list(user.children):
+                child.parent = None
+            user.children = []
+
+    best_of(
+        f"disownall on {DISOWNALL_USERS} users with {CHILDREN_PER_PARENT} children",
+        disownall,
+    )
+
+    # Disowning one at a time does the same as the disown command
+    def disown_each():
+        user = FamilyTreeMember.get(DISOWNALL_USERS + 1)
+        for child in list(user.children):
+            user.remove_child(child)
+            child.parent = None
+
+    best_of(f"disown {CHILDREN_PER_PARENT} children one at a time", disown_each)
+
+    # And reading the relations back, as the tree walks do
+    user = FamilyTreeMember.get(DISOWNALL_USERS + 2)
+
+    def iterate():
+        for _ in range(ITERATIONS):
+            for _ in user.children:
+                pass
+            for _ in user.partners:
+                pass
+
+    best_of(
+        f"iterate children and partners x{ITERATIONS} ({CHILDREN_PER_PARENT} children)",
+        iterate,
+        repeats=3,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compare the memory used by the compact family store against caching the
+same rows as :class:`FamilyTreeMember` objects.
+
+Run from the repository root with ``python -m benchmarks.compact_store``,
+optionally giving the user counts to try (eg ``... 10000 100000``). Build
+times are taken with tracemalloc running, so they're only good for
+comparing the two layouts with each other.
+"""
+
+from __future__ import annotations
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from cogs.utils.family_tree.compact_store import CompactFamilyStore
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+from benchmarks.families import family_rows, reset_family_cache
+
+
+USER_COUNTS = (10_000, 100_000, 500_000)
+FAMILY_SIZE = 50
+
+
+def make_rows(user_count: int):
+    """
+    Make marriages and parents rows for families of ``FAMILY_SIZE`` people,
+    spread over a handful of guilds.
+    """
+
+    partnerships, parents = [], []
+    for family in range(user_count // FAMILY_SIZE):
+        guild_id = family % 4
+        family_partnerships, family_parents = family_rows(
+            FAMILY_SIZE, first_id=family * FAMILY_SIZE + 1, seed=family,
+        )
+        partnerships.extend(
+            {"guild_id": guild_id, "user_id": a, "partner_id": b}
+            for a, b in family_partnerships
+        )
+        parents.extend(
+            {"guild_id": guild_id, "parent_id": a, "child_id": b}
+            for a, b in family_parents
+        )
+    return partnerships, parents
+
+
+def cache_members(partnerships, parents) -> None:
+    """
+    Cache rows the way ``CacheHandler.handle_partner`` and
+    ``CacheHandler.handle_parent`` do.
+    """
+
+    for row in partnerships:
+        user = FamilyTreeMember.get(row["user_id"], row["guild_id"])
+        partner = user.add_partner(row["partner_id"], return_added=True)
+        partner.add_partner(user)
+    for row in parents:
+        parent = FamilyTreeMember.get(row["parent_id"], row["guild_id"])
+        child = parent.add_child(row["child_id"], return_added=True)
+        child.parent = parent
+
+
+def measure(func, *args):
+    """
+    Run a function, giving back what it returned, how many bytes it left
+    allocated, the peak bytes allocated while it ran, and how long it took.
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, elapsed
+
+
+def main():
+    user_counts = [int(i) for i in sys.argv[1:]] or USER_COUNTS
+    mib = 1024 * 1024
+    print(f"{'users':>8} {'layout':8} {'held':>10} {'peak':>10} {'build':>8}")
+    for user_count in user_counts:
+        partnerships, parents = make_rows(user_count)
+
+        reset_family_cache()
+        _, current, peak, elapsed = measure(cache_members, partnerships, parents)
+        print(f"{user_count:8} {'members':8} {current / mib:8.1f}MB {peak / mib:8.1f}MB {elapsed:7.2f}s")
+        reset_family_cache()
+
+        store, current, peak, elapsed = measure(CompactFamilyStore.from_rows, partnerships, parents)
+        print(
+            f"{user_count:8} {'compact':8} {current / mib:8.1f}MB {peak / mib:8.1f}MB {elapsed:7.2f}s"
+            f" ({store.nbytes() / mib:.1f}MB of arrays)"
+        )
+        del store
+
+
+if __name__ == "__main__":
+    main()
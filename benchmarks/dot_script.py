@@ -0,0 +1,173 @@
+"""
+Benchmark building the DOT script for ``tree`` and ``fulltree`` on 500,
+2000 and 5000 member families, against the string-scanning builder that
+:func:`FamilyTreeMember.to_dot_script_from_generational_span` replaced.
+
+Everyone in the families is descended from the same root (or is the
+partner of someone who is), so ``tree`` draws all of them. Everyone's name is put in the name cache first, so nothing is fetched
+from Redis or Discord while timing.
+
+Run from the repository root with ``python -m benchmarks.dot_script``.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List
+import asyncio
+import random
+import string
+import time
+
+from cogs.utils.customised_tree_user import CustomisedTreeUser
+from cogs.utils.discord_name_manager import DiscordNameManager
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+from benchmarks.families import build_family, reset_family_cache
+
+
+FAMILY_SIZES = (500, 2_000, 5_000)
+REPEATS = 3
+
+
+async def old_to_dot_script_from_generational_span(
+        self: FamilyTreeMember,
+        bot,
+        gen_span: Dict[int, List[FamilyTreeMember]],
+        customised_tree_user: CustomisedTreeUser) -> str:
+    """
+    The DOT builder that the current one replaced, which builds one
+    string with ``+=`` and checks for duplicate edges by searching it.
+    """
+
+    # Find my own depth
+    my_depth: int = 0
+    for depth, depth_list in gen_span.items():
+        if self in depth_list:
+            my_depth = depth
+            break
+
+    # Add my partner and parent
+    for partner in self.partners:
+        if partner not in (x := gen_span.get(my_depth, [])):
+            x.append(partner)
+            gen_span[my_depth] = x
+    if (parent := self.parent):
+        if parent not in (x := gen_span.get(my_depth - 1, [])):
+            x.append(parent)
+            gen_span[my_depth - 1] = x
+
+    ctu = customised_tree_user
+    all_text: str = (
+        "digraph {"
+        f"node [shape=box,fontcolor={ctu.hex['font']},"
+        f"color={ctu.hex['edge']},"
+        f"fillcolor={ctu.hex['node']},style=filled];"
+        f"edge [dir=none,color={ctu.hex['edge']}];"
+        f"bgcolor={ctu.hex['background']};"
+        f"rankdir={ctu.hex['direction']};"
+    )
+    for generation_number in sorted(list(gen_span.keys())):
+        if (generation := gen_span.get(generation_number)) is None:
+            continue
+        added_already: List[FamilyTreeMember] = []
+        for person in generation:
+            if person in added_already:
+                continue
+            added_already.append(person)
+            previous_partner = None
+            filtered_possible_partners = [*person.partners]
+            for p in filtered_possible_partners.copy():
+                filtered_possible_partners.extend(p.partners)
+            filtered_possible_partners = [*list(set(filtered_possible_partners))]
+            try:
+                filtered_possible_partners.remove(person)
+            except ValueError:
+                pass
+            filtered_possible_partners.insert(0, person)
+            cluster_name = "".join(random.choice(string.ascii_uppercase) for _ in range(5))
+            all_text += f"subgraph cluster{cluster_name}{{peripheries=0;{{rank=same;"
+            for partner in filtered_possible_partners:
+                name = (
+                    (await DiscordNameManager.fetch_name_by_id(bot, partner.id))
+                    .replace('"', '\\"')
+                )
+                if partner == self:
+                    all_text += partner.to_graphviz_label(name, ctu)
+                else:
+                    all_text += partner.to_graphviz_label(name)
+                if previous_partner is None:
+                    previous_partner = partner
+                    continue
+                partner_link = f"{previous_partner.id} -> {partner.id};"
+                alt_partner_link = f"{partner.id} -> {previous_partner.id};"
+                if (
+                        partner_link not in all_text
+                        and alt_partner_link not in all_text
+                        and partner != previous_partner):
+                    all_text += partner_link
+                added_already.append(partner)
+                previous_partner = partner
+            all_text += "}" + "}"
+        for person in generation:
+            if person._children:
+                all_text += f"p{person.id} {self.INVISIBLE};"
+        for person in generation:
+            if person._children:
+                new_text = f"{person.id}:s -> p{person.id}:c;"
+                if new_text not in all_text:
+                    all_text += new_text
+            for child in person.children:
+                new_text = f"p{person.id}:c -> {child.id}:n;"
+                if new_text not in all_text:
+                    all_text += new_text
+    all_text += "}"
+    return all_text
+
+
+async def best_of(func) -> float:
+    """
+    Give back the best time out of a few runs of a coroutine function.
+    """
+
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        await func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main():
+    print(f"DOT script build times, best of {REPEATS}")
+    for size in FAMILY_SIZES:
+        reset_family_cache()
+        members = build_family(size, "descendants")
+        for member in members:
+            DiscordNameManager.get(member.id).name = f"user{member.id}"
+        user = members[len(members) // 2]
+        ctu = CustomisedTreeUser(user.id)
+        for full in (False, True):
+            FamilyTreeMember.generation_cache.clear()
+            gen_span, _ = user.get_generations(expand_upwards=full)
+            people = sum(map(len, gen_span.values()))
+
+            async def current():
+                await user.to_dot_script_from_generational_span(
+                    None, {k: list(v) for k, v in gen_span.items()}, ctu,
+                )
+
+            async def old():
+                await old_to_dot_script_from_generational_span(
+                    user, None, {k: list(v) for k, v in gen_span.items()}, ctu,
+                )
+
+            label = "fulltree" if full else "tree"
+            print(
+                f"{size:5} members {label:8} ({people:4} drawn) "
+                f"current {await best_of(current) * 1000:8.1f}ms "
+                f"old {await best_of(old) * 1000:8.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Synthetic families for the benchmarks to run against. Every builder is
+seeded, so the same arguments always give the same family.
+"""
+
+from __future__ import annotations
+
+from typing import List, Set, Tuple
+import random
+
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+
+__all__ = (
+    'reset_family_cache',
+    'build_family',
+    'family_rows',
+)
+
+
+def reset_family_cache() -> None:
+    """
+    Remove every cached family tree member, relation and generation.
+    """
+
+    FamilyTreeMember.all_users.clear()
+    FamilyTreeMember.relation_cache.clear()
+    FamilyTreeMember.generation_cache.clear()
+
+
+def family_rows(
+        size: int,
+        shape: str = "bushy",
+        *,
+        first_id: int = 1,
+        seed: int = 0) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Make the ``(user_id, partner_id)`` and ``(parent_id, child_id)`` pairs
+    for a single connected family.
+
+    Parameters
+    ----------
+    size : int
+        How many people should be in the family.
+    shape : str, optional
+        ``"bushy"`` for a family where each person is the child or partner
+        of someone added shortly before them, ``"descendants"`` for a
+        family where everyone is descended from the first person or is the
+        only partner of someone who is (so the whole family is drawn by
+        ``tree``), or ``"chain"`` for a single line of parents and children.
+    first_id : int, optional
+        The ID of the first person in the family.
+    seed : int, optional
+        The seed for the random choices.
+    """
+
+    rng = random.Random(seed)
+    partnerships: List[Tuple[int, int]] = []
+    parents: List[Tuple[int, int]] = []
+    partnered: Set[int] = set()
+    for index in range(1, size):
+        user_id = first_id + index
+        if shape == "chain":
+            parents.append((user_id - 1, user_id))
+            continue
+        other_id = first_id + rng.randint(max(0, index - 50), index - 1)
+        if shape == "descendants":
+            if other_id not in partnered and rng.random() < 0.2:
+                partnerships.append((other_id, user_id))
+                partnered.update((other_id, user_id))
+            else:
+                parents.append((other_id, user_id))
+            continue
+        if rng.random() < 0.8:
+            parents.append((other_id, user_id))
+        else:
+            partnerships.append((other_id, user_id))
+    return partnerships, parents
+
+
+def build_family(
+        size: int,
+        shape: str = "bushy",
+        *,
+        first_id: int = 1,
+        guild_id: int = 0,
+        seed: int = 0) -> List[FamilyTreeMember]:
+    """
+    Cache a family made by :func:`family_rows`, giving back its members in
+    the order that they were added.
+    """
+
+    partnerships, parents = family_rows(size, shape, first_id=first_id, seed=seed)
+    for user_id, partner_id in partnerships:
+        user = FamilyTreeMember.get(user_id, guild_id)
+        partner = user.add_partner(partner_id, return_added=True)
+        partner.add_partner(user)
+    for parent_id, child_id in parents:
+        parent = FamilyTreeMember.get(parent_id, guild_id)
+        child = parent.add_child(child_id, return_added=True)
+        child.parent = parent
+    return [
+        FamilyTreeMember.get(first_id + index, guild_id)
+        for index in range(size)
+    ]
@@ -0,0 +1,63 @@
+"""
+Benchmark the name cache - filling it past its size (so that it has to
+evict), looking names up, and how much memory it holds once it's full.
+
+Run from the repository root with ``python -m benchmarks.name_cache``.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+
+from cogs.utils.discord_name_manager import DiscordNameManager, NameCache
+
+
+MAX_SIZE = 100_000
+USER_COUNT = 250_000
+LOOKUPS = 1_000_000
+
+
+def timed(label: str, func, count: int) -> None:
+    """
+    Print how long a function took, in total and for each operation.
+    """
+
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:40} {elapsed * 1000:9.1f}ms {elapsed / count * 1e9:8.0f}ns/op")
+
+
+def main():
+    cache = NameCache(max_size=MAX_SIZE)
+    DiscordNameManager.cached_names = cache
+    rng = random.Random(0)
+
+    def fill():
+        for user_id in range(USER_COUNT):
+            DiscordNameManager.get(user_id).name = f"user{user_id}"
+
+    timed(f"set {USER_COUNT} names (max {MAX_SIZE})", fill, USER_COUNT)
+
+    # Most lookups are for recently seen users, some are for ones that
+    # have been evicted
+    user_ids = [
+        USER_COUNT - 1 - int(rng.expovariate(1 / (MAX_SIZE / 4)))
+        for _ in range(LOOKUPS)
+    ]
+
+    def lookup():
+        for user_id in user_ids:
+            cache.get_name(user_id)
+
+    timed(f"{LOOKUPS} lookups", lookup, LOOKUPS)
+    stats = cache.stats()
+    print(
+        f"size {stats['size']}, evictions {stats['evictions']}, "
+        f"hit rate {stats['hit_rate']:.1%}, {stats['bytes'] / 1024 / 1024:.1f}MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark the breadth-first relation search against the depth-first one
+that it replaced, over the same random families and cross-family pairs
+that ``tests/test_relations.py`` checks them on. Every ordered pair of
+people is looked up, both for the raw steps and for the simplified
+relation string (with the relation cache cleared, so each one is
+searched for).
+
+Run from the repository root with ``python -m benchmarks.relations``.
+"""
+
+from __future__ import annotations
+
+from typing import List, Tuple
+import itertools
+import time
+
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+from benchmarks.families import reset_family_cache
+from tests.families import make_random_family
+from tests.reference import RelationshipStringSimplifier, get_unshortened_relation
+
+
+FAMILY_SIZES = (40, 100)
+SEEDS = range(5)
+CROSS_FAMILY_SIZE = 15
+REPEATS = 3
+
+
+def best_of(func) -> float:
+    """
+    Give back the best time out of a few runs of a function.
+    """
+
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare(label: str, pairs: List[Tuple[FamilyTreeMember, FamilyTreeMember]]) -> None:
+    """
+    Time both searches over every pair and print the speedup.
+    """
+
+    def old_steps():
+        for user, target in pairs:
+            get_unshortened_relation(user, target)
+
+    def new_steps():
+        for user, target in pairs:
+            user.get_relation_steps(target)
+
+    def old_relation():
+        for user, target in pairs:
+            if (relation := get_unshortened_relation(user, target)) is not None:
+                RelationshipStringSimplifier.simplify(relation)
+
+    def new_relation():
+        FamilyTreeMember.relation_cache.clear()
+        for user, target in pairs:
+            user.get_relation(target)
+
+    for name, old, new in (
+            ("steps", old_steps, new_steps),
+            ("relation", old_relation, new_relation)):
+        old_time, new_time = best_of(old), best_of(new)
+        print(
+            f"{label:32} {name:8} ({len(pairs):6} pairs) "
+            f"depth-first {old_time * 1000:8.1f}ms "
+            f"breadth-first {new_time * 1000:8.1f}ms "
+            f"({old_time / new_time:5.1f}x)"
+        )
+
+
+def main():
+    print(f"Relation search times, best of {REPEATS}")
+    for size in FAMILY_SIZES:
+        for seed in SEEDS:
+            reset_family_cache()
+            users = [FamilyTreeMember.get(i) for i in make_random_family(size, 1, seed)]
+            compare(f"random family of {size} (seed {seed})", list(itertools.permutations(users, 2)))
+
+    reset_family_cache()
+    family_a = [FamilyTreeMember.get(i) for i in make_random_family(CROSS_FAMILY_SIZE, 1, 0)]
+    family_b = [FamilyTreeMember.get(i) for i in make_random_family(CROSS_FAMILY_SIZE, 100, 1)]
+    compare(
+        f"cross-family pairs ({CROSS_FAMILY_SIZE} + {CROSS_FAMILY_SIZE})",
+        list(itertools.product(family_a, family_b)) + list(itertools.product(family_b, family_a)),
+    )
+    reset_family_cache()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark :func:`FamilyTreeMember.span` and
+:func:`FamilyTreeMember.generational_span` against the recursive versions
+that they replaced, on 2000 member families.
+
+Run from the repository root with ``python -m benchmarks.span``.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Set
+import timeit
+
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+from benchmarks.families import build_family, reset_family_cache
+
+
+FAMILY_SIZE = 2_000
+REPEATS = 5
+
+
+def recursive_span(
+        member: FamilyTreeMember,
+        people_list: Optional[Set[FamilyTreeMember]] = None,
+        add_parent: bool = False,
+        expand_upwards: bool = False) -> Iterable[FamilyTreeMember]:
+    """
+    The recursive ``span`` that the explicit stack walk replaced.
+    """
+
+    if people_list is None:
+        people_list = set()
+    if member in people_list:
+        return
+    people_list.add(member)
+    yield member
+    if expand_upwards and add_parent and member._parent:
+        assert member.parent
+        yield from recursive_span(member.parent, people_list, True, expand_upwards)
+    for child in member.children:
+        yield from recursive_span(child, people_list, False, expand_upwards)
+    for partner in member.partners:
+        yield from recursive_span(partner, people_list, True, expand_upwards)
+
+
+def recursive_generational_span(
+        member: FamilyTreeMember,
+        people_dict: Optional[Dict[int, List[FamilyTreeMember]]] = None,
+        depth: int = 0,
+        add_parent: bool = False,
+        add_partners: bool = True,
+        expand_upwards: bool = False,
+        all_people: Optional[Set[int]] = None,
+        recursive_depth: int = 0) -> Dict[int, List[FamilyTreeMember]]:
+    """
+    The recursive ``generational_span`` that the explicit stack walk
+    replaced, including its cut off at 500 levels of recursion.
+    """
+
+    if people_dict is None:
+        people_dict = {}
+    if all_people is None:
+        all_people = set()
+    if member.id in all_people or recursive_depth >= 500:
+        return people_dict
+    all_people.add(member.id)
+    people_dict.setdefault(depth, []).append(member)
+    for child in member.children:
+        recursive_generational_span(
+            child, people_dict, depth + 1, False, True,
+            expand_upwards, all_people, recursive_depth + 1,
+        )
+    if add_partners:
+        for partner in member.partners:
+            recursive_generational_span(
+                partner, people_dict, depth, True, False,
+                expand_upwards, all_people, recursive_depth + 1,
+            )
+    if expand_upwards and add_parent and member._parent:
+        assert member.parent
+        recursive_generational_span(
+            member.parent, people_dict, depth - 1, True, True,
+            expand_upwards, all_people, recursive_depth + 1,
+        )
+    return people_dict
+
+
+def time_call(func) -> str:
+    """
+    Time a function, giving back the best time per call and how many
+    people it found (or the error that it raised).
+    """
+
+    try:
+        found = func()
+        best = min(timeit.repeat(func, number=1, repeat=REPEATS))
+    except RecursionError:
+        return "RecursionError"
+    return f"{best * 1000:8.2f}ms ({found} people)"
+
+
+def main():
+    print(f"span and generational_span on {FAMILY_SIZE} member families, best of {REPEATS}")
+    for shape in ("bushy", "chain"):
+        reset_family_cache()
+        members = build_family(FAMILY_SIZE, shape)
+        member = members[len(members) // 2]
+        root = member.get_root()
+        benchmarks = (
+            (
+                "span",
+                lambda: sum(1 for _ in member.span(add_parent=True, expand_upwards=True)),
+                lambda: sum(1 for _ in recursive_span(member, add_parent=True, expand_upwards=True)),
+            ),
+            (
+                "generational_span",
+                lambda: sum(map(len, root.generational_span(add_parent=True, expand_upwards=True).values())),
+                lambda: sum(map(len, recursive_generational_span(root, add_parent=True, expand_upwards=True).values())),
+            ),
+        )
+        for name, current, recursive in benchmarks:
+            print(f"{shape:5} {name:17} stack     {time_call(current)}")
+            print(f"{shape:5} {name:17} recursive {time_call(recursive)}")
+
+
+if __name__ == "__main__":
+    main()
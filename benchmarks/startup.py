@@ -0,0 +1,188 @@
+"""
+Benchmark loading the family cache from a real Postgres database at
+startup - fetching every row at once (as startup used to) against
+streaming the rows through a server-side cursor with
+:func:`CacheHandler.stream_family_rows`.
+
+The fixture tables are made in their own schema (``SCHEMA`` below), which
+is dropped again at the end, so point this at a scratch database. The
+connection is set up with the usual libpq environment variables
+(``PGHOST``, ``PGPORT``, ``PGDATABASE``, ``PGUSER`` and ``PGPASSWORD``).
+
+Run from the repository root with ``python -m benchmarks.startup``,
+optionally giving the user counts to try (eg ``... 100000 1000000``).
+"""
+
+from __future__ import annotations
+
+from typing import List, Tuple
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+from discord.ext import vbu
+
+from cogs.cache_handler import CacheHandler
+from cogs.utils.family_tree.compact_store import CompactFamilyStore
+
+from benchmarks.families import family_rows, reset_family_cache
+
+
+SCHEMA = "marriagebot_benchmark"
+USER_COUNTS = (100_000, 1_000_000)
+FAMILY_SIZE = 50
+WHERE = "guild_id = 0"
+
+
+def make_rows(user_count: int) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int, int]]]:
+    """
+    Make ``(user_id, partner_id, guild_id)`` and ``(child_id, parent_id,
+    guild_id)`` records for families of ``FAMILY_SIZE`` people.
+    """
+
+    partnerships, parents = [], []
+    for family in range(user_count // FAMILY_SIZE):
+        family_partnerships, family_parents = family_rows(
+            FAMILY_SIZE, first_id=family * FAMILY_SIZE + 1, seed=family,
+        )
+        partnerships.extend((a, b, 0) for a, b in family_partnerships)
+        parents.extend((child_id, parent_id, 0) for parent_id, child_id in family_parents)
+    return partnerships, parents
+
+
+async def create_fixture(db: vbu.Database, user_count: int) -> None:
+    """
+    Make the marriages and parents tables in the benchmark schema and fill
+    them with families.
+    """
+
+    await db(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await db(f"CREATE SCHEMA {SCHEMA}")
+    await db(f"SET search_path TO {SCHEMA}")
+    await db(
+        """
+        CREATE TABLE marriages(
+            user_id BIGINT NOT NULL,
+            partner_id BIGINT NOT NULL,
+            guild_id BIGINT NOT NULL DEFAULT 0,
+            timestamp TIMESTAMP,
+            PRIMARY KEY (user_id, partner_id, guild_id)
+        )
+        """
+    )
+    await db(
+        """
+        CREATE TABLE parents(
+            child_id BIGINT NOT NULL,
+            parent_id BIGINT NOT NULL,
+            guild_id BIGINT NOT NULL DEFAULT 0,
+            timestamp TIMESTAMP,
+            PRIMARY KEY (child_id, guild_id)
+        )
+        """
+    )
+    partnerships, parents = make_rows(user_count)
+    await db.conn.copy_records_to_table(
+        "marriages", records=partnerships,
+        columns=("user_id", "partner_id", "guild_id"), schema_name=SCHEMA,
+    )
+    await db.conn.copy_records_to_table(
+        "parents", records=parents,
+        columns=("child_id", "parent_id", "guild_id"), schema_name=SCHEMA,
+    )
+    await db(f"ANALYZE {SCHEMA}.marriages")
+    await db(f"ANALYZE {SCHEMA}.parents")
+
+
+async def fetch_all(db: vbu.Database) -> None:
+    """
+    Select every row at once and then cache them, as startup used to.
+    """
+
+    partnerships, parents = await CacheHandler.fetch_family_rows(db, WHERE)
+    for row in partnerships:
+        CacheHandler.handle_partner(row)
+    for row in parents:
+        CacheHandler.handle_parent(row)
+
+
+async def stream(db: vbu.Database) -> None:
+    """
+    Cache the rows a chunk at a time as they're streamed in, as startup
+    does now.
+    """
+
+    async for rows in CacheHandler.stream_family_rows(db, "marriages", WHERE):
+        for row in rows:
+            CacheHandler.handle_partner(row)
+    async for rows in CacheHandler.stream_family_rows(db, "parents", WHERE):
+        for row in rows:
+            CacheHandler.handle_parent(row)
+
+
+async def stream_compact(db: vbu.Database) -> None:
+    """
+    Stream the rows in and build a compact store from them, as startup
+    does with ``compact_family_cache`` set.
+    """
+
+    partnerships, parents = [], []
+    async for rows in CacheHandler.stream_family_rows(db, "marriages", WHERE):
+        partnerships.extend(rows)
+    async for rows in CacheHandler.stream_family_rows(db, "parents", WHERE):
+        parents.extend(rows)
+    CompactFamilyStore.from_rows(partnerships, parents)
+
+
+async def measure(db: vbu.Database, load) -> Tuple[float, int]:
+    """
+    Time a load, and then run it again with tracemalloc to get the peak
+    memory that it used.
+    """
+
+    reset_family_cache()
+    gc.collect()
+    start = time.perf_counter()
+    await load(db)
+    elapsed = time.perf_counter() - start
+
+    reset_family_cache()
+    gc.collect()
+    tracemalloc.start()
+    await load(db)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    reset_family_cache()
+    return elapsed, peak
+
+
+async def main():
+    user_counts = [int(i) for i in sys.argv[1:]] or USER_COUNTS
+    await vbu.Database.create_pool({
+        "host": os.getenv("PGHOST", "localhost"),
+        "port": int(os.getenv("PGPORT", 5432)),
+        "database": os.getenv("PGDATABASE", "marriagebot_benchmark"),
+        "user": os.getenv("PGUSER", "postgres"),
+        "password": os.getenv("PGPASSWORD", ""),
+    })
+    mib = 1024 * 1024
+    async with vbu.Database() as db:
+        try:
+            print(f"{'users':>8} {'load':15} {'time':>8} {'peak':>10}")
+            for user_count in user_counts:
+                await create_fixture(db, user_count)
+                for name, load in (
+                        ("fetch all", fetch_all),
+                        ("stream", stream),
+                        ("stream compact", stream_compact)):
+                    elapsed, peak = await measure(db, load)
+                    print(f"{user_count:8} {name:15} {elapsed:7.2f}s {peak / mib:8.1f}MB")
+        finally:
+            await db(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
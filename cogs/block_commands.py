@@ -8,6 +8,16 @@ from cogs import utils
 
 class BlockCommands(vbu.Cog[utils.types.Bot]):
 
+    async def cache_setup(self, db: vbu.Database):
+        """
+        Cache everyone's blocked users.
+        """
+
+        rows = await db("SELECT user_id, blocked_user_id FROM blocked_user")
+        blocked_users = utils.converters.UnblockedMember.blocked_users
+        blocked_users.replace((i['user_id'], i['blocked_user_id']) for i in rows)
+        self.logger.info(f"Cached {len(blocked_users)} blocked users")
+
     @commands.command(
         application_command_meta=commands.ApplicationCommandMeta(
             options=[
@@ -53,6 +63,7 @@ class BlockCommands(vbu.Cog[utils.types.Bot]):
                 """,
                 ctx.author.id, user,
             )
+        utils.converters.UnblockedMember.blocked_users.add(ctx.author.id, user)
         async with vbu.Redis() as re:
             await re.publish(
                 "BlockedUserAdd",
@@ -103,6 +114,7 @@ class BlockCommands(vbu.Cog[utils.types.Bot]):
                 """,
                 ctx.author.id, user,
             )
+        utils.converters.UnblockedMember.blocked_users.remove(ctx.author.id, user)
         async with vbu.Redis() as re:
             await re.publish(
                 "BlockedUserRemove",
@@ -182,11 +182,15 @@ class BotModerator(vbu.Cog[utils.types.Bot]):
                 f"I encountered an error copying that family over - `{e}`."
             )
 
-        # Send to user
+        # Reload just that guild rather than everything
         await db.disconnect()
+        async with vbu.Redis() as re:
+            await re.publish("ReloadGuildFamilies", {"guild_id": guild_id})
+
+        # Send to user
         await ctx.send((
-            f"Copied over `{len(users)}` users. "
-            "Be sure to run the `runstartupmethod` command"
+            f"Copied over `{len(users)}` users, and asked for "
+            "that guild's families to be reloaded."
         ))
 
     @commands.command(
@@ -462,7 +466,11 @@ class BotModerator(vbu.Cog[utils.types.Bot]):
             await db("DELETE FROM parents WHERE guild_id = $1", guild_id)
             await db("DELETE FROM marriages WHERE guild_id = $1", guild_id)
 
-        await ctx.send("Reset tree. Run the `runstartupmethod` command.")
+        # Reload just that guild rather than everything
+        async with vbu.Redis() as re:
+            await re.publish("ReloadGuildFamilies", {"guild_id": guild_id})
+
+        await ctx.send("Reset tree, and asked for that guild's families to be reloaded.")
 
 
 def setup(bot: utils.types.Bot):
@@ -1,15 +1,44 @@
 from __future__ import annotations
 
-from typing import List
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+import collections
 import asyncio
+import json
+import struct
+import time
 
 import discord
-from discord.ext import vbu
+from discord.ext import tasks, vbu
 
 from cogs import utils
 from cogs.utils import types
 
 
+# How long a lazily loaded guild can go without a command before it's
+# unloaded again
+GUILD_IDLE_UNLOAD_SECONDS = 60 * 60
+
+# How many family rows are read from the database (and cached) before
+# giving the event loop a turn
+FAMILY_LOAD_CHUNK_SIZE = 10_000
+
+# How far back before a family snapshot's watermark we look for changes
+# (to catch anything that was being written as the snapshot was taken),
+# and how long changes are logged for (older snapshots are ignored)
+FAMILY_SNAPSHOT_REPLAY_MARGIN_SECONDS = 5 * 60
+FAMILY_CHANGE_RETENTION_SECONDS = 7 * 24 * 60 * 60
+
+# The children, partners and parent read from the database for each
+# (guild_id, user_id) pair
+UserRelations = Dict[Tuple[int, int], Tuple[List[int], List[int], Optional[int]]]
+
+# The only columns from each family table that the cache needs
+FAMILY_TABLE_COLUMNS = {
+    "marriages": "guild_id, user_id, partner_id",
+    "parents": "guild_id, parent_id, child_id",
+}
+
+
 async def aiterator(iterable):
     for i in iterable:
         await asyncio.sleep(0)
@@ -18,6 +47,172 @@ async def aiterator(iterable):
 
 class CacheHandler(vbu.Cog[types.Bot]):
 
+    def __init__(self, bot: types.Bot):
+        super().__init__(bot)
+        self.guild_load_locks: Dict[int, asyncio.Lock] = {}
+        self.family_cache_watermark: Optional[float] = None
+        self.shared_family_store_watermark: Optional[float] = None
+        self.post_cache_stats.start()
+        self.unload_idle_guilds.start()
+        self.save_family_snapshot_loop.start()
+        if vbu.RedisConnection.enabled:
+            self.reload_guild_families.start()
+            self.shared_family_store_updated.start()
+
+    def cog_unload(self):
+        self.post_cache_stats.cancel()
+        self.unload_idle_guilds.cancel()
+        self.save_family_snapshot_loop.cancel()
+        if vbu.RedisConnection.enabled:
+            self.reload_guild_families.stop()
+            self.shared_family_store_updated.stop()
+
+    @tasks.loop(minutes=1)
+    async def post_cache_stats(self):
+        """
+        Post the counters for the relation, generation, blocked user, name
+        and family caches to statsd.
+        """
+
+        # Add up the counters for each guild
+        family_stats: Dict[str, int] = collections.Counter()
+        for guild_cache in utils.FamilyTreeMember.all_users.guilds():
+            family_stats.update(guild_cache.stats())
+            family_stats["guilds"] += 1
+
+        # Each cache is posted under its own prefix
+        cache_stats = (
+            ("relation", utils.FamilyTreeMember.relation_cache.stats()),
+            ("generation", utils.FamilyTreeMember.generation_cache.stats()),
+            ("blocked_user", utils.converters.UnblockedMember.blocked_users.stats()),
+            ("name", utils.DiscordNameManager.cached_names.stats()),
+            ("family", family_stats),
+        )
+        async with self.bot.stats() as stats:
+            for prefix, values in cache_stats:
+                for name, value in values.items():
+                    stats.gauge(
+                        f"marriagebot.cache.{prefix}.{name}",
+                        value=value,
+                        tags={"cluster": self.bot.cluster},
+                    )
+
+    @tasks.loop(minutes=10)
+    async def unload_idle_guilds(self):
+        """
+        Unload the families of any lazily loaded guilds that haven't
+        been used in a while.
+        """
+
+        all_users = utils.FamilyTreeMember.all_users
+        if not all_users.lazy:
+            return
+        cutoff = time.monotonic() - GUILD_IDLE_UNLOAD_SECONDS
+        for guild_cache in all_users.guilds():
+            if guild_cache.loading or guild_cache.last_used > cutoff:
+                continue
+            self.unload_guild(guild_cache.guild_id)
+
+    @tasks.loop(hours=1)
+    async def save_family_snapshot_loop(self):
+        """
+        Clear out any family changes too old to be replayed, and keep the
+        family snapshot and shared family store up to date (if we're keeping
+        them).
+
+        The triggers log every change whether or not anything here reads
+        them, so the log is pruned regardless of snapshot config - but only
+        by the process with shard 0, so that it's done once an hour rather
+        than once an hour per process.
+        """
+
+        async with vbu.Database() as db:
+            watermark = await self.get_database_time(db)
+            if 0 in (self.bot.shard_ids or [0]):
+                await db(
+                    """
+                    DELETE FROM
+                        family_changes
+                    WHERE
+                        changed_at < TO_TIMESTAMP($1) AT TIME ZONE 'UTC'
+                    """,
+                    watermark - FAMILY_CHANGE_RETENTION_SECONDS,
+                )
+        if self.family_cache_watermark is None:
+            return
+        await self.save_family_snapshot(watermark)
+        await self.save_shared_family_store(watermark)
+
+    @save_family_snapshot_loop.before_loop
+    async def before_save_family_snapshot_loop(self):
+        """
+        Wait for the family cache to be set up (and with it the database)
+        before the first run.
+        """
+
+        await self.bot.wait_until_ready()
+        if self.bot.startup_method is not None:
+            await asyncio.wait([self.bot.startup_method])
+
+    async def bot_check_once(self, ctx: vbu.Context) -> bool:
+        """
+        Make sure that the families for the guild that a command is being
+        run in are loaded before the command runs.
+        """
+
+        if utils.FamilyTreeMember.all_users.lazy:
+            await self.load_guild(utils.get_family_guild_id(ctx))
+        return True
+
+    @vbu.redis_channel_handler("ReloadGuildFamilies")
+    async def reload_guild_families(self, payload: types.GuildFamiliesPayload):
+        """
+        Reload the families for a guild after they've been changed in bulk
+        (eg the guild has been reset, or had a family copied into it).
+        """
+
+        guild_id = payload['guild_id']
+        if utils.FamilyTreeMember.all_users.lazy:
+            self.unload_guild(guild_id)
+            return
+        if bool(guild_id) != self.bot.config.get('is_server_specific', False):
+            return
+        await self.load_guild(guild_id, reload=True)
+
+    @vbu.redis_channel_handler("SharedFamilyStoreUpdated")
+    async def shared_family_store_updated(self, payload: types.SharedFamilyStorePayload):
+        """
+        Map the newest shared family store after the process that owns it
+        has written a new one.
+        """
+
+        if not self.bot.config.get('shared_family_store_file'):
+            return
+        if utils.FamilyTreeMember.all_users.lazy:
+            return
+        if payload['watermark'] <= (self.shared_family_store_watermark or 0):
+            return
+        async with vbu.Database() as db:
+            await self.load_shared_family_store(db, self.get_family_where())
+
+    @vbu.Cog.listener("on_resync_guild_families")
+    async def resync_guild_families(self, guild_id: int, since: float):
+        """
+        Re-read anyone in a guild whose family has changed in the database
+        since a given time, after we've missed some updates for it.
+        """
+
+        if utils.FamilyTreeMember.all_users.lazy:
+            self.unload_guild(guild_id)
+            return
+        async with vbu.Database() as db:
+            changed_users = await self.replay_family_changes(
+                db,
+                f"guild_id = {int(guild_id)}",
+                since - FAMILY_SNAPSHOT_REPLAY_MARGIN_SECONDS,
+            )
+        self.logger.info(f"Resynced {len(changed_users)} users for guild ID {guild_id}")
+
     async def recache_user(
             self,
             ftm: utils.FamilyTreeMember,
@@ -92,7 +287,7 @@ class CacheHandler(vbu.Cog[types.Bot]):
 
         # Add parent
         if parents:
-            ftm._parent = parents[0]['parent_id']
+            ftm.parent = parents[0]['parent_id']
 
     @vbu.Cog.listener("on_recache_user")
     async def _recache_user(
@@ -104,14 +299,18 @@ class CacheHandler(vbu.Cog[types.Bot]):
             user.id, guild_id,
         )
         ftm = utils.FamilyTreeMember.get(user.id, guild_id)
-        changed_users: list[utils.FamilyTreeMember] = []
+
+        # Re-read the whole family at once
+        member_keys = [(uf._guild_id, uf.id) for uf in ftm.span()]
         async with vbu.Database() as db:
-            for uf in ftm.span():
-                changed_users.append(uf)
-                await self.recache_user(uf, db)
+            changed_users = await self.recache_users(db, member_keys)
+
+        # And send everyone out in one go
         async with vbu.Redis() as re:
+            pipe = re.conn.pipeline()
             for uf in changed_users:
-                await re.publish("TreeMemberUpdate", uf.to_json())
+                pipe.publish("TreeMemberUpdate", json.dumps(uf.to_json()))
+            await pipe.execute()
 
     @staticmethod
     def handle_partner(row: types.MarriagesDB):
@@ -125,39 +324,676 @@ class CacheHandler(vbu.Cog[types.Bot]):
         child = parent.add_child(row['child_id'], return_added=True)
         child.parent = row['parent_id']
 
-    async def cache_setup(self, db: vbu.Database):
+    @staticmethod
+    async def fetch_family_rows(
+            db: vbu.Database,
+            where: str,
+            *args) -> Tuple[List[types.MarriagesDB], List[types.ParentageDB]]:
         """
-        Set up the cache for the users.
+        Get the marriages and parents rows that match a given where clause.
         """
 
-        # Get family data from database
-        where: str
-        if self.bot.config.get('is_server_specific', False):
-            where = "guild_id <> 0"
+        partnerships: List[types.MarriagesDB] = await db(
+            """
+            SELECT
+                {0}
+            FROM
+                marriages
+            WHERE
+                {1}
+                -- AND user_id > partner_id
+            """.format(FAMILY_TABLE_COLUMNS["marriages"], where),
+            *args,
+        )
+        parents: List[types.ParentageDB] = await db(
+            """
+            SELECT
+                {0}
+            FROM
+                parents
+            WHERE
+                {1}
+            """.format(FAMILY_TABLE_COLUMNS["parents"], where),
+            *args,
+        )
+        return partnerships, parents
+
+    @staticmethod
+    async def stream_family_rows(
+            db: vbu.Database,
+            table: str,
+            where: str,
+            *args) -> AsyncIterator[list]:
+        """
+        Read the rows of a family table (``marriages`` or ``parents``) that
+        match a given where clause through a server-side cursor, a chunk
+        at a time, so that the whole table is never held at once.
+        """
+
+        assert db.conn
+        sql = "SELECT {0} FROM {1} WHERE {2}".format(FAMILY_TABLE_COLUMNS[table], table, where)
+        async with db.conn.transaction():
+            cursor = await db.conn.cursor(sql, *args)
+            while (rows := await cursor.fetch(FAMILY_LOAD_CHUNK_SIZE)):
+                yield rows
+
+    async def cache_rows(
+            self,
+            partnerships: Iterable[types.MarriagesDB],
+            parents: Iterable[types.ParentageDB]) -> None:
+        """
+        Add rows from the marriages and parents tables to the cache,
+        giving the event loop a turn after each chunk of rows.
+        """
+
+        for index, row in enumerate(partnerships, start=1):
+            self.handle_partner(row)
+            if index % FAMILY_LOAD_CHUNK_SIZE == 0:
+                await asyncio.sleep(0)
+        for index, row in enumerate(parents, start=1):
+            self.handle_parent(row)
+            if index % FAMILY_LOAD_CHUNK_SIZE == 0:
+                await asyncio.sleep(0)
+
+    async def install_guild(
+            self,
+            guild_id: int,
+            partnerships: List[types.MarriagesDB],
+            parents: List[types.ParentageDB]) -> utils.GuildFamilyCache:
+        """
+        Replace everything cached for a guild with the given rows.
+        """
+
+        # Clear out what we have already
+        guild_cache = utils.FamilyTreeMember.all_users.guild(guild_id)
+        utils.FamilyTreeMember.relation_cache.invalidate_guild(guild_id)
+        utils.FamilyTreeMember.generation_cache.invalidate_guild(guild_id)
+        guild_cache.clear()
+
+        # Keep the family data in flat arrays if we've been asked to
+        if self.bot.config.get('compact_family_cache', False):
+            guild_cache.store = utils.CompactFamilyStore.from_rows(partnerships, parents)
+
+        # Otherwise cache each row
         else:
-            where = "guild_id = 0"
-        try:
-            partnerships: List[types.MarriagesDB] = await db(
-                """
-                SELECT
-                    *
-                FROM
-                    marriages
-                WHERE
-                    {0}
-                    -- AND user_id > partner_id
-                """.format(where),
+            await self.cache_rows(partnerships, parents)
+        guild_cache.loaded = True
+        return guild_cache
+
+    async def load_guild(
+            self,
+            guild_id: int,
+            *,
+            reload: bool = False) -> utils.GuildFamilyCache:
+        """
+        Load the families for a given guild from the database, if they
+        aren't loaded already.
+
+        Parameters
+        ----------
+        guild_id : int
+            The guild to load.
+        reload : bool, optional
+            Whether to load the guild even if it's already loaded.
+
+        Returns
+        -------
+        utils.GuildFamilyCache
+            The cache for the guild.
+        """
+
+        guild_cache = utils.FamilyTreeMember.all_users.guild(guild_id)
+        guild_cache.last_used = time.monotonic()
+        if guild_cache.loaded and not reload:
+            return guild_cache
+        lock = self.guild_load_locks.setdefault(guild_id, asyncio.Lock())
+        async with lock:
+            guild_cache = utils.FamilyTreeMember.all_users.guild(guild_id)
+            if guild_cache.loaded and not reload:
+                return guild_cache
+
+            # Any updates that come in while we're loading are held back until
+            # we're done, as they could be newer than the rows that we get
+            guild_cache.loading = True
+            try:
+                async with vbu.Database() as db:
+                    partnerships, parents = await self.fetch_family_rows(db, "guild_id = $1", guild_id)
+                await self.install_guild(guild_id, partnerships, parents)
+            finally:
+                guild_cache.loading = False
+                self.apply_pending_updates(guild_cache)
+
+        self.logger.info(
+            f"Loaded {len(partnerships)} partnerships and {len(parents)} "
+            f"parents/children for guild ID {guild_id}"
+        )
+        return guild_cache
+
+    def unload_guild(self, guild_id: int) -> None:
+        """
+        Remove everything cached for a given guild.
+        """
+
+        utils.FamilyTreeMember.relation_cache.invalidate_guild(guild_id)
+        utils.FamilyTreeMember.generation_cache.invalidate_guild(guild_id)
+        if utils.FamilyTreeMember.all_users.unload_guild(guild_id) is not None:
+            self.logger.info(f"Unloaded the families for guild ID {guild_id}")
+
+    async def recache_users(
+            self,
+            db: vbu.Database,
+            member_keys: Iterable[Tuple[int, int]]) -> List[utils.FamilyTreeMember]:
+        """
+        Re-read a group of users from the database and into the cache, using
+        one query for each of the family tables rather than a few per user.
+
+        Parameters
+        ----------
+        db : vbu.Database
+            The database connection to use.
+        member_keys : Iterable[Tuple[int, int]]
+            The ``(guild_id, user_id)`` pairs of the users to re-read.
+
+        Returns
+        -------
+        List[utils.FamilyTreeMember]
+            The users that were re-read.
+        """
+
+        return self.apply_user_relations(await self.fetch_user_relations(db, member_keys))
+
+    @staticmethod
+    async def fetch_user_relations(
+            db: vbu.Database,
+            member_keys: Iterable[Tuple[int, int]]) -> UserRelations:
+        """
+        Read the children, partners and parent of a group of users from the
+        database, without touching the cache.
+        """
+
+        # Get everything that could touch these users
+        keys: Set[Tuple[int, int]] = set(member_keys)
+        if not keys:
+            return {}
+        user_ids = list({i for _, i in keys})
+        guild_ids = list({i for i, _ in keys})
+        partnerships: List[types.MarriagesDB] = await db(
+            """
+            SELECT
+                {0}
+            FROM
+                marriages
+            WHERE
+                (
+                    user_id = ANY($1::BIGINT[])
+                    OR partner_id = ANY($1::BIGINT[])
+                )
+                AND guild_id = ANY($2::BIGINT[])
+            """.format(FAMILY_TABLE_COLUMNS["marriages"]),
+            user_ids, guild_ids,
+        )
+        parents: List[types.ParentageDB] = await db(
+            """
+            SELECT
+                {0}
+            FROM
+                parents
+            WHERE
+                (
+                    parent_id = ANY($1::BIGINT[])
+                    OR child_id = ANY($1::BIGINT[])
+                )
+                AND guild_id = ANY($2::BIGINT[])
+            """.format(FAMILY_TABLE_COLUMNS["parents"]),
+            user_ids, guild_ids,
+        )
+
+        # Work out the relations for each user
+        partner_ids: Dict[Tuple[int, int], Set[int]] = {i: set() for i in keys}
+        child_ids: Dict[Tuple[int, int], List[int]] = {i: [] for i in keys}
+        parent_ids: Dict[Tuple[int, int], Optional[int]] = dict.fromkeys(keys)
+        for row in partnerships:
+            guild_id, user_id, partner_id = row['guild_id'], row['user_id'], row['partner_id']
+            if user_id == partner_id:
+                continue  # Circular marriage references
+            if (guild_id, user_id) in partner_ids:
+                partner_ids[(guild_id, user_id)].add(partner_id)
+            if (guild_id, partner_id) in partner_ids:
+                partner_ids[(guild_id, partner_id)].add(user_id)
+        for row in parents:
+            guild_id, parent_id, child_id = row['guild_id'], row['parent_id'], row['child_id']
+            if (guild_id, parent_id) in child_ids:
+                child_ids[(guild_id, parent_id)].append(child_id)
+            if (guild_id, child_id) in parent_ids:
+                parent_ids[(guild_id, child_id)] = parent_id
+
+        return {
+            key: (child_ids[key], sorted(partner_ids[key]), parent_ids[key])
+            for key in keys
+        }
+
+    @staticmethod
+    def apply_user_relations(relations: UserRelations) -> List[utils.FamilyTreeMember]:
+        """
+        Update the cache with relations read by :func:`fetch_user_relations`.
+        This never gives the event loop a turn, so nothing sees the users
+        half updated.
+        """
+
+        changed_users: List[utils.FamilyTreeMember] = []
+        for (guild_id, user_id), (children, partners, parent) in relations.items():
+            ftm = utils.FamilyTreeMember.get(user_id, guild_id)
+            ftm.children = children
+            ftm.partners = partners
+            ftm.parent = parent
+            changed_users.append(ftm)
+        return changed_users
+
+    @staticmethod
+    def apply_pending_updates(guild_cache: utils.GuildFamilyCache) -> None:
+        """
+        Apply the updates that were held back for a guild while it was
+        being loaded.
+        """
+
+        pending, guild_cache.pending_updates = guild_cache.pending_updates, []
+        for payload in pending:
+            if 'deltas' in payload:
+                utils.FamilyTreeDelta.apply_payload(payload)  # type: ignore
+            else:
+                utils.FamilyTreeMember(**payload)  # type: ignore
+
+    @staticmethod
+    async def get_database_time(db: vbu.Database) -> float:
+        """
+        Get the current time from the database as a UNIX timestamp, so that
+        snapshot watermarks aren't thrown off by clock drift.
+        """
+
+        rows = await db("SELECT EXTRACT(EPOCH FROM NOW()) AS now")
+        return float(rows[0]['now'])
+
+    def clear_family_cache(self) -> None:
+        """
+        Remove every family tree member from the cache, along with
+        anything cached about them.
+        """
+
+        self.logger.info("Clearing the cache of all family tree members")
+        utils.FamilyTreeMember.all_users.clear()
+        utils.FamilyTreeMember.relation_cache.clear()
+        utils.FamilyTreeMember.generation_cache.clear()
+
+    @staticmethod
+    async def get_guild_relations(
+            guild_cache: utils.GuildFamilyCache) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """
+        Get every relation cached for a guild (see
+        :func:`GuildFamilyCache.iter_relations`), giving the event loop a
+        turn after each chunk of users.
+        """
+
+        partnerships: List[Tuple[int, int]] = []
+        parents: List[Tuple[int, int]] = []
+        for _ in guild_cache.iter_relations(partnerships, parents, FAMILY_LOAD_CHUNK_SIZE):
+            await asyncio.sleep(0)
+        return partnerships, parents
+
+    async def save_family_snapshot(self, watermark: float) -> None:
+        """
+        Save everything in the family cache to the snapshot file (if
+        there is one), to be loaded at the next startup.
+
+        Parameters
+        ----------
+        watermark : float
+            The database time that the cache is up to date to.
+        """
+
+        filename = self.bot.config.get('family_snapshot_file')
+        if not filename:
+            return
+        relations = []
+        for guild_cache in list(utils.FamilyTreeMember.all_users.guilds()):
+            if guild_cache.loaded:
+                relations.append((guild_cache.guild_id, *await self.get_guild_relations(guild_cache)))
+
+        # Build and write the snapshot away from the event loop
+        def build_and_save() -> int:
+            snapshot = utils.FamilySnapshot.from_relations(
+                watermark,
+                self.bot.config.get('is_server_specific', False),
+                relations,
             )
-            parents: List[types.ParentageDB] = await db(
-                """
-                SELECT
-                    *
-                FROM
-                    parents
-                WHERE
-                    {0}
-                """.format(where),
+            snapshot.save(filename)
+            return len(snapshot)
+        try:
+            row_count = await asyncio.get_running_loop().run_in_executor(None, build_and_save)
+        except Exception as e:
+            self.logger.error(f"Could not save the family snapshot to {filename}", exc_info=e)
+            return
+        self.family_cache_watermark = watermark
+        self.logger.info(f"Saved {row_count} family rows to {filename}")
+
+    async def replay_family_changes(
+            self,
+            db: vbu.Database,
+            where: str,
+            since: float) -> List[utils.FamilyTreeMember]:
+        """
+        Re-read everyone whose family has changed in the database since a
+        given time (see :func:`fetch_family_changes`).
+
+        Returns
+        -------
+        List[utils.FamilyTreeMember]
+            The users that were re-read.
+        """
+
+        return self.apply_user_relations(await self.fetch_family_changes(db, where, since))
+
+    async def fetch_family_changes(
+            self,
+            db: vbu.Database,
+            where: str,
+            since: float) -> UserRelations:
+        """
+        Read the relations of everyone whose family has changed in the
+        database since a given time, without touching the cache.
+
+        Parameters
+        ----------
+        db : vbu.Database
+            The database connection to use.
+        where : str
+            A where clause for the guilds that we care about.
+        since : float
+            The UNIX timestamp (in UTC) to look for changes after.
+
+        Returns
+        -------
+        UserRelations
+            The children, partners and parent of each changed user.
+        """
+
+        changes = await db(
+            """
+            SELECT DISTINCT
+                guild_id,
+                user_id
+            FROM
+                family_changes
+            WHERE
+                changed_at > TO_TIMESTAMP($1) AT TIME ZONE 'UTC'
+                AND {0}
+            """.format(where),
+            since,
+        )
+        return await self.fetch_user_relations(db, [(i['guild_id'], i['user_id']) for i in changes])
+
+    async def save_shared_family_store(self, watermark: float) -> None:
+        """
+        Build a compact store of everything in the family cache and write
+        it to the shared family store file, then tell every process to map
+        it. Only the process that owns the file does anything here.
+
+        Parameters
+        ----------
+        watermark : float
+            The database time that the cache is up to date to.
+        """
+
+        filename = self.bot.config.get('shared_family_store_file')
+        if not filename or not self.bot.config.get('shared_family_store_owner', False):
+            return
+
+        # Get every relation that we have cached
+        relations = []
+        for guild_cache in list(utils.FamilyTreeMember.all_users.guilds()):
+            if guild_cache.loaded:
+                relations.append((guild_cache.guild_id, *await self.get_guild_relations(guild_cache)))
+
+        # Build and write the store away from the event loop
+        def build_and_save() -> int:
+            partnerships: List[types.MarriagesDB] = []
+            parents: List[types.ParentageDB] = []
+            for guild_id, guild_partnerships, guild_parents in relations:
+                partnerships.extend(
+                    {'guild_id': guild_id, 'user_id': user_id, 'partner_id': partner_id}  # type: ignore
+                    for user_id, partner_id in guild_partnerships
+                )
+                parents.extend(
+                    {'guild_id': guild_id, 'parent_id': parent_id, 'child_id': child_id}  # type: ignore
+                    for parent_id, child_id in guild_parents
+                )
+            store = utils.CompactFamilyStore.from_rows(partnerships, parents)
+            store.save(filename, watermark, self.bot.config.get('is_server_specific', False))
+            return len(store)
+        try:
+            user_count = await asyncio.get_running_loop().run_in_executor(None, build_and_save)
+        except Exception as e:
+            self.logger.error(f"Could not save the shared family store to {filename}", exc_info=e)
+            return
+        self.family_cache_watermark = watermark
+        self.logger.info(f"Saved {user_count} family tree members to {filename}")
+
+        # And let everyone know that there's a new one
+        if vbu.RedisConnection.enabled:
+            async with vbu.Redis() as re:
+                await re.publish("SharedFamilyStoreUpdated", {"watermark": watermark})
+
+    async def load_shared_family_store(self, db: vbu.Database, where: str) -> bool:
+        """
+        Swap the family cache over to the shared family store file (if
+        there is one), along with anyone whose family has changed in the
+        database since the store was written. The store itself is never
+        changed - anyone whose family changes is copied out of it into this
+        process's own cache.
+
+        The changes are read while the current cache keeps serving
+        commands, and the swap is made in one go once they're in, so a
+        remap never leaves the cache empty or half filled. Updates that
+        come in while the changes are being read are held back until the
+        swap is done.
+
+        Returns
+        -------
+        bool
+            Whether or not the cache was loaded from the shared store.
+        """
+
+        # See if there's a store that we can use
+        filename = self.bot.config.get('shared_family_store_file')
+        if not filename:
+            return False
+        try:
+            loaded = utils.CompactFamilyStore.load(filename)
+        except (OSError, ValueError, struct.error) as e:
+            self.logger.error(f"Could not read the shared family store {filename}", exc_info=e)
+            return False
+        if loaded is None:
+            return False
+        store, store_watermark, store_is_server_specific = loaded
+
+        # Make sure it was written for the same guilds as we cache - a
+        # server specific bot never caches guild 0, and everyone else only
+        # caches guild 0
+        is_server_specific = self.bot.config.get('is_server_specific', False)
+        if store_is_server_specific != is_server_specific:
+            self.logger.warning(f"Not using the shared family store {filename} as it's for a different bot")
+            return False
+        if any((guild_id != 0) != is_server_specific for guild_id in store.guild_ids):
+            self.logger.warning(f"Not using the shared family store {filename} as it has the wrong guilds")
+            return False
+        watermark = await self.get_database_time(db)
+        if store_watermark < watermark - FAMILY_CHANGE_RETENTION_SECONDS:
+            return False
+        since = store_watermark - FAMILY_SNAPSHOT_REPLAY_MARGIN_SECONDS
+
+        # Read anything that's changed since, holding back updates for
+        # every guild that's about to be swapped
+        all_users = utils.FamilyTreeMember.all_users
+        for guild_id in store.guild_ids:
+            all_users.guild(guild_id)
+        guild_caches = list(all_users.guilds())
+        for guild_cache in guild_caches:
+            guild_cache.loading = True
+        try:
+            fetched_at = await self.get_database_time(db)
+            changes = await self.fetch_family_changes(db, where, since)
+
+            # Point every guild at the store and apply the changes, without
+            # giving the event loop a turn. The old store stays mapped until
+            # nothing is using it any more
+            self.clear_family_cache()
+            all_users.lazy = False
+            for guild_id in store.guild_ids:
+                all_users.guild(guild_id).store = store
+            changed_users = self.apply_user_relations(changes)
+            for guild_cache in all_users.guilds():
+                guild_cache.loaded = True
+            self.shared_family_store_watermark = store_watermark
+        finally:
+            for guild_cache in guild_caches:
+                guild_cache.loading = False
+                self.apply_pending_updates(guild_cache)
+
+        # Anything written (by this process or any other) while we were
+        # reading is caught up on now that the store is in place
+        changed_users += await self.replay_family_changes(
+            db, where, fetched_at - FAMILY_SNAPSHOT_REPLAY_MARGIN_SECONDS,
+        )
+        if self.bot.config.get('shared_family_store_owner', False):
+            self.family_cache_watermark = store_watermark
+        self.logger.info(
+            f"Mapped {len(store)} family tree members from {filename} and "
+            f"re-read {len(changed_users)} changed users"
+        )
+        return True
+
+    async def load_family_snapshot(self, db: vbu.Database, where: str) -> bool:
+        """
+        Fill the family cache from the snapshot file (if there is one),
+        and then re-read anyone whose family has changed in the database
+        since the snapshot was taken.
+
+        Returns
+        -------
+        bool
+            Whether or not the cache was loaded from the snapshot.
+        """
+
+        # See if there's a snapshot that we can use
+        filename = self.bot.config.get('family_snapshot_file')
+        if not filename:
+            return False
+        try:
+            snapshot = utils.FamilySnapshot.load(filename)
+        except (OSError, ValueError, struct.error) as e:
+            self.logger.error(f"Could not read the family snapshot {filename}", exc_info=e)
+            return False
+        if snapshot is None:
+            return False
+        watermark = await self.get_database_time(db)
+        with snapshot:
+            if snapshot.is_server_specific != self.bot.config.get('is_server_specific', False):
+                return False
+            if snapshot.watermark < watermark - FAMILY_CHANGE_RETENTION_SECONDS:
+                return False
+            since = snapshot.watermark - FAMILY_SNAPSHOT_REPLAY_MARGIN_SECONDS
+
+            # Cache everything in it
+            self.clear_family_cache()
+            utils.FamilyTreeMember.all_users.lazy = False
+            for guild_id, partnerships, parents in snapshot.iter_guilds():
+                await self.install_guild(guild_id, partnerships, parents)
+            row_count = len(snapshot)
+
+        # Catch up with anything that's changed since
+        changed_users = await self.replay_family_changes(db, where, since)
+        for guild_cache in utils.FamilyTreeMember.all_users.guilds():
+            guild_cache.loaded = True
+        self.logger.info(
+            f"Cached {row_count} family rows from {filename} and "
+            f"re-read {len(changed_users)} changed users"
+        )
+        await self.save_family_snapshot(watermark)
+        return True
+
+    def get_family_where(self) -> str:
+        """
+        Get a where clause for the guilds whose families this bot caches.
+        """
+
+        if self.bot.config.get('is_server_specific', False):
+            return "guild_id <> 0"
+        return "guild_id = 0"
+
+    async def cache_setup(self, db: vbu.Database):
+        """
+        Set up the cache for the users.
+        """
+
+        # Server specific bots can load each guild when it's first used
+        all_users = utils.FamilyTreeMember.all_users
+        is_server_specific = self.bot.config.get('is_server_specific', False)
+        lazy = is_server_specific and self.bot.config.get('lazy_load_guild_families', False)
+        if lazy:
+            self.clear_family_cache()
+            all_users.lazy = True
+            self.logger.info("Guild families will be cached on their first command")
+            return True
+
+        # Start from the shared store or the snapshot if we can
+        where = self.get_family_where()
+        if await self.load_shared_family_store(db, where):
+            self.logger.info("Family tree member caching complete")
+            return True
+        if await self.load_family_snapshot(db, where):
+            self.logger.info("Family tree member caching complete")
+            return True
+
+        # Clear the current cache, noting when we read the database from
+        # if we'll be saving a snapshot or shared store
+        watermark: Optional[float] = None
+        saves_cache = (
+            self.bot.config.get('family_snapshot_file')
+            or (
+                self.bot.config.get('shared_family_store_file')
+                and self.bot.config.get('shared_family_store_owner', False)
             )
+        )
+        if saves_cache:
+            watermark = await self.get_database_time(db)
+        self.clear_family_cache()
+        all_users.lazy = False
+
+        # Stream the family data in from the database. Rows go straight
+        # into the cache, unless we're building compact stores, which
+        # need each guild's rows all at once
+        compact = self.bot.config.get('compact_family_cache', False)
+        guild_rows: Dict[int, Tuple[List[types.MarriagesDB], List[types.ParentageDB]]]
+        guild_rows = collections.defaultdict(lambda: ([], []))
+        partnership_count, parent_count = 0, 0
+        try:
+            async for rows in self.stream_family_rows(db, "marriages", where):
+                partnership_count += len(rows)
+                if compact:
+                    for row in rows:
+                        guild_rows[row['guild_id']][0].append(row)
+                else:
+                    for row in rows:
+                        self.handle_partner(row)
+                await asyncio.sleep(0)
+            async for rows in self.stream_family_rows(db, "parents", where):
+                parent_count += len(rows)
+                if compact:
+                    for row in rows:
+                        guild_rows[row['guild_id']][1].append(row)
+                else:
+                    for row in rows:
+                        self.handle_parent(row)
+                await asyncio.sleep(0)
         except Exception as e:
             self.logger.critical(
                 (
@@ -168,19 +1004,20 @@ class CacheHandler(vbu.Cog[types.Bot]):
             )
             exit(1)
 
-        # Clear the current cache
-        self.logger.info("Clearing the cache of all family tree members")
-        utils.FamilyTreeMember.all_users.clear()
-
-        # Cache the family data - partners
-        self.logger.info(f"Caching {len(partnerships)} partnerships from partnerships")
-        async for i in aiterator(partnerships):
-            self.handle_partner(i)
-
-        # - children
-        self.logger.info(f"Caching {len(parents)} parents/children from parents")
-        async for i in aiterator(parents):
-            self.handle_parent(i)
+        # Build the compact stores
+        for guild_id, (guild_partnerships, guild_parents) in guild_rows.items():
+            await self.install_guild(guild_id, guild_partnerships, guild_parents)
+        guild_count = 0
+        for guild_cache in all_users.guilds():
+            guild_cache.loaded = True
+            guild_count += 1
+        self.logger.info(
+            f"Cached {partnership_count} partnerships and {parent_count} "
+            f"parents/children across {guild_count} guilds"
+        )
+        if watermark is not None:
+            await self.save_family_snapshot(watermark)
+            await self.save_shared_family_store(watermark)
 
         # And done
         self.logger.info("Family tree member caching complete")
@@ -3,6 +3,7 @@ from __future__ import annotations
 from typing import Optional
 import asyncio
 import collections
+import io
 from uuid import uuid4
 
 import discord
@@ -592,54 +593,48 @@ class Information(vbu.Cog[utils.types.Bot]):
         else:
             dot_code = await user_info.to_dot_script(self.bot, customisations)
 
-        # Write the dot to a file
+        # Send the dot itself if they asked for it
         filename_id = str(uuid4())
-        dot_filename = f'{self.bot.config["tree_file_location"]}/{filename_id}.gz'
-        try:
-            with open(dot_filename, 'w', encoding='utf-8') as a:
-                a.write(dot_code)
-        except Exception as e:
-            self.logger.error(f"Could not write to {dot_filename}")
-            raise e
         if send_dot:
-            file = discord.File(dot_filename)
+            file = discord.File(io.BytesIO(dot_code.encode('utf-8')), filename=f"{filename_id}.dot")
             await ctx.send(file=file)
 
         # Convert to an image
-        # http://www.graphviz.org/doc/info/output.html#d:png
-        image_filename = f'{self.bot.config["tree_file_location"].rstrip("/")}/{filename_id}.png'
-
         # if perks.tree_render_quality >= 1:
-        format_rendering_option = '-Tpng:cairo'  # normal colour, and antialising
+        format_rendering_option = 'png:cairo'  # normal colour, and antialising
         # else:
-        #     format_rendering_option = '-Tpng:gd'  # normal colour, no antialising
-
-        dot = await asyncio.create_subprocess_exec(
-            'dot',
-            format_rendering_option,
-            dot_filename,
-            '-o',
-            image_filename,
-            '-Gcharset=UTF-8',
-        )
-        await asyncio.wait_for(dot.wait(), 30.0)
+        #     format_rendering_option = 'png:gd'  # normal colour, no antialising
 
-        # Kill subprocess
+        # Wait for a renderer to be free - donators go to the front
+        # of the queue, and the size of the family is used to see how
+        # much work the tree is
+        perks = await utils.get_marriagebot_perks(self.bot, ctx.author.id)
+        renderer: utils.TreeRenderer = self.bot.get_cog("RenderHandler").renderer  # type: ignore
         try:
-            dot.kill()
-        except ProcessLookupError:
-            pass  # It already died
-        except Exception:
-            raise
+            image = await renderer.render(
+                dot_code,
+                tier=perks.tree_render_quality,
+                cost=user_info.family_member_count,
+                format=format_rendering_option,
+            )
+        except utils.RenderTooLarge:
+            return await ctx.send((
+                "I'm drawing a lot of family trees right now, and that family is too "
+                "big to draw until I'm less busy - please try again in a minute."
+            ))
+        except utils.RenderQueueFull:
+            return await ctx.send((
+                "I'm drawing a lot of family trees right now - "
+                "please try again in a minute."
+            ))
 
         # Send file
-        try:
-            file = discord.File(image_filename)
-        except FileNotFoundError:
+        if not image:
             return await ctx.send((
                 "I was unable to send your family tree image - "
                 "please try again later."
             ))
+        file = discord.File(io.BytesIO(image), filename=f"{filename_id}.png")
         text = "[Click here](https://marriagebot.xyz/) to customise your tree."
         if not stupid_tree:
             text += (
@@ -648,10 +643,6 @@ class Information(vbu.Cog[utils.types.Bot]):
             )
         await vbu.embeddify(ctx, text, file=file)
 
-        # Delete the files
-        asyncio.create_task(asyncio.create_subprocess_exec('rm', dot_filename))
-        asyncio.create_task(asyncio.create_subprocess_exec('rm', image_filename))
-
 
 def setup(bot: utils.types.Bot):
     x = Information(bot)
@@ -152,18 +152,9 @@ class Marriage(vbu.Cog[types.Bot]):
             )
 
         # Check the size of their trees
-        # TODO I can make this a util because I'm going to use it a couple times
         max_family_members = utils.get_max_family_members(ctx)
-        family_member_count = 0
         if author_tree.id not in self.bot.owner_ids:
-            for _ in author_tree.span(add_parent=True, expand_upwards=True):
-                if family_member_count >= max_family_members:
-                    break
-                family_member_count += 1
-            for _ in target_tree.span(add_parent=True, expand_upwards=True):
-                if family_member_count >= max_family_members:
-                    break
-                family_member_count += 1
+            family_member_count = author_tree.get_joined_family_member_count(target_tree)
             if family_member_count >= max_family_members:
                 await lock.unlock()
                 return await ctx.send(
@@ -226,8 +217,11 @@ class Marriage(vbu.Cog[types.Bot]):
         author_tree.add_partner(target.id)
         target_tree.add_partner(ctx.author.id)
         if dispatch_tmu:
-            await re.publish("TreeMemberUpdate", author_tree.to_json())
-            await re.publish("TreeMemberUpdate", target_tree.to_json())
+            self.bot.dispatch(
+                "family_tree_deltas",
+                family_guild_id,
+                utils.FamilyTreeDelta.for_marriage(author_tree.id, target_tree.id),
+            )
         await re.disconnect()
         await lock.unlock()
 
@@ -323,9 +317,11 @@ class Marriage(vbu.Cog[types.Bot]):
         partner_tree.remove_partner(user_tree.id)
 
         # Remove from redis
-        async with vbu.Redis() as re:
-            await re.publish("TreeMemberUpdate", user_tree.to_json())
-            await re.publish("TreeMemberUpdate", partner_tree.to_json())
+        self.bot.dispatch(
+            "family_tree_deltas",
+            family_guild_id,
+            utils.FamilyTreeDelta.for_divorce(user_tree.id, partner_tree.id),
+        )
 
         # Remove from database
         async with vbu.Database() as db:
@@ -1,19 +1,88 @@
 from __future__ import annotations
 
-from typing import Optional, Union
+from typing import Dict, Optional, Union
+import asyncio
 
 import discord
-from discord.ext import commands, vbu
+from discord.ext import commands, tasks, vbu
 
 from cogs import utils
 
 
+# How often names that have changed are written to Redis, and how many
+# can be waiting before they're written early
+NAME_FLUSH_SECONDS = 5
+NAME_FLUSH_BATCH_SIZE = 500
+
+
 class NameHandler(vbu.Cog):
 
-    async def save_name(self, user: Union[discord.User, discord.Member]):
-        utils.DiscordNameManager.get(user.id).name = str(user)
-        async with vbu.Redis() as re:
-            await re.set(f"UserName-{user.id}", str(user))
+    def __init__(self, bot: vbu.Bot):
+        super().__init__(bot)
+        name_cache = utils.DiscordNameManager.cached_names
+        name_cache.max_size = self.bot.config.get('name_cache_size', name_cache.max_size)
+        name_cache.ttl = self.bot.config.get('name_cache_ttl', name_cache.ttl)
+        self.pending_names: Dict[int, str] = {}
+        self.flush_lock = asyncio.Lock()
+        self.flush_pending_names.start()
+
+    def cog_unload(self):
+        self.flush_pending_names.stop()
+        if self.pending_names:
+            asyncio.create_task(self.flush_names())
+
+    @tasks.loop(seconds=NAME_FLUSH_SECONDS)
+    async def flush_pending_names(self):
+        """
+        Write any changed names to Redis.
+        """
+
+        await self.flush_names()
+
+    async def flush_names(self):
+        """
+        Write every name that's waiting to Redis, a batch at a time in a
+        single pipeline.
+        """
+
+        async with self.flush_lock:
+            if not self.pending_names:
+                return
+            pending, self.pending_names = self.pending_names, {}
+            items = [(f"UserName-{user_id}", name) for user_id, name in pending.items()]
+            try:
+                async with vbu.Redis() as re:
+                    pipe = re.conn.pipeline()
+                    for start in range(0, len(items), NAME_FLUSH_BATCH_SIZE):
+                        pipe.mset(dict(items[start:start + NAME_FLUSH_BATCH_SIZE]))
+                    await pipe.execute()
+
+            # Put them back to try again next time, unless they've been
+            # changed again since
+            except Exception as e:
+                for user_id, name in pending.items():
+                    self.pending_names.setdefault(user_id, name)
+                self.logger.error(f"Could not save {len(pending)} names to Redis", exc_info=e)
+
+    async def save_name(
+            self,
+            user: Union[discord.User, discord.Member],
+            force: bool = False):
+        """
+        Save a user's name. Names are only written to Redis if they've
+        changed (or if ``force`` is set), and are then written in
+        batches (see :func:`flush_names`).
+        """
+
+        name = str(user)
+        cached = utils.DiscordNameManager.get(user.id)
+        changed = cached.name != name
+        cached.name = name
+        if not changed and not force:
+            return
+        self.pending_names[user.id] = name
+        if len(self.pending_names) >= NAME_FLUSH_BATCH_SIZE:
+            await self.flush_names()
 
     @vbu.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -40,7 +109,8 @@ class NameHandler(vbu.Cog):
         Update a saved name inside of MarriageBot.
         """
 
-        await self.save_name(user or ctx.author)
+        await self.save_name(user or ctx.author, force=True)
+        await self.flush_names()
         await ctx.send("Updated :)")
 
 
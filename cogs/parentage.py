@@ -154,15 +154,7 @@ class Parentage(vbu.Cog[utils.types.Bot]):
 
         # Check the size of their trees
         max_family_members = utils.get_max_family_members(ctx)
-        family_member_count = 0
-        for _ in author_tree.span(add_parent=True, expand_upwards=True):
-            if family_member_count >= max_family_members:
-                break
-            family_member_count += 1
-        for _ in target_tree.span(add_parent=True, expand_upwards=True):
-            if family_member_count >= max_family_members:
-                break
-            family_member_count += 1
+        family_member_count = author_tree.get_joined_family_member_count(target_tree)
         if family_member_count >= max_family_members:
             await lock.unlock()
             return await ctx.send(
@@ -200,11 +192,14 @@ class Parentage(vbu.Cog[utils.types.Bot]):
         )
 
         # And we're done
-        target_tree._children.append(author_tree.id)
-        author_tree._parent = target.id
+        target_tree.add_child(author_tree)
+        author_tree.parent = target.id
         if dispatch_tmu:
-            await re.publish("TreeMemberUpdate", author_tree.to_json())
-            await re.publish("TreeMemberUpdate", target_tree.to_json())
+            self.bot.dispatch(
+                "family_tree_deltas",
+                family_guild_id,
+                utils.FamilyTreeDelta.for_adoption(target_tree.id, author_tree.id),
+            )
         await re.disconnect()
         await lock.unlock()
 
@@ -290,15 +285,7 @@ class Parentage(vbu.Cog[utils.types.Bot]):
 
         # Check the size of their trees
         max_family_members = utils.get_max_family_members(ctx)
-        family_member_count = 0
-        for _ in author_tree.span(add_parent=True, expand_upwards=True):
-            if family_member_count >= max_family_members:
-                break
-            family_member_count += 1
-        for _ in target_tree.span(add_parent=True, expand_upwards=True):
-            if family_member_count >= max_family_members:
-                break
-            family_member_count += 1
+        family_member_count = author_tree.get_joined_family_member_count(target_tree)
         if family_member_count >= max_family_members:
             await lock.unlock()
             return await ctx.send(
@@ -351,11 +338,14 @@ class Parentage(vbu.Cog[utils.types.Bot]):
         )
 
         # And we're done
-        author_tree._children.append(target.id)
-        target_tree._parent = author_tree.id
+        author_tree.add_child(target.id)
+        target_tree.parent = author_tree
         if dispatch_tmu:
-            await re.publish('TreeMemberUpdate', author_tree.to_json())
-            await re.publish('TreeMemberUpdate', target_tree.to_json())
+            self.bot.dispatch(
+                "family_tree_deltas",
+                family_guild_id,
+                utils.FamilyTreeDelta.for_adoption(author_tree.id, target_tree.id),
+            )
         await re.disconnect()
         await lock.unlock()
 
@@ -452,9 +442,11 @@ class Parentage(vbu.Cog[utils.types.Bot]):
         child_tree.parent = None
 
         # Remove from redis
-        async with vbu.Redis() as re:
-            await re.publish("TreeMemberUpdate", user_tree.to_json())
-            await re.publish("TreeMemberUpdate", child_tree.to_json())
+        self.bot.dispatch(
+            "family_tree_deltas",
+            family_guild_id,
+            utils.FamilyTreeDelta.for_disowns(user_tree.id, [child_tree.id]),
+        )
 
         # Remove from database
         async with vbu.Database() as db:
@@ -517,9 +509,11 @@ class Parentage(vbu.Cog[utils.types.Bot]):
         parent_tree.remove_child(ctx.author.id)
 
         # Ping them off over reids
-        async with vbu.Redis() as re:
-            await re.publish("TreeMemberUpdate", user_tree.to_json())
-            await re.publish("TreeMemberUpdate", parent_tree.to_json())
+        self.bot.dispatch(
+            "family_tree_deltas",
+            family_guild_id,
+            utils.FamilyTreeDelta.for_disowns(parent_tree.id, [user_tree.id]),
+        )
 
         # Remove their relationship from the database
         async with vbu.Database() as db:
@@ -570,8 +564,8 @@ class Parentage(vbu.Cog[utils.types.Bot]):
 
         # Disown em
         for child in child_trees:
-            child._parent = None
-        user_tree._children = []
+            child.parent = None
+        user_tree.children = []
 
         # Save em
         async with vbu.Database() as db:
@@ -588,9 +582,11 @@ class Parentage(vbu.Cog[utils.types.Bot]):
             )
 
         # Redis em
-        async with vbu.Redis() as re:
-            for person in child_trees + [user_tree]:
-                await re.publish("TreeMemberUpdate", person.to_json())
+        self.bot.dispatch(
+            "family_tree_deltas",
+            family_guild_id,
+            utils.FamilyTreeDelta.for_disowns(user_tree.id, [child.id for child in child_trees]),
+        )
 
         # Output to user
         await vbu.embeddify(
@@ -1,15 +1,53 @@
 from __future__ import annotations
 
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+import time
+import uuid
+
 import discord
 from discord.ext import vbu
 
 from cogs import utils
 
 
+# The most family tree deltas that are sent in a single message
+FAMILY_DELTA_BATCH_SIZE = 100
+
+# How long to wait after spotting missed deltas before resyncing, so that
+# the database has caught up and gaps close together are only resynced once
+FAMILY_DELTA_RESYNC_DELAY_SECONDS = 5
+
+# How many family tree delta stream entries are read (and applied) at once,
+# how long a read waits for new entries, and how long to wait before trying
+# again if reading fails
+FAMILY_DELTA_STREAM_READ_COUNT = 500
+FAMILY_DELTA_STREAM_BLOCK_MILLISECONDS = 5_000
+FAMILY_DELTA_STREAM_RETRY_SECONDS = 5
+
+
 class RedisHandler(vbu.Cog[utils.types.Bot]):
 
     def __init__(self, bot):
         super().__init__(bot)
+
+        # Family tree deltas that we're sending, the last sequence number
+        # sent for each guild, and the last sequence number (and when we got
+        # it) from each sender for each guild
+        self.delta_origin: str = uuid.uuid4().hex
+        self.outgoing_deltas: Dict[int, List[utils.FamilyTreeDelta]] = {}
+        self.delta_flush_lock = asyncio.Lock()
+        self.sent_delta_sequences: Dict[int, int] = {}
+        self.received_delta_sequences: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        self.pending_resyncs: Dict[int, float] = {}
+
+        # The ID of the last stream entry that we've read, if we're reading
+        # family tree deltas from a stream rather than pub/sub
+        self.family_delta_stream: Optional[str] = self.bot.config.get('family_delta_stream') or None
+        self.family_delta_stream_offset: Optional[str] = None
+        self.family_delta_stream_task: Optional[asyncio.Task] = None
+
         if vbu.RedisConnection.enabled:
             self.update_guild_prefix.start()
             self.update_max_family_members.start()
@@ -17,7 +55,12 @@ class RedisHandler(vbu.Cog[utils.types.Bot]):
             self.update_max_children.start()
             self.update_gifs_enabled.start()
             self.send_user_message.start()
+            self.blocked_user_add.start()
+            self.blocked_user_remove.start()
             self.tree_member_update.start()
+            self.family_tree_delta.start()
+            if self.family_delta_stream:
+                self.family_delta_stream_task = self.bot.loop.create_task(self.read_family_delta_stream())
 
     def cog_unload(self):
         self.update_guild_prefix.stop()
@@ -26,7 +69,12 @@ class RedisHandler(vbu.Cog[utils.types.Bot]):
         self.update_max_children.stop()
         self.update_gifs_enabled.stop()
         self.send_user_message.stop()
+        self.blocked_user_add.stop()
+        self.blocked_user_remove.stop()
         self.tree_member_update.stop()
+        self.family_tree_delta.stop()
+        if self.family_delta_stream_task is not None:
+            self.family_delta_stream_task.cancel()
 
     @vbu.redis_channel_handler("UpdateGuildPrefix")
     def update_guild_prefix(self, payload: utils.types.GuildPrefixPayload):
@@ -91,10 +139,204 @@ class RedisHandler(vbu.Cog[utils.types.Bot]):
         except (discord.NotFound, discord.Forbidden, AttributeError):
             pass
 
+    @vbu.redis_channel_handler("BlockedUserAdd")
+    def blocked_user_add(self, payload: utils.types.BlockedUserPayload):
+        """
+        Adds a blocked user to the cache.
+        """
+
+        utils.converters.UnblockedMember.blocked_users.add(payload['user_id'], payload['blocked_user_id'])
+
+    @vbu.redis_channel_handler("BlockedUserRemove")
+    def blocked_user_remove(self, payload: utils.types.BlockedUserPayload):
+        """
+        Removes a blocked user from the cache.
+        """
+
+        utils.converters.UnblockedMember.blocked_users.remove(payload['user_id'], payload['blocked_user_id'])
+
     @vbu.redis_channel_handler("TreeMemberUpdate")
     def tree_member_update(self, payload: utils.types.FamilyTreeMemberPayload):
+        if utils.FamilyTreeMember.all_users.defer_update(payload):
+            return
         utils.FamilyTreeMember(**payload)
 
+    @vbu.Cog.listener("on_family_tree_deltas")
+    async def queue_family_tree_deltas(
+            self,
+            guild_id: int,
+            deltas: List[utils.FamilyTreeDelta]):
+        """
+        Queue up changes that have been made to our cache to be sent to
+        the other clusters. Anything queued at the same time goes out
+        together.
+        """
+
+        if not vbu.RedisConnection.enabled:
+            return
+        self.outgoing_deltas.setdefault(guild_id, []).extend(deltas)
+        await asyncio.sleep(0)
+        await self.flush_family_tree_deltas()
+
+    async def flush_family_tree_deltas(self):
+        """
+        Send every queued family tree delta to Redis, numbering each message
+        per guild so that anyone who misses one can tell.
+        """
+
+        async with self.delta_flush_lock:
+            outgoing, self.outgoing_deltas = self.outgoing_deltas, {}
+            if not outgoing:
+                return
+            messages: List[utils.types.FamilyTreeDeltaPayload] = []
+            for guild_id, deltas in outgoing.items():
+                for start in range(0, len(deltas), FAMILY_DELTA_BATCH_SIZE):
+                    sequence = self.sent_delta_sequences.get(guild_id, 0) + 1
+                    self.sent_delta_sequences[guild_id] = sequence
+                    messages.append({
+                        "origin": self.delta_origin,
+                        "guild_id": guild_id,
+                        "sequence": sequence,
+                        "deltas": [i.to_json() for i in deltas[start:start + FAMILY_DELTA_BATCH_SIZE]],
+                    })
+
+            # Anything that doesn't get sent shows up as a gap in the sequence
+            # numbers for the other clusters, which will resync
+            try:
+                async with vbu.Redis() as re:
+                    pipe = re.conn.pipeline()
+                    for message in messages:
+                        if self.family_delta_stream:
+                            pipe.xadd(
+                                self.family_delta_stream,
+                                {"payload": json.dumps(message)},
+                                max_len=self.bot.config.get('family_delta_stream_max_length', 100_000),
+                            )
+                        else:
+                            pipe.publish("FamilyTreeDelta", json.dumps(message))
+                    await pipe.execute()
+            except Exception as e:
+                self.logger.error(f"Could not send {len(messages)} family tree delta messages", exc_info=e)
+
+    @vbu.redis_channel_handler("FamilyTreeDelta")
+    def family_tree_delta(self, payload: utils.types.FamilyTreeDeltaPayload):
+        """
+        Apply changes made to the cache by another cluster.
+        """
+
+        self.handle_family_tree_delta(payload)
+
+    def handle_family_tree_delta(self, payload: utils.types.FamilyTreeDeltaPayload):
+        """
+        Apply a message of family tree deltas from another cluster, whether
+        it came through pub/sub or the stream.
+        """
+
+        origin, guild_id, sequence = payload['origin'], payload['guild_id'], payload['sequence']
+        if origin == self.delta_origin:
+            return
+
+        # See if we've missed anything from this sender
+        key = (origin, guild_id)
+        last = self.received_delta_sequences.get(key)
+        if last is not None:
+            last_sequence, last_received_at = last
+            if sequence <= last_sequence:
+                return  # Already seen it
+            if sequence > last_sequence + 1:
+                self.logger.warning(
+                    f"Missed {sequence - last_sequence - 1} family tree delta messages "
+                    f"for guild ID {guild_id}; resyncing"
+                )
+                self.request_resync(guild_id, last_received_at)
+        self.received_delta_sequences[key] = (sequence, time.time())
+
+        # And apply the changes
+        if utils.FamilyTreeMember.all_users.defer_update(payload):
+            return
+        utils.FamilyTreeDelta.apply_payload(payload)
+
+    async def read_family_delta_stream(self):
+        """
+        Read family tree deltas from the stream, a batch at a time, for as
+        long as the cog is loaded. Our place in the stream is kept between
+        reads, so if the connection drops we carry on from where we were
+        rather than losing anything sent in the meantime.
+        """
+
+        assert self.family_delta_stream
+        stream = self.family_delta_stream
+        while True:
+            try:
+                # Blocking reads hold onto their connection, so use our own
+                # rather than one shared with the rest of the bot
+                with await vbu.RedisConnection.pool as conn:
+
+                    # Start from wherever the stream was when we started up, so
+                    # nothing sent while the cache is being loaded is missed
+                    if self.family_delta_stream_offset is None:
+                        latest = await conn.xrevrange(stream, count=1)
+                        self.family_delta_stream_offset = latest[0][0].decode() if latest else "0-0"
+                        await self.wait_for_family_cache()
+
+                    # And apply everything that's sent after that
+                    while True:
+                        entries = await conn.xread(
+                            [stream],
+                            timeout=FAMILY_DELTA_STREAM_BLOCK_MILLISECONDS,
+                            count=FAMILY_DELTA_STREAM_READ_COUNT,
+                            latest_ids=[self.family_delta_stream_offset],
+                        )
+                        for _, entry_id, fields in entries:
+                            try:
+                                self.handle_family_tree_delta(json.loads(fields[b"payload"]))
+                            except Exception as e:
+                                self.logger.error(f"Could not apply family tree delta stream entry {entry_id!r}", exc_info=e)
+                            self.family_delta_stream_offset = entry_id.decode()
+                        await asyncio.sleep(0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(
+                    f"Lost the family tree delta stream at {self.family_delta_stream_offset}; reconnecting",
+                    exc_info=e,
+                )
+                await asyncio.sleep(FAMILY_DELTA_STREAM_RETRY_SECONDS)
+
+    async def wait_for_family_cache(self):
+        """
+        Wait until the bot has run its startup method (and so loaded the
+        family cache).
+        """
+
+        await self.bot.wait_until_ready()
+        if self.bot.startup_method is not None:
+            await asyncio.wait([self.bot.startup_method])
+
+    def request_resync(self, guild_id: int, since: float):
+        """
+        Ask for a guild's families to be resynced from the database after a
+        short delay. Asking again before that happens just widens the window.
+
+        Parameters
+        ----------
+        guild_id : int
+            The guild to resync.
+        since : float
+            The UNIX timestamp of the last update that we know we have.
+        """
+
+        if guild_id in self.pending_resyncs:
+            self.pending_resyncs[guild_id] = min(self.pending_resyncs[guild_id], since)
+            return
+        self.pending_resyncs[guild_id] = since
+        self.bot.loop.create_task(self.resync_after_delay(guild_id))
+
+    async def resync_after_delay(self, guild_id: int):
+        await asyncio.sleep(FAMILY_DELTA_RESYNC_DELAY_SECONDS)
+        since = self.pending_resyncs.pop(guild_id)
+        self.bot.dispatch("resync_guild_families", guild_id, since)
+
 
 def setup(bot: vbu.Bot):
     x = RedisHandler(bot)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+
+from discord.ext import tasks, vbu
+
+from cogs import utils
+from cogs.utils import types
+
+
+class RenderHandler(vbu.Cog[types.Bot]):
+
+    def __init__(self, bot: types.Bot):
+        super().__init__(bot)
+
+        # Share a pool of render tokens with the other processes on this host
+        tokens = None
+        if (host_workers := self.bot.config.get('tree_render_host_workers', 0)):
+            if vbu.RedisConnection.enabled:
+                tokens = utils.RedisRenderTokenPool(host_workers)
+            else:
+                tokens = utils.FileRenderTokenPool(
+                    self.bot.config.get('tree_render_token_directory', '/tmp/marriagebot-render-tokens'),
+                    host_workers,
+                )
+
+        self.renderer = utils.TreeRenderer(
+            workers=self.bot.config.get('tree_render_workers', 4),
+            max_queue_size=self.bot.config.get('tree_render_queue_size', 50),
+            cache_size=self.bot.config.get('tree_render_cache_size', 64 * 1024 * 1024),
+            redis_ttl=self.bot.config.get('tree_render_cache_redis_ttl', 0),
+            large_cost=self.bot.config.get('tree_render_large_family_size', 250),
+            tokens=tokens,
+        )
+        self.renderer.start()
+        self.post_render_stats.start()
+
+    def cog_unload(self):
+        self.post_render_stats.cancel()
+        asyncio.create_task(self.renderer.stop())
+
+    @tasks.loop(seconds=10)
+    async def post_render_stats(self):
+        """
+        Post the queue depth (for each tier) and counters for the tree
+        renderer, its cache and the host's render tokens to statsd.
+        """
+
+        async with self.bot.stats() as stats:
+            for name, value in self.renderer.stats().items():
+                stats.gauge(
+                    f"marriagebot.render.{name}",
+                    value=value,
+                    tags={"cluster": self.bot.cluster},
+                )
+            for name, value in self.renderer.cache.stats().items():
+                stats.gauge(
+                    f"marriagebot.render.cache.{name}",
+                    value=value,
+                    tags={"cluster": self.bot.cluster},
+                )
+            if self.renderer.tokens is not None:
+                stats.gauge(
+                    "marriagebot.render.host_tokens_in_use",
+                    value=await self.renderer.tokens.in_use(),
+                    tags={"cluster": self.bot.cluster},
+                )
+            for tier, value in self.renderer.waiting.items():
+                stats.gauge(
+                    "marriagebot.render.queue_depth_by_tier",
+                    value=value,
+                    tags={"cluster": self.bot.cluster, "tier": str(tier)},
+                )
+
+
+def setup(bot: types.Bot):
+    x = RenderHandler(bot)
+    bot.add_cog(x)
@@ -379,9 +379,11 @@ class ServerSpecific(vbu.Cog[utils.types.Bot]):
         # Update cache
         user_a_tree.add_partner(user_b)
         user_b_tree.add_partner(user_a)
-        async with vbu.Redis() as re:
-            await re.publish("TreeMemberUpdate", user_a_tree.to_json())
-            await re.publish("TreeMemberUpdate", user_b_tree.to_json())
+        self.bot.dispatch(
+            "family_tree_deltas",
+            family_guild_id,
+            utils.FamilyTreeDelta.for_marriage(user_a_tree.id, user_b_tree.id),
+        )
 
     @commands.command(
         application_command_meta=commands.ApplicationCommandMeta(
@@ -433,9 +435,11 @@ class ServerSpecific(vbu.Cog[utils.types.Bot]):
         # Update cache
         user_b_tree = user_a_tree.remove_partner(user_b, return_added=True)
         user_b_tree.remove_partner(user_a)
-        async with vbu.Redis() as re:
-            await re.publish("TreeMemberUpdate", user_a_tree.to_json())
-            await re.publish("TreeMemberUpdate", user_b_tree.to_json())
+        self.bot.dispatch(
+            "family_tree_deltas",
+            family_guild_id,
+            utils.FamilyTreeDelta.for_divorce(user_a_tree.id, user_b_tree.id),
+        )
         await ctx.send("Consider it done.")
 
     @commands.command(
@@ -517,11 +521,13 @@ class ServerSpecific(vbu.Cog[utils.types.Bot]):
                 return await ctx.send("I ran into an error saving your family data.")
 
         # Update cache
-        parent_tree._children.append(child.id)
-        child_tree._parent = parent.id
-        async with vbu.Redis() as re:
-            await re.publish('TreeMemberUpdate', parent_tree.to_json())
-            await re.publish('TreeMemberUpdate', child_tree.to_json())
+        parent_tree.add_child(child.id)
+        child_tree.parent = parent.id
+        self.bot.dispatch(
+            "family_tree_deltas",
+            family_guild_id,
+            utils.FamilyTreeDelta.for_adoption(parent_tree.id, child_tree.id),
+        )
         await ctx.send(f"Added **{child_name}** to **{parent_name}**'s children list.")
 
     @commands.command(
@@ -574,9 +580,11 @@ class ServerSpecific(vbu.Cog[utils.types.Bot]):
             pass
         parent = child_tree.parent
         child_tree.parent = None
-        async with vbu.Redis() as re:
-            await re.publish("TreeMemberUpdate", child_tree.to_json())
-            await re.publish("TreeMemberUpdate", parent.to_json())
+        self.bot.dispatch(
+            "family_tree_deltas",
+            family_guild_id,
+            utils.FamilyTreeDelta.for_disowns(parent.id, [child_tree.id]),
+        )
         await ctx.send("Consider it done.")
 
 
@@ -17,9 +17,15 @@ from cogs.utils.proposal_message_checker import (
     escape_markdown,
 )
 from cogs.utils.customised_tree_user import CustomisedTreeUser
+from cogs.utils.family_tree.compact_store import CompactFamilyStore
+from cogs.utils.family_tree.family_cache import GuildFamilyCache
+from cogs.utils.family_tree.family_snapshot import FamilySnapshot
 from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+from cogs.utils.family_tree.family_tree_delta import FamilyTreeDelta
 from cogs.utils.family_tree.relationship_string_simplifier import RelationshipStringSimplifier
 from cogs.utils.discord_name_manager import DiscordNameManager
+from cogs.utils.tree_renderer import TreeRenderer, RenderCache, RenderQueueFull, RenderTooLarge
+from cogs.utils.render_tokens import RenderTokenPool, FileRenderTokenPool, RedisRenderTokenPool
 from cogs.utils.perks_handler import (
     get_marriagebot_perks,
     TIER_NONE,
@@ -47,8 +53,19 @@ __all__ = (
     'escape_markdown',
     'CustomisedTreeUser',
     'FamilyTreeMember',
+    'FamilyTreeDelta',
+    'CompactFamilyStore',
+    'GuildFamilyCache',
+    'FamilySnapshot',
     'RelationshipStringSimplifier',
     'DiscordNameManager',
+    'TreeRenderer',
+    'RenderCache',
+    'RenderQueueFull',
+    'RenderTooLarge',
+    'RenderTokenPool',
+    'FileRenderTokenPool',
+    'RedisRenderTokenPool',
     'get_marriagebot_perks',
     'TIER_NONE',
     'TIER_ONE',
@@ -1,6 +1,7 @@
-from cogs.utils.converters.user_block import UnblockedMember
+from cogs.utils.converters.user_block import BlockedUserCache, UnblockedMember
 
 
 __all__ = (
+    'BlockedUserCache',
     'UnblockedMember',
 )
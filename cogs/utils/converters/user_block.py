@@ -1,31 +1,166 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Set, Tuple
+import random
+import sys
+
 import discord
 from discord.ext import commands, vbu
 
 
 __all__ = (
     'BlockedUserError',
+    'BlockedUserCache',
     'UnblockedMember',
 )
 
 
+# How often a conversion answered from the cache is also checked
+# against the database (in the background)
+BLOCKED_USER_CHECK_RATE = 0.01
+
+
 class BlockedUserError(commands.BadArgument):
     """
     The error raised when a given user is blocked by the author.
     """
 
 
+class BlockedUserCache:
+    """
+    An in-memory copy of the ``blocked_user`` table, as the set of users
+    that each user has blocked. It's loaded in bulk at startup and kept
+    up to date by the ``BlockedUserAdd`` and ``BlockedUserRemove`` Redis
+    events; until it's loaded, nothing is answered from it.
+    """
+
+    __slots__ = (
+        '_blocked',
+        'loaded',
+        'hits',
+        'misses',
+        'checks',
+        'mismatches',
+    )
+
+    def __init__(self):
+        self._blocked: Dict[int, Set[int]] = {}
+        self.loaded: bool = False
+        self.hits: int = 0
+        self.misses: int = 0
+        self.checks: int = 0
+        self.mismatches: int = 0
+
+    def __len__(self) -> int:
+        return sum(len(i) for i in self._blocked.values())
+
+    def replace(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """
+        Replace everything in the cache with the given
+        ``(user_id, blocked_user_id)`` pairs, and mark it as loaded.
+        """
+
+        self._blocked.clear()
+        for user_id, blocked_user_id in pairs:
+            self._blocked.setdefault(user_id, set()).add(blocked_user_id)
+        self.loaded = True
+
+    def add(self, user_id: int, blocked_user_id: int) -> None:
+        """
+        Note that a user has blocked someone.
+        """
+
+        self._blocked.setdefault(user_id, set()).add(blocked_user_id)
+
+    def remove(self, user_id: int, blocked_user_id: int) -> None:
+        """
+        Note that a user has unblocked someone.
+        """
+
+        blocked = self._blocked.get(user_id)
+        if blocked is None:
+            return
+        blocked.discard(blocked_user_id)
+        if not blocked:
+            del self._blocked[user_id]
+
+    def is_blocked(self, user_id: int, blocked_user_id: int) -> Optional[bool]:
+        """
+        See if a user has blocked someone.
+
+        Returns
+        -------
+        Optional[bool]
+            Whether or not they're blocked, or ``None`` if the cache
+            isn't loaded.
+        """
+
+        if not self.loaded:
+            self.misses += 1
+            return None
+        self.hits += 1
+        blocked = self._blocked.get(user_id)
+        return blocked is not None and blocked_user_id in blocked
+
+    def nbytes(self) -> int:
+        """
+        Get a rough count of the bytes used by the cache.
+        """
+
+        return sys.getsizeof(self._blocked) + sum(
+            sys.getsizeof(i) for i in self._blocked.values()
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get how many users have blocks cached, whether the cache is
+        loaded, the lookup counters and how many of the spot checks
+        against the database found a stale entry.
+        """
+
+        return {
+            "size": len(self),
+            "loaded": int(self.loaded),
+            "hits": self.hits,
+            "misses": self.misses,
+            "checks": self.checks,
+            "mismatches": self.mismatches,
+            "bytes": self.nbytes(),
+        }
+
+
 class UnblockedMember(discord.Member):
     """
     A modified member converter to automatically checked if the
     author is blocked by the given user.
     """
 
+    blocked_users = BlockedUserCache()
+
     @classmethod
     async def convert(
             cls,
             ctx: vbu.Context,
             argument: str):
         user = await commands.MemberConverter().convert(ctx, argument)
+
+        # Use the cache if we can, checking it against the database
+        # every so often
+        blocked = cls.blocked_users.is_blocked(user.id, ctx.author.id)
+        if blocked is None:
+            blocked = await cls.fetch_is_blocked(user.id, ctx.author.id)
+        elif random.random() < BLOCKED_USER_CHECK_RATE:
+            ctx.bot.loop.create_task(cls.check_cache(ctx.bot, user.id, ctx.author.id, blocked))
+        if blocked:
+            raise BlockedUserError(f"You have been blocked by {user.mention}.")
+        return user
+
+    @staticmethod
+    async def fetch_is_blocked(user_id: int, blocked_user_id: int) -> bool:
+        """
+        See if a user has blocked someone, from the database.
+        """
+
         async with vbu.Database() as db:
             data = await db.call(
                 """
@@ -38,8 +173,32 @@ class UnblockedMember(discord.Member):
                 AND
                     blocked_user_id = $2
                 """,
-                user.id, ctx.author.id,
+                user_id, blocked_user_id,
             )
-        if data:
-            raise BlockedUserError(f"You have been blocked by {user.mention}.")
-        return user
+        return bool(data)
+
+    @classmethod
+    async def check_cache(
+            cls,
+            bot: vbu.Bot,
+            user_id: int,
+            blocked_user_id: int,
+            cached: bool) -> None:
+        """
+        Check a cached answer against the database, fixing the cache if
+        they don't match.
+        """
+
+        blocked = await cls.fetch_is_blocked(user_id, blocked_user_id)
+        cls.blocked_users.checks += 1
+        if blocked == cached:
+            return
+        cls.blocked_users.mismatches += 1
+        bot.logger.warning(
+            f"Blocked user cache had {cached} for user ID {user_id} blocking "
+            f"user ID {blocked_user_id}, but the database has {blocked}"
+        )
+        if blocked:
+            cls.blocked_users.add(user_id, blocked_user_id)
+        else:
+            cls.blocked_users.remove(user_id, blocked_user_id)
@@ -1,23 +1,146 @@
 from __future__ import annotations
 
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional, Union
+import collections
+import sys
+import time
 
 from discord.ext import vbu
 
 
 __all__ = (
+    'NameCache',
     'DiscordNameManager',
 )
 
 
+class NameCache:
+    """
+    A bounded LRU cache of the names of users, keyed by user ID. Each name
+    is only trusted for ``ttl`` seconds after it was last set, after which
+    it's fetched again (though the old name is kept to fall back on).
+    """
+
+    __slots__ = (
+        'max_size',
+        'ttl',
+        '_cache',
+        'hits',
+        'misses',
+        'evictions',
+    )
+
+    def __init__(self, max_size: int = 100_000, ttl: float = 15 * 60):
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self._cache: collections.OrderedDict[int, DiscordNameManager]
+        self._cache = collections.OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, user_id: int) -> Optional[DiscordNameManager]:
+        """
+        Get the cached object for a user, marking it as recently used.
+        """
+
+        v = self._cache.get(user_id)
+        if v is not None:
+            self._cache.move_to_end(user_id)
+        return v
+
+    def add(self, manager: DiscordNameManager) -> None:
+        """
+        Cache the object for a user, evicting the least recently used if
+        the cache is full.
+        """
+
+        self._cache[manager.user_id] = manager
+        self._cache.move_to_end(manager.user_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def get_name(
+            self,
+            user_id: int,
+            ignore_name_validity: bool = False) -> Optional[str]:
+        """
+        Get the cached name for a user, if we have one that's still valid.
+
+        Parameters
+        ----------
+        user_id : int
+            The ID of the user.
+        ignore_name_validity : bool, optional
+            Whether to give back the cached name even if it's expired.
+
+        Returns
+        -------
+        Optional[str]
+            The user's name, or ``None`` if it needs fetching.
+        """
+
+        v = self.get(user_id)
+        if v is not None and v._name and (ignore_name_validity or v.name_is_valid):
+            self.hits += 1
+            return v._name
+        self.misses += 1
+        return None
+
+    def clear(self) -> None:
+        """
+        Forget every cached name. The hit, miss and eviction counters
+        keep going.
+        """
+
+        self._cache.clear()
+
+    def nbytes(self) -> int:
+        """
+        Get a rough count of the bytes used by the cache. This walks every
+        cached name, so it's not something to call often.
+        """
+
+        total = sys.getsizeof(self._cache)
+        for user_id, v in self._cache.items():
+            total += sys.getsizeof(user_id) + sys.getsizeof(v)
+            if v._name is not None:
+                total += sys.getsizeof(v._name)
+        return total
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Get the number of cached names against the limit, the hit rate
+        of name lookups, and how many names have been evicted.
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes": self.nbytes(),
+        }
+
+
 class DiscordNameManager:
 
-    cached_names: Dict[int, DiscordNameManager] = {}
+    cached_names: NameCache = NameCache()
+
+    # The most keys that we'll ask Redis for in a single MGET
+    bulk_fetch_size: int = 1_000
 
     __slots__ = (
         "user_id",
         "_name",
-        "age",
+        "updated_at",
     )
 
     def __init__(
@@ -26,31 +149,32 @@ class DiscordNameManager:
             name: Optional[str] = None):
         self.user_id: int = user_id
         self._name: Optional[str] = name
-        self.age: int = 0 if self._name else 1_000
-        self.cached_names[self.user_id] = self
+        self.updated_at: float = time.monotonic()
+        self.cached_names.add(self)
 
     @classmethod
     def get(cls, id: int) -> DiscordNameManager:
-        try:
-            return cls.cached_names[id]
-        except KeyError:
+        v = cls.cached_names.get(id)
+        if v is None:
             return cls(id)
+        return v
 
     @property
     def name(self) -> Optional[str]:
-        self.age += 1
         return self._name
 
     @name.setter
     def name(self, new_name: str):
         if new_name is None:
             return None
-        self.age = 0
+        self.updated_at = time.monotonic()
         self._name = new_name
 
     @property
     def name_is_valid(self):
-        return self.age <= 3
+        if self._name is None:
+            return False
+        return time.monotonic() - self.updated_at <= self.cached_names.ttl
 
     async def fetch_name(self, bot: vbu.Bot) -> str:
         """
@@ -113,23 +237,64 @@ class DiscordNameManager:
             The user's name.
         """
 
-        # Grab our cached object
-        v = cls.cached_names.get(user_id)
-        if v is None:
-            v = cls(user_id)
-
-        # See if it has a name
-        if v.name_is_valid or ignore_name_validity:
-            name = v.name
-            if name:
-                if ignore_name_validity:
-                    v.age -= 1  # Don't count this towards name validity so we don't deal with the cache
-                if name.endswith("#0"):
-                    return name[:-2]
-                return name
-
-        # Grab a new name from the cache for them
-        ret = await v.fetch_name(bot)
-        if ret.endswith("#0"):
-            return ret[:-2]
-        return ret
+        # See if we have a name cached for them, and grab a new one if not
+        name = cls.cached_names.get_name(user_id, ignore_name_validity)
+        if name is None:
+            name = await cls.get(user_id).fetch_name(bot)
+        if name.endswith("#0"):
+            return name[:-2]
+        return name
+
+    @classmethod
+    async def fetch_names_by_ids(
+            cls,
+            bot: vbu.Bot,
+            user_ids: Iterable[int],
+            ignore_name_validity: bool = False) -> Dict[int, str]:
+        """
+        Get the names for a group of users given their IDs. This works the
+        same as :func:`fetch_name_by_id`, but any names that need fetching
+        are grabbed from Redis together rather than one at a time.
+
+        Parameters
+        ----------
+        bot : vbu.Bot
+            The bot instance that we can use to fetch from the API/Redis with.
+        user_ids : Iterable[int]
+            The IDs of the users we want to grab the names of.
+        ignore_name_validity : bool, optional
+            Whether to ignore the "should we re-fetch the name" check.
+
+        Returns
+        -------
+        Dict[int, str]
+            Each user's name, keyed by their ID.
+        """
+
+        # Use whatever names we have cached already
+        names: Dict[int, str] = {}
+        to_fetch: List[DiscordNameManager] = []
+        for user_id in dict.fromkeys(user_ids):
+            name = cls.cached_names.get_name(user_id, ignore_name_validity)
+            if name is None:
+                to_fetch.append(cls.get(user_id))
+            else:
+                names[user_id] = name
+
+        # Get the rest from Redis in as few round trips as we can
+        if to_fetch:
+            async with vbu.Redis() as re:
+                for start in range(0, len(to_fetch), cls.bulk_fetch_size):
+                    chunk = to_fetch[start:start + cls.bulk_fetch_size]
+                    values = await re.conn.mget(*[f"UserName-{v.user_id}" for v in chunk])
+                    for v, value in zip(chunk, values):
+                        if value:
+                            v.name = names[v.user_id] = value.decode()
+                        else:
+                            names[v.user_id] = v.name or "Deleted User"
+
+        # And give them back without the discriminator for migrated users
+        return {
+            user_id: name[:-2] if name.endswith("#0") else name
+            for user_id, name in names.items()
+        }
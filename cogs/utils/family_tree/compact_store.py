@@ -0,0 +1,497 @@
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from array import array
+import bisect
+import mmap
+import os
+import struct
+
+if TYPE_CHECKING:
+    from cogs.utils import types
+
+
+__all__ = (
+    'CompactFamilyStore',
+)
+
+
+def _build_adjacency(
+        size: int,
+        links: List[Tuple[int, int]]) -> Tuple[array, array]:
+    """
+    Build a CSR-style adjacency list (an offsets column and a targets
+    column) from a list of ``(node_index, target_id)`` pairs. The order of
+    the pairs is kept for each node, and duplicates are dropped.
+    """
+
+    # Count how many links each node has
+    counts = array('q', bytes(8 * (size + 1)))
+    for node, _ in links:
+        counts[node + 1] += 1
+    for i in range(size):
+        counts[i + 1] += counts[i]
+    offsets = counts
+
+    # Drop everything into place, keeping the order that we were given
+    targets = array('q', bytes(8 * len(links)))
+    fill = array('q', offsets[:-1])
+    for node, target in links:
+        targets[fill[node]] = target
+        fill[node] += 1
+
+    # Go back through and take out anything that's been added twice
+    compact_offsets = array('q', bytes(8 * (size + 1)))
+    compact_targets = array('q')
+    for node in range(size):
+        start, end = offsets[node], offsets[node + 1]
+        if end - start > 1:
+            seen = set()
+            for target in targets[start:end]:
+                if target not in seen:
+                    seen.add(target)
+                    compact_targets.append(target)
+        else:
+            compact_targets.extend(targets[start:end])
+        compact_offsets[node + 1] = len(compact_targets)
+    return compact_offsets, compact_targets
+
+
+def _build_families(
+        size: int,
+        links: List[Tuple[int, int]]) -> Tuple[array, array]:
+    """
+    Label each node with the family (connected part of the graph) that
+    it's in, given a list of ``(node_index, node_index)`` links. Gives
+    back the label column and a column of family sizes, indexed by label.
+    """
+
+    roots = array('q', range(size))
+
+    def find(index: int) -> int:
+        while (parent := roots[index]) != index:
+            roots[index] = roots[parent]
+            index = parent
+        return index
+
+    for a, b in links:
+        a, b = find(a), find(b)
+        if a != b:
+            roots[max(a, b)] = min(a, b)
+    families = array('q', bytes(8 * size))
+    family_sizes = array('q', bytes(8 * size))
+    for index in range(size):
+        root = find(index)
+        families[index] = root
+        family_sizes[root] += 1
+    return families, family_sizes
+
+
+class CompactFamilyStore:
+    """
+    A read-only store of family relations held in flat arrays rather than
+    in a dict of :class:`FamilyTreeMember` objects.
+
+    Users are sorted by guild and then by ID, so each guild is one slice
+    of the ID column. Guild IDs are stored once per guild (alongside the
+    offset where that guild's slice starts) rather than once per user.
+    Children and partners are each an offsets column plus a targets
+    column (CSR). Each user's family (connected part of the tree) is
+    worked out when the store is built, so family sizes don't need the
+    family index.
+
+    The store never changes. When a family is about to be changed, the
+    whole family is copied out into regular members (see
+    :func:`FamilyTreeMember._materialise_families`) and the store just
+    remembers that it isn't the source for that family any more.
+
+    A store can be saved to a file and memory mapped back in (see
+    :func:`save` and :func:`load`), in which case its columns are views
+    over the file rather than arrays. Every process that maps the same
+    file shares the same memory.
+    """
+
+    MAGIC = b"MBFAMSTR"
+    VERSION = 2
+
+    # magic, version, is server specific, watermark, guilds, users,
+    # children, partners
+    HEADER = struct.Struct("=8sII d QQQQ")
+
+    __slots__ = (
+        'guild_ids',
+        'guild_offsets',
+        '_guild_positions',
+        'ids',
+        'parents',
+        'child_offsets',
+        'child_ids',
+        'partner_offsets',
+        'partner_ids',
+        'families',
+        'family_sizes',
+        '_materialised',
+    )
+
+    def __init__(
+            self,
+            guild_ids: array,
+            guild_offsets: array,
+            ids: array,
+            parents: array,
+            child_offsets: array,
+            child_ids: array,
+            partner_offsets: array,
+            partner_ids: array,
+            families: array,
+            family_sizes: array):
+        self.guild_ids: array = guild_ids
+        self.guild_offsets: array = guild_offsets
+        self._guild_positions: Dict[int, int] = {
+            guild_id: position
+            for position, guild_id in enumerate(guild_ids)
+        }
+        self.ids: array = ids
+        self.parents: array = parents
+        self.child_offsets: array = child_offsets
+        self.child_ids: array = child_ids
+        self.partner_offsets: array = partner_offsets
+        self.partner_ids: array = partner_ids
+        self.families: array = families
+        self.family_sizes: array = family_sizes
+        self._materialised: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(
+            cls,
+            partnerships: Iterable[types.MarriagesDB],
+            parents: Iterable[types.ParentageDB]) -> CompactFamilyStore:
+        """
+        Build a store from rows of the marriages and parents tables.
+
+        This gives the same relations as running each row through
+        ``CacheHandler.handle_partner`` and ``CacheHandler.handle_parent``.
+
+        Parameters
+        ----------
+        partnerships : Iterable[types.MarriagesDB]
+            The rows from the marriages table.
+        parents : Iterable[types.ParentageDB]
+            The rows from the parents table.
+
+        Returns
+        -------
+        CompactFamilyStore
+            The built store.
+        """
+
+        # Work out every user that we're going to store
+        partner_links: List[Tuple[int, int, int]] = []
+        parent_links: List[Tuple[int, int, int]] = []
+        users: Set[Tuple[int, int]] = set()
+        for row in partnerships:
+            guild_id, user_id, partner_id = row['guild_id'], row['user_id'], row['partner_id']
+            partner_links.append((guild_id, user_id, partner_id))
+            users.add((guild_id, user_id))
+            users.add((guild_id, partner_id))
+        for row in parents:
+            guild_id, parent_id, child_id = row['guild_id'], row['parent_id'], row['child_id']
+            parent_links.append((guild_id, parent_id, child_id))
+            users.add((guild_id, parent_id))
+            users.add((guild_id, child_id))
+
+        # Sort them by guild and ID, and work out where each guild sits
+        ordered = sorted(users)
+        ids = array('q', [i for _, i in ordered])
+        guild_ids = array('q')
+        guild_offsets = array('q')
+        for index, (guild_id, _) in enumerate(ordered):
+            if not guild_ids or guild_ids[-1] != guild_id:
+                guild_ids.append(guild_id)
+                guild_offsets.append(index)
+        guild_offsets.append(len(ordered))
+        index_of = {key: index for index, key in enumerate(ordered)}
+        del ordered, users
+
+        # Link everyone together
+        partners: List[Tuple[int, int]] = []
+        children: List[Tuple[int, int]] = []
+        joins: List[Tuple[int, int]] = []
+        for guild_id, user_id, partner_id in partner_links:
+            user_index = index_of[(guild_id, user_id)]
+            partner_index = index_of[(guild_id, partner_id)]
+            partners.append((user_index, partner_id))
+            partners.append((partner_index, user_id))
+            joins.append((user_index, partner_index))
+        parent_column = array('q', bytes(8 * len(ids)))
+        for guild_id, parent_id, child_id in parent_links:
+            parent_index = index_of[(guild_id, parent_id)]
+            child_index = index_of[(guild_id, child_id)]
+            children.append((parent_index, child_id))
+            parent_column[child_index] = parent_id
+            joins.append((parent_index, child_index))
+        del index_of, partner_links, parent_links
+        child_offsets, child_ids = _build_adjacency(len(ids), children)
+        partner_offsets, partner_ids = _build_adjacency(len(ids), partners)
+        families, family_sizes = _build_families(len(ids), joins)
+        return cls(
+            guild_ids,
+            guild_offsets,
+            ids,
+            parent_column,
+            child_offsets,
+            child_ids,
+            partner_offsets,
+            partner_ids,
+            families,
+            family_sizes,
+        )
+
+    def index(self, discord_id: int, guild_id: int) -> Optional[int]:
+        """
+        Get the position of a user in the store.
+
+        Parameters
+        ----------
+        discord_id : int
+            The ID of the user.
+        guild_id : int
+            The ID of the guild that the user is in.
+
+        Returns
+        -------
+        Optional[int]
+            The index of the user, or ``None`` if they aren't stored.
+        """
+
+        try:
+            position = self._guild_positions[guild_id]
+        except KeyError:
+            return None
+        start, end = self.guild_offsets[position], self.guild_offsets[position + 1]
+        index = bisect.bisect_left(self.ids, discord_id, start, end)
+        if index < end and self.ids[index] == discord_id:
+            return index
+        return None
+
+    def get_guild_id(self, index: int) -> int:
+        """
+        Get the ID of the guild that the user at the given index is in.
+        """
+
+        position = bisect.bisect_right(self.guild_offsets, index) - 1
+        return self.guild_ids[position]
+
+    def guild_range(self, guild_id: int) -> range:
+        """
+        Get the indexes of the users in a given guild.
+        """
+
+        try:
+            position = self._guild_positions[guild_id]
+        except KeyError:
+            return range(0)
+        return range(self.guild_offsets[position], self.guild_offsets[position + 1])
+
+    def get_parent(self, index: int) -> Optional[int]:
+        """
+        Get the ID of the parent of the user at the given index.
+        """
+
+        return self.parents[index] or None
+
+    def get_children(self, index: int) -> array:
+        """
+        Get the IDs of the children of the user at the given index.
+        """
+
+        return self.child_ids[self.child_offsets[index]:self.child_offsets[index + 1]]
+
+    def get_partners(self, index: int) -> array:
+        """
+        Get the IDs of the partners of the user at the given index.
+        """
+
+        return self.partner_ids[self.partner_offsets[index]:self.partner_offsets[index + 1]]
+
+    def get_direct_relations(self, index: int) -> List[int]:
+        """
+        Get the IDs of everyone directly related to the user at the
+        given index.
+        """
+
+        output: List[int] = [*self.get_children(index)]
+        if (parent := self.parents[index]):
+            output.append(parent)
+        output.extend(self.get_partners(index))
+        return output
+
+    def family_size(self, index: int) -> int:
+        """
+        Get the number of people in the family of the user at the
+        given index.
+        """
+
+        return self.family_sizes[self.families[index]]
+
+    def same_family(self, a: int, b: int) -> bool:
+        """
+        Whether or not the users at the two given indexes are in the
+        same family.
+        """
+
+        return self.families[a] == self.families[b]
+
+    def is_materialised(self, index: int) -> bool:
+        """
+        Whether or not the family of the user at the given index has been
+        copied out of the store.
+        """
+
+        return self.families[index] in self._materialised
+
+    def family_members(self, index: int) -> List[int]:
+        """
+        Get the indexes of everyone in the family of the user at the
+        given index.
+        """
+
+        guild_id = self.get_guild_id(index)
+        found: List[int] = [index]
+        seen: Set[int] = {index}
+        for person in found:
+            for other in self.get_direct_relations(person):
+                other_index = self.index(other, guild_id)
+                if other_index is not None and other_index not in seen:
+                    seen.add(other_index)
+                    found.append(other_index)
+        return found
+
+    def mark_materialised(self, index: int) -> None:
+        """
+        Mark the family of the user at the given index as having been
+        copied out of the store, so that the store no longer answers for
+        them.
+        """
+
+        self._materialised.add(self.families[index])
+
+    def _columns(self) -> tuple:
+        return (
+            self.guild_ids,
+            self.guild_offsets,
+            self.ids,
+            self.parents,
+            self.child_offsets,
+            self.child_ids,
+            self.partner_offsets,
+            self.partner_ids,
+            self.families,
+            self.family_sizes,
+        )
+
+    def nbytes(self) -> int:
+        """
+        Get the number of bytes used by the store's arrays.
+        """
+
+        return sum(i.itemsize * len(i) for i in self._columns())
+
+    def save(self, filename: str, watermark: float, is_server_specific: bool) -> None:
+        """
+        Write the store to a file that can be memory mapped with
+        :func:`load`. The file is swapped into place once it's written, so
+        nobody reading it will see half a store. Columns are written in the
+        native byte order, so the file is only meant to be read on the
+        machine that wrote it.
+
+        Parameters
+        ----------
+        filename : str
+            The file to write to.
+        watermark : float
+            The UNIX timestamp (in UTC) that the store is up to date to.
+        is_server_specific : bool
+            Whether the store was built by a server specific bot (and so
+            holds every guild except guild 0, rather than only guild 0).
+        """
+
+        temp_filename = f"{filename}.{os.getpid()}.tmp"
+        with open(temp_filename, "wb") as a:
+            a.write(self.HEADER.pack(
+                self.MAGIC,
+                self.VERSION,
+                int(is_server_specific),
+                watermark,
+                len(self.guild_ids),
+                len(self.ids),
+                len(self.child_ids),
+                len(self.partner_ids),
+            ))
+            for column in self._columns():
+                a.write(memoryview(column).cast('B'))
+            a.flush()
+            os.fsync(a.fileno())
+        os.replace(temp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> Optional[Tuple[CompactFamilyStore, float, bool]]:
+        """
+        Memory map a store that was written with :func:`save`. The file is
+        unmapped once nothing is using the store any more.
+
+        Parameters
+        ----------
+        filename : str
+            The file to read.
+
+        Returns
+        -------
+        Optional[Tuple[CompactFamilyStore, float, bool]]
+            The store, its watermark and whether it was built by a server
+            specific bot, or ``None`` if the file doesn't exist or isn't a
+            store that we can read.
+        """
+
+        try:
+            with open(filename, "rb") as a:
+                mapped = mmap.mmap(a.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None  # Missing or empty
+
+        # Make sure it's a file we can read
+        try:
+            magic, version, is_server_specific, watermark, guilds, users, children, partners = (
+                cls.HEADER.unpack_from(mapped)
+            )
+        except struct.error:
+            mapped.close()
+            return None
+        counts = (
+            guilds, guilds + 1,
+            users, users, users + 1, children, users + 1, partners, users, users,
+        )
+        if magic != cls.MAGIC or version != cls.VERSION or len(mapped) != cls.HEADER.size + 8 * sum(counts):
+            mapped.close()
+            return None
+
+        # Split it up into columns
+        view = memoryview(mapped)
+        columns: List[memoryview] = []
+        offset = cls.HEADER.size
+        for count in counts:
+            columns.append(view[offset:offset + 8 * count].cast('q'))
+            offset += 8 * count
+        view.release()
+        return cls(*columns), watermark, bool(is_server_specific)  # type: ignore
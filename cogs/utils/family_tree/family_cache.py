@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Tuple,
+    Union,
+)
+import sys
+import time
+
+from cogs.utils.family_tree.family_index import FamilyIndex
+
+if TYPE_CHECKING:
+    from cogs.utils import types
+    from cogs.utils.family_tree.compact_store import CompactFamilyStore
+    from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+    MemberKey = Tuple[int, int]
+    FamilyUpdatePayload = Union[types.FamilyTreeMemberPayload, types.FamilyTreeDeltaPayload]
+
+
+__all__ = (
+    'GuildFamilyCache',
+    'FamilyCache',
+)
+
+
+class GuildFamilyCache:
+    """
+    The cached family tree members for a single guild, alongside that
+    guild's family index and (optionally) its compact store. The store
+    may be shared with other guilds, so only this guild's slice of it
+    (see :func:`CompactFamilyStore.guild_range`) belongs to this cache.
+    """
+
+    __slots__ = (
+        'guild_id',
+        'users',
+        'index',
+        'store',
+        'loaded',
+        'loading',
+        'pending_updates',
+        'last_used',
+    )
+
+    def __init__(self, guild_id: int):
+        self.guild_id: int = guild_id
+        self.users: Dict[MemberKey, FamilyTreeMember] = {}
+        self.index: FamilyIndex = FamilyIndex(self.users)
+        self.store: Optional[CompactFamilyStore] = None
+        self.loaded: bool = False
+        self.loading: bool = False
+        self.pending_updates: List[FamilyUpdatePayload] = []
+        self.last_used: float = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def clear(self) -> None:
+        """
+        Remove everything cached for this guild.
+        """
+
+        self.users.clear()
+        self.index.clear()
+        self.store = None
+        self.loaded = False
+
+    def nbytes(self) -> int:
+        """
+        Get a rough count of the bytes used by this guild's cache. This
+        walks every cached member, so it's not something to call often.
+        """
+
+        total = sys.getsizeof(self.users)
+        for key, member in self.users.items():
+            total += sys.getsizeof(key) + sys.getsizeof(member)
+            total += sys.getsizeof(member._children) + sys.getsizeof(member._partners)
+        total += self.index.nbytes()
+        return total + self.store_nbytes()
+
+    def store_nbytes(self) -> int:
+        """
+        Get the bytes used by this guild's slice of the compact store. For a
+        store shared between guilds this is the guild's share of the total.
+        """
+
+        store = self.store
+        if store is None or not len(store):
+            return 0
+        return store.nbytes() * len(store.guild_range(self.guild_id)) // len(store)
+
+    def iter_relations(
+            self,
+            partnerships: List[Tuple[int, int]],
+            parents: List[Tuple[int, int]],
+            chunk_size: int = 10_000) -> Iterator[None]:
+        """
+        Add every relation cached for this guild to the given lists, as the
+        ``(user_id, partner_id)`` and ``(parent_id, child_id)`` pairs that
+        would give the same cache if they were loaded as rows from the
+        database. Marriages are only given once if both partners have each
+        other, and parents are taken from each child (as they are in the
+        database).
+
+        This yields after every ``chunk_size`` users so that the caller can
+        give the event loop a turn. The cache can change in between chunks;
+        anyone changed part way through is picked up as a change after the
+        caller's watermark.
+        """
+
+        guild_id = self.guild_id
+        users = self.users
+
+        # Anyone cached as a member
+        for index, ((user_id, _), member) in enumerate(list(users.items()), start=1):
+            for partner_id in member._partners:
+                if partner_id >= user_id:
+                    partnerships.append((user_id, partner_id))
+                    continue
+                partner = users.get((partner_id, guild_id))
+                if partner is None or user_id not in partner._partners:
+                    partnerships.append((user_id, partner_id))
+            if member._parent is not None:
+                parents.append((member._parent, user_id))
+            if index % chunk_size == 0:
+                yield
+
+        # And anyone still in the compact store
+        store = self.store
+        if store is not None:
+            for index in store.guild_range(guild_id):
+                if store.is_materialised(index):
+                    continue
+                user_id = store.ids[index]
+                for partner_id in store.get_partners(index):
+                    if partner_id >= user_id:
+                        partnerships.append((user_id, partner_id))
+                if (parent_id := store.get_parent(index)):
+                    parents.append((parent_id, user_id))
+                if (index + 1) % chunk_size == 0:
+                    yield
+
+    def relations(self) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """
+        Get every relation cached for this guild in one go. See
+        :func:`iter_relations`.
+        """
+
+        partnerships: List[Tuple[int, int]] = []
+        parents: List[Tuple[int, int]] = []
+        for _ in self.iter_relations(partnerships, parents):
+            pass
+        return partnerships, parents
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the counters for this guild's cache.
+        """
+
+        return {
+            "users": len(self.users),
+            "stored_users": len(self.store.guild_range(self.guild_id)) if self.store is not None else 0,
+            "store_bytes": self.store_nbytes(),
+            "loaded": int(self.loaded),
+        }
+
+
+class FamilyCache(MutableMapping["MemberKey", "FamilyTreeMember"]):
+    """
+    The cache of family tree members, keyed by ``(discord_id, guild_id)``
+    like a regular dict but split up by guild underneath, so that a
+    single guild can be loaded, unloaded or counted without touching
+    any of the others.
+    """
+
+    def __init__(self):
+        self._guilds: Dict[int, GuildFamilyCache] = {}
+        self.lazy: bool = False
+
+    def guild(self, guild_id: int) -> GuildFamilyCache:
+        """
+        Get the cache for a given guild, making it if it doesn't exist.
+        """
+
+        try:
+            return self._guilds[guild_id]
+        except KeyError:
+            cache = self._guilds[guild_id] = GuildFamilyCache(guild_id)
+            return cache
+
+    def guilds(self) -> Iterator[GuildFamilyCache]:
+        """
+        Iterate over the caches for every guild.
+        """
+
+        return iter(list(self._guilds.values()))
+
+    def unload_guild(self, guild_id: int) -> Optional[GuildFamilyCache]:
+        """
+        Remove everything cached for a given guild.
+
+        Parameters
+        ----------
+        guild_id : int
+            The guild to unload.
+
+        Returns
+        -------
+        Optional[GuildFamilyCache]
+            The cache that was removed, if there was one.
+        """
+
+        cache = self._guilds.pop(guild_id, None)
+        if cache is not None:
+            cache.clear()
+        return cache
+
+    def defer_update(self, payload: FamilyUpdatePayload) -> bool:
+        """
+        See whether an update to the family tree members (either a whole
+        member or a batch of deltas) should be held back rather than
+        applied. Updates for guilds that are being loaded (or swapped over
+        to a new store) are kept until that's done, and with lazy loading,
+        updates for guilds that aren't loaded at all are dropped (the
+        database has them already).
+
+        Returns
+        -------
+        bool
+            Whether or not the update has been dealt with.
+        """
+
+        cache = self._guilds.get(payload['guild_id'])
+        if cache is not None and cache.loading:
+            cache.pending_updates.append(payload)
+            return True
+        if not self.lazy:
+            return False
+        return cache is None or not cache.loaded
+
+    def get(self, key: MemberKey, default: Any = None) -> Any:
+        cache = self._guilds.get(key[1])
+        if cache is None:
+            return default
+        return cache.users.get(key, default)
+
+    def __getitem__(self, key: MemberKey) -> FamilyTreeMember:
+        return self._guilds[key[1]].users[key]
+
+    def __setitem__(self, key: MemberKey, value: FamilyTreeMember) -> None:
+        self.guild(key[1]).users[key] = value
+
+    def __delitem__(self, key: MemberKey) -> None:
+        del self._guilds[key[1]].users[key]
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            return key in self._guilds[key[1]].users  # type: ignore
+        except (KeyError, TypeError, IndexError):
+            return False
+
+    def __iter__(self) -> Iterator[MemberKey]:
+        for cache in self.guilds():
+            yield from cache.users
+
+    def __len__(self) -> int:
+        return sum(len(i.users) for i in self._guilds.values())
+
+    def clear(self) -> None:
+        for cache in self._guilds.values():
+            cache.clear()
+        self._guilds.clear()
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    List,
+    Mapping,
+    Set,
+    Tuple,
+)
+import sys
+
+if TYPE_CHECKING:
+    from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+    MemberKey = Tuple[int, int]
+
+
+__all__ = (
+    'FamilyIndex',
+)
+
+
+class FamilyIndex:
+    """
+    A union-find index over the cached family tree members, so that
+    we can tell which family a user is in (and how big that family is)
+    without walking the whole tree.
+
+    Joining two families is cheap, but union-find can't split a set
+    back up again - so when a relationship is removed we just mark the
+    family as dirty, and the next lookup that touches it rebuilds that
+    one family from the members' actual relations.
+    """
+
+    __slots__ = (
+        '_users',
+        '_parents',
+        '_members',
+        '_dirty',
+    )
+
+    def __init__(self, users: Mapping[MemberKey, FamilyTreeMember]):
+        self._users: Mapping[MemberKey, FamilyTreeMember] = users
+        self._parents: Dict[MemberKey, MemberKey] = {}
+        self._members: Dict[MemberKey, List[MemberKey]] = {}
+        self._dirty: Set[MemberKey] = set()
+
+    def clear(self) -> None:
+        """
+        Remove everything from the index.
+        """
+
+        self._parents.clear()
+        self._members.clear()
+        self._dirty.clear()
+
+    def nbytes(self) -> int:
+        """
+        Get a rough count of the bytes used by the index.
+        """
+
+        return (
+            sys.getsizeof(self._parents)
+            + sys.getsizeof(self._members)
+            + sum(sys.getsizeof(i) for i in self._members.values())
+            + sys.getsizeof(self._dirty)
+        )
+
+    def _find(self, key: MemberKey) -> MemberKey:
+        """
+        Find the root of the given key without checking if its
+        family needs rebuilding.
+        """
+
+        # Get the root
+        parents = self._parents
+        root = parents.get(key)
+        if root is None:
+            parents[key] = key
+            self._members[key] = [key]
+            return key
+        while (next_root := parents[root]) != root:
+            root = next_root
+
+        # Compress the path we just walked
+        while key != root:
+            parents[key], key = root, parents[key]
+        return root
+
+    def _rebuild(self, root: MemberKey) -> None:
+        """
+        Split a dirty family back up into its real connected parts.
+        """
+
+        self._dirty.discard(root)
+        members = self._members.pop(root)
+        for key in members:
+            self._parents[key] = key
+            self._members[key] = [key]
+        for key in members:
+            member = self._users.get(key)
+            if member is None:
+                continue
+            for i in member.get_direct_relations():
+                self._union((i, key[1]), key)
+
+    def _union(self, a: MemberKey, b: MemberKey) -> MemberKey:
+        """
+        Join the families of two keys together, smallest into largest.
+        """
+
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return root_a
+        members_a, members_b = self._members[root_a], self._members[root_b]
+        if len(members_a) < len(members_b):
+            root_a, root_b = root_b, root_a
+            members_a, members_b = members_b, members_a
+        self._parents[root_b] = root_a
+        members_a.extend(members_b)
+        del self._members[root_b]
+
+        # If either side was waiting on a rebuild then the whole new
+        # family has to be rebuilt
+        if root_b in self._dirty:
+            self._dirty.discard(root_b)
+            self._dirty.add(root_a)
+        return root_a
+
+    def find(self, key: MemberKey) -> MemberKey:
+        """
+        Get the root key of the family that the given key is in.
+
+        Parameters
+        ----------
+        key : Tuple[int, int]
+            The ``(discord_id, guild_id)`` pair of the user.
+
+        Returns
+        -------
+        Tuple[int, int]
+            The key that represents the user's whole family.
+        """
+
+        # Rebuilding can pull in another dirty family, so keep going
+        # until we land on a clean one
+        root = self._find(key)
+        while root in self._dirty:
+            self._rebuild(root)
+            root = self._find(key)
+        return root
+
+    def union(self, a: MemberKey, b: MemberKey) -> None:
+        """
+        Mark two users as being in the same family. Dirty families aren't
+        rebuilt first - joining onto one just makes the joined family
+        dirty - so a run of changes to one family only rebuilds it once,
+        at the next lookup.
+        """
+
+        self._union(a, b)
+
+    def mark_dirty(self, key: MemberKey) -> None:
+        """
+        Mark the family of the given user as possibly having split,
+        eg after a divorce or a disown.
+        """
+
+        if key in self._parents:
+            self._dirty.add(self._find(key))
+
+    def size(self, key: MemberKey) -> int:
+        """
+        Get the number of people in the given user's family.
+        """
+
+        return len(self._members[self.find(key)])
+
+    def members(self, key: MemberKey) -> List[MemberKey]:
+        """
+        Get the keys of everyone in the given user's family.
+        """
+
+        return self._members[self.find(key)]
+
+    def possible_members(self, key: MemberKey) -> List[MemberKey]:
+        """
+        Get the keys of everyone who might be in the given user's family,
+        without rebuilding it if it's dirty. This can include people who
+        have since split off from the family, so it's only for when
+        having too many people is fine (eg clearing caches).
+        """
+
+        return self._members[self._find(key)]
+
+    def same_family(self, a: MemberKey, b: MemberKey) -> bool:
+        """
+        Whether or not two users are in the same family.
+        """
+
+        self.find(b)
+        return self.find(a) == self._find(b)
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+from array import array
+import mmap
+import os
+import struct
+
+if TYPE_CHECKING:
+    from cogs.utils import types
+
+
+__all__ = (
+    'FamilySnapshot',
+)
+
+
+class FamilySnapshot:
+    """
+    A snapshot of the family tables (as marriages and parents rows) saved
+    to disk, alongside a watermark of when it was taken.
+
+    The file is a small header followed by six flat columns of 64-bit
+    integers - the guild, user and partner IDs of each marriage, then the
+    guild, parent and child IDs of each parent - so it can be memory
+    mapped and read without being copied. The columns are in the native
+    byte order, so snapshots are only meant to be read on the machine
+    that wrote them.
+    """
+
+    MAGIC = b"MBFAMSNP"
+    VERSION = 1
+
+    # magic, version, server specific, watermark, marriages, parents
+    HEADER = struct.Struct("=8sII d QQ")
+
+    __slots__ = (
+        'watermark',
+        'is_server_specific',
+        'marriages',
+        'parents',
+        '_mmap',
+    )
+
+    def __init__(
+            self,
+            watermark: float,
+            is_server_specific: bool,
+            marriages: Tuple[Iterable[int], Iterable[int], Iterable[int]],
+            parents: Tuple[Iterable[int], Iterable[int], Iterable[int]],
+            _mmap: Optional[mmap.mmap] = None):
+        self.watermark: float = watermark
+        self.is_server_specific: bool = is_server_specific
+        self.marriages = marriages
+        self.parents = parents
+        self._mmap: Optional[mmap.mmap] = _mmap
+
+    def __enter__(self) -> FamilySnapshot:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmap the snapshot file, if it was read from one. The columns
+        can't be used after this.
+        """
+
+        if self._mmap is None:
+            return
+        for column in (*self.marriages, *self.parents):
+            if isinstance(column, memoryview):
+                column.release()
+        self._mmap.close()
+        self._mmap = None
+
+    def __len__(self) -> int:
+        return len(self.marriages[0]) + len(self.parents[0])  # type: ignore
+
+    @classmethod
+    def from_relations(
+            cls,
+            watermark: float,
+            is_server_specific: bool,
+            relations: Iterable[Tuple[int, List[Tuple[int, int]], List[Tuple[int, int]]]]) -> FamilySnapshot:
+        """
+        Make a snapshot from the relations in each guild.
+
+        Parameters
+        ----------
+        watermark : float
+            The UNIX timestamp (in UTC) that the relations are up to date to.
+        is_server_specific : bool
+            Whether the relations are for a server specific bot.
+        relations : Iterable[Tuple[int, List[Tuple[int, int]], List[Tuple[int, int]]]]
+            The ID of each guild, alongside its ``(user_id, partner_id)``
+            and ``(parent_id, child_id)`` pairs.
+
+        Returns
+        -------
+        FamilySnapshot
+            The snapshot.
+        """
+
+        marriages = array('q'), array('q'), array('q')
+        parents = array('q'), array('q'), array('q')
+        for guild_id, partnerships, parentage in relations:
+            for columns, pairs in ((marriages, partnerships), (parents, parentage)):
+                columns[0].extend([guild_id] * len(pairs))
+                columns[1].extend([i for i, _ in pairs])
+                columns[2].extend([i for _, i in pairs])
+        return cls(watermark, is_server_specific, marriages, parents)
+
+    def save(self, filename: str) -> None:
+        """
+        Write the snapshot to a file. The file is swapped into place once
+        it's written, so nobody reading it will see half a snapshot.
+        """
+
+        temp_filename = f"{filename}.{os.getpid()}.tmp"
+        with open(temp_filename, "wb") as a:
+            a.write(self.HEADER.pack(
+                self.MAGIC,
+                self.VERSION,
+                int(self.is_server_specific),
+                self.watermark,
+                len(self.marriages[0]),  # type: ignore
+                len(self.parents[0]),  # type: ignore
+            ))
+            for column in (*self.marriages, *self.parents):
+                a.write(memoryview(column).cast('B'))  # type: ignore
+            a.flush()
+            os.fsync(a.fileno())
+        os.replace(temp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> Optional[FamilySnapshot]:
+        """
+        Memory map a snapshot file.
+
+        Returns
+        -------
+        Optional[FamilySnapshot]
+            The snapshot, or ``None`` if the file doesn't exist or isn't
+            a snapshot that we can read.
+        """
+
+        try:
+            with open(filename, "rb") as a:
+                mapped = mmap.mmap(a.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None  # Missing or empty
+
+        # Make sure it's a file we can read
+        try:
+            magic, version, is_server_specific, watermark, marriage_count, parent_count = (
+                cls.HEADER.unpack_from(mapped)
+            )
+        except struct.error:
+            magic = None
+        expected_size = cls.HEADER.size + 8 * 3 * (marriage_count + parent_count) if magic else -1
+        if magic != cls.MAGIC or version != cls.VERSION or len(mapped) != expected_size:
+            mapped.close()
+            return None
+
+        # Split it up into columns
+        view = memoryview(mapped)
+        columns: List[memoryview] = []
+        offset = cls.HEADER.size
+        for count in (marriage_count,) * 3 + (parent_count,) * 3:
+            columns.append(view[offset:offset + 8 * count].cast('q'))
+            offset += 8 * count
+        view.release()
+        return cls(
+            watermark,
+            bool(is_server_specific),
+            (columns[0], columns[1], columns[2]),
+            (columns[3], columns[4], columns[5]),
+            mapped,
+        )
+
+    def iter_guilds(self) -> Iterator[Tuple[int, List[types.MarriagesDB], List[types.ParentageDB]]]:
+        """
+        Go through the rows in the snapshot a guild at a time, in the same
+        shape as the rows from the database.
+
+        Yields
+        ------
+        Tuple[int, List[types.MarriagesDB], List[types.ParentageDB]]
+            The ID of each guild, alongside its marriages and parents rows.
+        """
+
+        marriage_starts = _guild_starts(self.marriages[0])
+        parent_starts = _guild_starts(self.parents[0])
+        for guild_id in dict.fromkeys([*marriage_starts, *parent_starts]):
+            partnerships: List[types.MarriagesDB] = []
+            parents: List[types.ParentageDB] = []
+            if guild_id in marriage_starts:
+                start, end = marriage_starts[guild_id]
+                guild_ids, user_ids, partner_ids = self.marriages
+                partnerships = [
+                    {'guild_id': guild_id, 'user_id': user_id, 'partner_id': partner_id}  # type: ignore
+                    for user_id, partner_id in zip(user_ids[start:end], partner_ids[start:end])  # type: ignore
+                ]
+            if guild_id in parent_starts:
+                start, end = parent_starts[guild_id]
+                guild_ids, parent_ids, child_ids = self.parents
+                parents = [
+                    {'guild_id': guild_id, 'parent_id': parent_id, 'child_id': child_id}  # type: ignore
+                    for parent_id, child_id in zip(parent_ids[start:end], child_ids[start:end])  # type: ignore
+                ]
+            yield guild_id, partnerships, parents
+
+
+def _guild_starts(guild_ids: Iterable[int]) -> dict:
+    """
+    Get the ``(start, end)`` slice of each guild in a guild ID column,
+    which has every guild's rows next to each other.
+    """
+
+    output = {}
+    start = 0
+    previous = None
+    index = 0
+    for index, guild_id in enumerate(guild_ids):
+        if guild_id != previous:
+            if previous is not None:
+                output[previous] = (start, index)
+            start, previous = index, guild_id
+    if previous is not None:
+        output[previous] = (start, index + 1)
+    return output
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    List,
+    Optional,
+)
+
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+if TYPE_CHECKING:
+    from cogs.utils import types
+
+
+__all__ = (
+    'FamilyTreeDelta',
+)
+
+
+class FamilyTreeDelta:
+    """
+    A single change to a family tree member, small enough to send over
+    Redis instead of the member's whole state.
+
+    Each delta is one call on one member (eg ``add_partner``), so a
+    change that touches two people (like a marriage) is two deltas.
+    Applying the same delta twice does nothing the second time.
+    """
+
+    ADD_PARTNER = "add_partner"
+    REMOVE_PARTNER = "remove_partner"
+    ADD_CHILD = "add_child"
+    REMOVE_CHILD = "remove_child"
+    SET_PARENT = "set_parent"
+
+    OPERATIONS = (
+        ADD_PARTNER,
+        REMOVE_PARTNER,
+        ADD_CHILD,
+        REMOVE_CHILD,
+        SET_PARENT,
+    )
+
+    __slots__ = (
+        'operation',
+        'user_id',
+        'other_id',
+    )
+
+    def __init__(
+            self,
+            operation: str,
+            user_id: int,
+            other_id: Optional[int]):
+        if operation not in self.OPERATIONS:
+            raise ValueError(f"Unknown family tree delta {operation!r}")
+        self.operation: str = operation
+        self.user_id: int = user_id
+        self.other_id: Optional[int] = other_id
+
+    def __repr__(self) -> str:
+        return f"<FamilyTreeDelta {self.operation} user={self.user_id} other={self.other_id}>"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FamilyTreeDelta):
+            return NotImplemented
+        return self.to_json() == other.to_json()
+
+    @classmethod
+    def add_partner(cls, user_id: int, partner_id: int) -> FamilyTreeDelta:
+        return cls(cls.ADD_PARTNER, user_id, partner_id)
+
+    @classmethod
+    def remove_partner(cls, user_id: int, partner_id: int) -> FamilyTreeDelta:
+        return cls(cls.REMOVE_PARTNER, user_id, partner_id)
+
+    @classmethod
+    def add_child(cls, user_id: int, child_id: int) -> FamilyTreeDelta:
+        return cls(cls.ADD_CHILD, user_id, child_id)
+
+    @classmethod
+    def remove_child(cls, user_id: int, child_id: int) -> FamilyTreeDelta:
+        return cls(cls.REMOVE_CHILD, user_id, child_id)
+
+    @classmethod
+    def set_parent(cls, user_id: int, parent_id: Optional[int]) -> FamilyTreeDelta:
+        return cls(cls.SET_PARENT, user_id, parent_id)
+
+    def to_json(self) -> list:
+        """
+        Converts the delta to JSON format so you can throw it through Redis.
+        """
+
+        return [self.operation, self.user_id, self.other_id]
+
+    @classmethod
+    def from_json(cls, data: list) -> FamilyTreeDelta:
+        """
+        Load a delta from its JSON format.
+        """
+
+        operation, user_id, other_id = data
+        return cls(operation, user_id, other_id)
+
+    def apply(self, guild_id: int) -> None:
+        """
+        Make this change to the cached family tree member.
+
+        Parameters
+        ----------
+        guild_id : int
+            The guild that the member is in.
+        """
+
+        user = FamilyTreeMember.get(self.user_id, guild_id)
+        if self.operation == self.SET_PARENT:
+            user.parent = self.other_id
+            return
+        assert self.other_id is not None
+        getattr(user, self.operation)(self.other_id)
+
+    @classmethod
+    def apply_payload(cls, payload: types.FamilyTreeDeltaPayload) -> None:
+        """
+        Apply every delta in a payload sent through Redis, in order.
+        """
+
+        for data in payload['deltas']:
+            cls.from_json(data).apply(payload['guild_id'])
+
+    @classmethod
+    def for_marriage(cls, user_id: int, partner_id: int) -> List[FamilyTreeDelta]:
+        """
+        The deltas for two users getting married.
+        """
+
+        return [cls.add_partner(user_id, partner_id), cls.add_partner(partner_id, user_id)]
+
+    @classmethod
+    def for_divorce(cls, user_id: int, partner_id: int) -> List[FamilyTreeDelta]:
+        """
+        The deltas for two users getting divorced.
+        """
+
+        return [cls.remove_partner(user_id, partner_id), cls.remove_partner(partner_id, user_id)]
+
+    @classmethod
+    def for_adoption(cls, parent_id: int, child_id: int) -> List[FamilyTreeDelta]:
+        """
+        The deltas for a parent adopting a child.
+        """
+
+        return [cls.add_child(parent_id, child_id), cls.set_parent(child_id, parent_id)]
+
+    @classmethod
+    def for_disowns(cls, parent_id: int, child_ids: Iterable[int]) -> List[FamilyTreeDelta]:
+        """
+        The deltas for a parent disowning some of their children.
+        """
+
+        output: List[FamilyTreeDelta] = []
+        for child_id in child_ids:
+            output.append(cls.remove_child(parent_id, child_id))
+            output.append(cls.set_parent(child_id, None))
+        return output
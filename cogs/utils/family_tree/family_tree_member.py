@@ -12,11 +12,14 @@ from typing import (
     overload,
     Literal,
 )
-import string
-import random
 
 from cogs.utils import types
 from cogs.utils.customised_tree_user import CustomisedTreeUser
+from cogs.utils.family_tree.compact_store import CompactFamilyStore
+from cogs.utils.family_tree.family_cache import FamilyCache
+from cogs.utils.family_tree.family_index import FamilyIndex
+from cogs.utils.family_tree.generation_cache import GenerationCache
+from cogs.utils.family_tree.relation_cache import RelationCache
 from cogs.utils.family_tree.relationship_string_simplifier import RelationshipStringSimplifier as Simplifier
 from cogs.utils.discord_name_manager import DiscordNameManager
 
@@ -31,8 +34,19 @@ if TYPE_CHECKING:
     ]
 
 
-def get_cluster_name(k: int = 5) -> str:
-    return "".join([random.choice(string.ascii_uppercase) for _ in range(k)])
+MISSING = object()
+
+
+def get_cluster_name(generation: int, user_id: int) -> str:
+    """
+    Get the name of the DOT subgraph for a user and their partners in a
+    given generation. Names are made from the generation and the user's
+    ID so that the same tree always gives the same DOT script.
+    """
+
+    if generation < 0:
+        return f"clusterm{-generation}_{user_id}"
+    return f"cluster{generation}_{user_id}"
 
 
 class FamilyTreeMember:
@@ -40,7 +54,9 @@ class FamilyTreeMember:
     A class representing a member of a family.
     """
 
-    all_users: Dict[Tuple[int, int], FamilyTreeMember] = {}
+    all_users: FamilyCache = FamilyCache()
+    relation_cache: RelationCache = RelationCache()
+    generation_cache: GenerationCache = GenerationCache()
     INVISIBLE = "[shape=point,width=0.001,style=invis]"  # For the DOT script
 
     __slots__ = (
@@ -49,6 +65,8 @@ class FamilyTreeMember:
         '_parent',
         '_partners',
         '_guild_id',
+        '_sorted_children',
+        '_sorted_partners',
     )
 
     def __init__(
@@ -59,15 +77,147 @@ class FamilyTreeMember:
             partners: Optional[List[int]] = None,
             guild_id: int = 0):
         self.id: int = discord_id
-        self._children: List[int] = children or list()
+        self._children: Dict[int, None] = dict.fromkeys(children or ())
         self._parent: Optional[int] = parent_id
-        self._partners: List[int] = partners or list()
+        self._partners: Dict[int, None] = dict.fromkeys(partners or ())
         self._guild_id: int = guild_id
-        self.all_users[(self.id, self._guild_id)] = self
+
+        # The sorted children and partners, worked out when they're first
+        # asked for and cleared whenever they change
+        self._sorted_children: Optional[List[int]] = None
+        self._sorted_partners: Optional[List[int]] = None
+
+        # Update the family index - if we're replacing a cached user
+        # then they may have lost relations
+        key = (self.id, self._guild_id)
+        relations = self.get_direct_relations()
+        self._materialise_families(self.id, *relations)
+        replacing = key in self.all_users
+        self.all_users[key] = self
+        if replacing or relations:
+            self._family_changed(*relations)
+        if replacing:
+            self.family_index.mark_dirty(key)
+        for i in relations:
+            self.family_index.union(key, (i, self._guild_id))
 
     def __hash__(self):
         return hash((self.id, self._guild_id,))
 
+    @property
+    def family_index(self) -> FamilyIndex:
+        """
+        The family index for the guild that this user is in.
+        """
+
+        return self.all_users.guild(self._guild_id).index
+
+    @property
+    def compact_store(self) -> Optional[CompactFamilyStore]:
+        """
+        The compact store for the guild that this user is in, if there
+        is one.
+        """
+
+        return self.all_users.guild(self._guild_id).store
+
+    def _family_changed(self, *user_ids: Optional[int]) -> None:
+        """
+        Clear anything cached about the family of this user and the
+        families of the given users, as they're about to be changed.
+        This needs to be called *before* the change is made, so that
+        everyone in the old family is caught.
+        """
+
+        # Anyone being changed can't be left in the compact store, and
+        # this object needs to be the one that's cached for this user
+        if self.compact_store is not None:
+            self._materialise_families(self.id, *user_ids)
+            key = (self.id, self._guild_id)
+            current = self.all_users.get(key)
+            if current is not self:
+                if current is not None:
+                    self._children = dict(current._children)
+                    self._parent = current._parent
+                    self._partners = dict(current._partners)
+                    self._sorted_children = self._sorted_partners = None
+                self.all_users[key] = self
+
+        if not self.relation_cache and not self.generation_cache:
+            return
+        member_keys: Set[Tuple[int, int]] = set()
+        for i in (self.id, *user_ids):
+            if i is None or (i, self._guild_id) in member_keys:
+                continue
+            member_keys.update(self.family_index.possible_members((i, self._guild_id)))
+        self.relation_cache.invalidate(member_keys)
+        self.generation_cache.invalidate(member_keys)
+
+    @classmethod
+    def _from_store(
+            cls,
+            store: CompactFamilyStore,
+            index: int,
+            guild_id: int) -> FamilyTreeMember:
+        """
+        Make a member from a user in the compact store. The member isn't
+        added to the cache; it's just a view over the store until it's
+        changed.
+        """
+
+        member = cls.__new__(cls)
+        member.id = store.ids[index]
+        member._children = dict.fromkeys(store.get_children(index))
+        member._parent = store.get_parent(index)
+        member._partners = dict.fromkeys(store.get_partners(index))
+        member._guild_id = guild_id
+        member._sorted_children = member._sorted_partners = None
+        return member
+
+    def _get_store_index(self) -> Optional[int]:
+        """
+        Get the index of this user in the compact store, if the store is
+        still the source of truth for their family.
+        """
+
+        store = self.compact_store
+        if store is None:
+            return None
+        index = store.index(self.id, self._guild_id)
+        if index is None or store.is_materialised(index):
+            return None
+        return index
+
+    def _materialise_families(self, *user_ids: Optional[int]) -> None:
+        """
+        Copy the families of the given users out of the compact store and
+        into the cache, so that they can be changed. If this user is one
+        of the people copied out then this object is the one that's cached.
+        """
+
+        store = self.compact_store
+        if store is None:
+            return
+        guild_id = self._guild_id
+        for i in user_ids:
+            if i is None:
+                continue
+            index = store.index(i, guild_id)
+            if index is None or store.is_materialised(index):
+                continue
+            store.mark_materialised(index)
+            members: List[FamilyTreeMember] = []
+            for member_index in store.family_members(index):
+                if store.ids[member_index] == self.id:
+                    member = self
+                else:
+                    member = self._from_store(store, member_index, guild_id)
+                self.all_users[(member.id, guild_id)] = member
+                members.append(member)
+            for member in members:
+                for relation_id in member.get_direct_relations():
+                    self.family_index.union((member.id, guild_id), (relation_id, guild_id))
+
     @overload
     def _get_user_id(self, value: FamilyTreeMemberSetter) -> int:
         ...
@@ -108,11 +258,28 @@ class FamilyTreeMember:
         v = cls.all_users.get((discord_id, guild_id))
         if v:
             return v
+        store = cls.all_users.guild(guild_id).store
+        if store is not None:
+            index = store.index(discord_id, guild_id)
+            if index is not None and not store.is_materialised(index):
+                return cls._from_store(store, index, guild_id)
         return cls(
             discord_id=discord_id,
             guild_id=guild_id,
         )
 
+    def _get_many(self, user_ids: List[int]) -> Iterable[FamilyTreeMember]:
+        """
+        Get the members for a list of user IDs in this user's guild,
+        looking in the guild's cache directly before falling back to
+        :func:`get`.
+        """
+
+        guild_id = self._guild_id
+        users = self.all_users.guild(guild_id).users
+        for i in user_ids:
+            yield users.get((i, guild_id)) or self.get(i, guild_id)
+
     @classmethod
     def get_multiple(
             cls,
@@ -151,8 +318,10 @@ class FamilyTreeMember:
         """
 
         child_id = self._get_user_id(child)
-        if child_id not in self._children:
-            self._children.append(child_id)
+        self._family_changed(child_id)
+        self._children[child_id] = None
+        self._sorted_children = None
+        self.family_index.union((self.id, self._guild_id), (child_id, self._guild_id))
 
         if return_added:
             return self.get(child_id, self._guild_id)
@@ -183,8 +352,10 @@ class FamilyTreeMember:
         """
 
         child_id = self._get_user_id(child)
-        while child_id in self._children:
-            self._children.remove(child_id)
+        self._family_changed()
+        self._children.pop(child_id, None)
+        self._sorted_children = None
+        self.family_index.mark_dirty((self.id, self._guild_id))
 
         if return_added:
             return self.get(child_id, self._guild_id)
@@ -215,8 +386,10 @@ class FamilyTreeMember:
         """
 
         partner_id = self._get_user_id(partner)
-        if partner_id not in self._partners:
-            self._partners.append(partner_id)
+        self._family_changed(partner_id)
+        self._partners[partner_id] = None
+        self._sorted_partners = None
+        self.family_index.union((self.id, self._guild_id), (partner_id, self._guild_id))
 
         if return_added:
             return self.get(partner_id, self._guild_id)
@@ -247,8 +420,10 @@ class FamilyTreeMember:
         """
 
         partner_id = self._get_user_id(partner)
-        while partner_id in self._partners:
-            self._partners.remove(partner_id)
+        self._family_changed()
+        self._partners.pop(partner_id, None)
+        self._sorted_partners = None
+        self.family_index.mark_dirty((self.id, self._guild_id))
 
         if return_added:
             return self.get(partner_id, self._guild_id)
@@ -260,9 +435,9 @@ class FamilyTreeMember:
 
         return {
             "discord_id": self.id,
-            "children": self._children,
+            "children": [*self._children],
             "parent_id": self._parent,
-            "partners": self._partners,
+            "partners": [*self._partners],
             "guild_id": self._guild_id,
         }
 
@@ -286,13 +461,13 @@ class FamilyTreeMember:
 
     def __repr__(self) -> str:
         attrs = (
-            ("discord_id", "id",),
-            ("children", "_children",),
-            ("parent_id", "_parent",),
-            ("partners", "_partners",),
-            ("guild_id", "_guild_id",),
+            ("discord_id", self.id,),
+            ("children", [*self._children],),
+            ("parent_id", self._parent,),
+            ("partners", [*self._partners],),
+            ("guild_id", self._guild_id,),
         )
-        d = ", ".join(["%s=%r" % (i, getattr(self, o)) for i, o in attrs])
+        d = ", ".join(["%s=%r" % i for i in attrs])
         return f"{self.__class__.__name__}({d})"
 
     def __eq__(self, other) -> bool:
@@ -315,7 +490,14 @@ class FamilyTreeMember:
 
     @parent.setter
     def parent(self, value: Optional[FamilyTreeMemberSetter]):
-        self._parent = self._get_user_id(value)
+        parent_id = self._get_user_id(value)
+        key = (self.id, self._guild_id)
+        self._family_changed(parent_id)
+        if self._parent is not None and self._parent != parent_id:
+            self.family_index.mark_dirty(key)
+        self._parent = parent_id
+        if parent_id is not None:
+            self.family_index.union(key, (parent_id, self._guild_id))
 
     @property
     def children(self) -> Iterable[FamilyTreeMember]:
@@ -323,14 +505,20 @@ class FamilyTreeMember:
         Gets you the list of children instances for this user.
         """
 
-        for i in sorted(self._children):
-            if i == self.id:
-                continue
-            yield self.get(i, self._guild_id)
+        if self._sorted_children is None:
+            self._sorted_children = sorted(i for i in self._children if i != self.id)
+        return self._get_many(self._sorted_children)
 
     @children.setter
     def children(self, value: Iterable[FamilyTreeMemberSetter]):
-        self._children = [self._get_user_id(i) for i in value]
+        key = (self.id, self._guild_id)
+        children = [self._get_user_id(i) for i in value]
+        self._family_changed(*children)
+        self.family_index.mark_dirty(key)
+        self._children = dict.fromkeys(children)
+        self._sorted_children = None
+        for i in self._children:
+            self.family_index.union(key, (i, self._guild_id))
 
     @property
     def partners(self) -> Iterable[FamilyTreeMember]:
@@ -338,14 +526,20 @@ class FamilyTreeMember:
         Gets you the list of partner instances for this user.
         """
 
-        for i in sorted(self._partners):
-            if i == self.id:
-                continue
-            yield self.get(i, self._guild_id)
+        if self._sorted_partners is None:
+            self._sorted_partners = sorted(i for i in self._partners if i != self.id)
+        return self._get_many(self._sorted_partners)
 
     @partners.setter
     def partners(self, value: Iterable[FamilyTreeMemberSetter]):
-        self._partners = [self._get_user_id(i) for i in value]
+        key = (self.id, self._guild_id)
+        partners = [self._get_user_id(i) for i in value]
+        self._family_changed(*partners)
+        self.family_index.mark_dirty(key)
+        self._partners = dict.fromkeys(partners)
+        self._sorted_partners = None
+        for i in self._partners:
+            self.family_index.union(key, (i, self._guild_id))
 
     def get_direct_relations(self) -> List[int]:
         """
@@ -386,10 +580,19 @@ class FamilyTreeMember:
             The family tree relationship string.
         """
 
-        text = self.get_unshortened_relation(target_user)
-        if text is None:
-            return None
-        return Simplifier().simplify(text)
+        # See if we've worked this out already
+        key = (self._guild_id, self.id, target_user.id)
+        cached = self.relation_cache.get(key, MISSING)
+        if cached is not MISSING:
+            return cached
+
+        # Work it out and cache it
+        steps = self.get_relation_steps(target_user)
+        relation = None
+        if steps is not None:
+            relation = Simplifier.simplify_steps(steps)
+        self.relation_cache.set(key, relation)
+        return relation
 
     @property
     def family_member_count(self) -> int:
@@ -397,14 +600,131 @@ class FamilyTreeMember:
         Returns the number of people in the family.
         """
 
-        family_member_count = 0
-        for _ in self.span(add_parent=True, expand_upwards=True):
-            family_member_count += 1
-        return family_member_count
+        if (index := self._get_store_index()) is not None:
+            assert self.compact_store
+            return self.compact_store.family_size(index)
+        return self.family_index.size((self.id, self._guild_id))
+
+    def is_family_with(self, other: FamilyTreeMember) -> bool:
+        """
+        Whether or not this user is in the same family as another,
+        by any relation.
+        """
+
+        # Families never cross guilds, and each family is either all in
+        # the compact store or all cached
+        if self._guild_id != other._guild_id:
+            return False
+        index, other_index = self._get_store_index(), other._get_store_index()
+        if index is not None or other_index is not None:
+            if index is None or other_index is None:
+                return False
+            assert self.compact_store
+            return self.compact_store.same_family(index, other_index)
+        return self.family_index.same_family(
+            (self.id, self._guild_id),
+            (other.id, other._guild_id),
+        )
+
+    def get_joined_family_member_count(self, other: FamilyTreeMember) -> int:
+        """
+        Get the number of people that would be in this user's family
+        if it were joined with the family of another user.
+
+        Parameters
+        ----------
+        other : FamilyTreeMember
+            The user whose family would be joined with ours.
+
+        Returns
+        -------
+        int
+            The size of the combined family.
+        """
+
+        if self.is_family_with(other):
+            return self.family_member_count
+        return self.family_member_count + other.family_member_count
+
+    def _walk(
+            self,
+            seen: Set[int],
+            *,
+            generational: bool,
+            depth: int = 0,
+            add_parent: bool = False,
+            add_partners: bool = True,
+            expand_upwards: bool = False) -> Iterable[Tuple[FamilyTreeMember, int]]:
+        """
+        Walk depth-first through the family from this user, using an explicit
+        stack rather than recursion so that deep trees can't hit the recursion
+        limit. Users are yielded in the same order that a recursive walk would
+        give them.
+
+        Parameters
+        ----------
+        seen : Set[int]
+            The IDs of users who have already been walked over. This is
+            updated in place.
+        generational : bool
+            Whether to walk in the order used by the generational span
+            (children, partners, parent; with partners' partners not being
+            added) rather than that of the regular span (parent, children,
+            partners).
+        depth : int, optional
+            The generation that this user is in.
+        add_parent : bool, optional
+            Whether or not to add the parent of this user.
+        add_partners : bool, optional
+            Whether or not to add the partners of this user. Only used
+            for generational walks.
+        expand_upwards : bool, optional
+            Whether or not to expand upwards in the tree.
+
+        Yields
+        ------
+        Tuple[FamilyTreeMember, int]
+            Each user in the family alongside their generation.
+        """
+
+        stack: List[Tuple[FamilyTreeMember, int, bool, bool]]
+        stack = [(self, depth, add_parent, add_partners)]
+        while stack:
+
+            # Don't add anyone twice
+            person, depth, add_parent, add_partners = stack.pop()
+            if person.id in seen:
+                continue
+            seen.add(person.id)
+            yield person, depth
+
+            # Work out who we want to look at next - they go on the stack
+            # backwards so that they come off in the order we want
+            parent = None
+            if expand_upwards and add_parent and person._parent:
+                parent = person.parent
+            if generational:
+                if parent and parent.id not in seen:
+                    stack.append((parent, depth - 1, True, True))
+                if add_partners:
+                    for partner in reversed([*person.partners]):
+                        if partner.id not in seen:
+                            stack.append((partner, depth, True, False))
+                for child in reversed([*person.children]):
+                    if child.id not in seen:
+                        stack.append((child, depth + 1, False, True))
+            else:
+                for partner in reversed([*person.partners]):
+                    if partner.id not in seen:
+                        stack.append((partner, depth, True, True))
+                for child in reversed([*person.children]):
+                    if child.id not in seen:
+                        stack.append((child, depth + 1, False, True))
+                if parent and parent.id not in seen:
+                    stack.append((parent, depth - 1, True, True))
 
     def span(
             self,
-            people_list: Union[set, None] = None,
             add_parent: bool = False,
             expand_upwards: bool = False) -> Iterable[FamilyTreeMember]:
         """
@@ -415,8 +735,6 @@ class FamilyTreeMember:
 
         Parameters
         ----------
-        people_list : set, optional
-            The list of users who are currently in the tree (so as to avoid recursion)
         add_parent : bool, optional
             Whether or not to add the parent of this user to the people list
         expand_upwards : bool, optional
@@ -428,38 +746,14 @@ class FamilyTreeMember:
             A list of users that this person is related to.
         """
 
-        # Don't add yourself again
-        if people_list is None:
-            people_list = set()
-        if self in people_list:
-            return people_list
-        people_list.add(self)
-        yield self
-
-        # Add your parent
-        if expand_upwards and add_parent and self._parent:
-            assert self.parent
-            yield from self.parent.span(
-                people_list,
-                add_parent=True,
-                expand_upwards=expand_upwards,
-            )
-
-        # Add your children
-        for child in self.children:
-            yield from child.span(
-                people_list,
-                add_parent=False,
-                expand_upwards=expand_upwards,
-            )
-
-        # Add your partner
-        for partner in self.partners:
-            yield from partner.span(
-                people_list,
-                add_parent=True,
-                expand_upwards=expand_upwards,
-            )
+        walk = self._walk(
+            set(),
+            generational=False,
+            add_parent=add_parent,
+            expand_upwards=expand_upwards,
+        )
+        for person, _ in walk:
+            yield person
 
     def get_root(self) -> FamilyTreeMember:
         """
@@ -505,74 +799,137 @@ class FamilyTreeMember:
             else:
                 return root_user
 
-    def get_unshortened_relation(
+    def _get_relation_links(
             self,
-            target_user: FamilyTreeMember,
-            working_relation: Union[List[str], None] = None,
-            added_already: Union[Set[int], None] = None) -> Optional[str]:
+            backwards: bool = False) -> Iterable[Tuple[FamilyTreeMember, str]]:
         """
-        Gets your relation to the other given user.
+        Get the people directly related to this user, alongside the step
+        that it would take to get from one to the other.
 
-        Args:
-            target_user (FamilyTreeMember): The user who you want to list the relation to.
-            working_relation (list, optional): The list of relation steps it's taking to get.
-            added_already (list, optional): So we can keep track of who's been looked at before.
+        Parameters
+        ----------
+        backwards : bool, optional
+            If this is set then the given step is the one taken to get
+            from the related person to this user, rather than the other
+            way around.
 
-        Returns:
-            Optional[str]: The family tree relationship string.
+        Yields
+        ------
+        Tuple[FamilyTreeMember, str]
+            A related person and the relation step between them.
         """
 
-        # Set default values
-        if working_relation is None:
-            working_relation = []
-        if added_already is None:
-            added_already = set()
+        if (parent := self.parent):
+            yield parent, "child" if backwards else "parent"
+        for partner in self.partners:
+            yield partner, "partner"
+        for child in self.children:
+            yield child, "parent" if backwards else "child"
 
-        # You're doing a loop - return None
-        if self.id in added_already:
-            return None
+    def get_relation_steps(
+            self,
+            target_user: FamilyTreeMember) -> Optional[Tuple[str, ...]]:
+        """
+        Gets the shortest list of steps (eg "parent", "partner", "child")
+        that get you from this user to the other given user.
+
+        This runs a breadth-first search from both users at once,
+        meeting in the middle, and keeps a link back to the previous
+        person for everyone it visits so the path can be rebuilt at the
+        end.
+
+        Parameters
+        ----------
+        target_user : FamilyTreeMember
+            The user who you want to list the relation to.
 
-        # We hit the jackpot - return the made up string
+        Returns
+        -------
+        Optional[Tuple[str, ...]]
+            The relation steps, or ``None`` if the users aren't related.
+        """
+
+        # See if there's anything to find
         if target_user.id == self.id:
-            ret_string = "'s ".join(working_relation)
-            return ret_string
-
-        # Add self to list of checked people
-        added_already.add(self.id)
-
-        # Check parent
-        if self._parent and self._parent not in added_already:
-            parent = self.parent
-            assert parent
-            x = parent.get_unshortened_relation(
-                target_user,
-                working_relation=working_relation + ['parent'],
-                added_already=added_already
-            )
-            if x:
-                return x
-
-        # Check partner
-        for i in [o for o in self.partners if o.id not in added_already]:
-            x = i.get_unshortened_relation(
-                target_user,
-                working_relation=working_relation + ['partner'],
-                added_already=added_already
-            )
-            if x:
-                return x
-
-        # Check children
-        for i in [o for o in self.children if o.id not in added_already]:
-            x = i.get_unshortened_relation(
-                target_user,
-                working_relation=working_relation + ['child'],
-                added_already=added_already
-            )
-            if x:
-                return x
+            return ()
+        if not self.is_family_with(target_user):
+            return None
 
-        return None
+        # Each person seen from either side is stored against the ID of
+        # the person that they were reached from, the step between them,
+        # and how many steps they are from the side's starting user
+        forwards: Dict[int, Tuple[int, str, int]] = {self.id: (0, "", 0)}
+        backwards: Dict[int, Tuple[int, str, int]] = {target_user.id: (0, "", 0)}
+        forwards_frontier: List[FamilyTreeMember] = [self]
+        backwards_frontier: List[FamilyTreeMember] = [target_user]
+        meeting_point: Optional[int] = None
+
+        # Expand whichever side has the fewest people waiting, one
+        # generation of the search at a time
+        while forwards_frontier and backwards_frontier and meeting_point is None:
+            is_forwards = len(forwards_frontier) <= len(backwards_frontier)
+            if is_forwards:
+                frontier, seen, other_seen = forwards_frontier, forwards, backwards
+            else:
+                frontier, seen, other_seen = backwards_frontier, backwards, forwards
+            new_frontier: List[FamilyTreeMember] = []
+            best_length: Optional[int] = None
+            for person in frontier:
+                distance = seen[person.id][2] + 1
+                for other, step in person._get_relation_links(not is_forwards):
+                    if other.id in seen:
+                        continue
+                    seen[other.id] = (person.id, step, distance)
+                    new_frontier.append(other)
+
+                    # We can only stop once the whole generation is done, as
+                    # a later meeting could still give a shorter path
+                    if other.id in other_seen:
+                        length = distance + other_seen[other.id][2]
+                        if best_length is None or length < best_length:
+                            best_length = length
+                            meeting_point = other.id
+            if is_forwards:
+                forwards_frontier = new_frontier
+            else:
+                backwards_frontier = new_frontier
+        if meeting_point is None:
+            return None
+
+        # Walk back to each of the users from where the searches met
+        steps: List[str] = []
+        user_id = meeting_point
+        while user_id != self.id:
+            user_id, step, _ = forwards[user_id]
+            steps.append(step)
+        steps.reverse()
+        user_id = meeting_point
+        while user_id != target_user.id:
+            user_id, step, _ = backwards[user_id]
+            steps.append(step)
+        return tuple(steps)
+
+    def get_unshortened_relation(
+            self,
+            target_user: FamilyTreeMember) -> Optional[str]:
+        """
+        Gets your relation to the other given user.
+
+        Parameters
+        ----------
+        target_user : FamilyTreeMember
+            The user who you want to list the relation to.
+
+        Returns
+        -------
+        Optional[str]
+            The family tree relationship string.
+        """
+
+        steps = self.get_relation_steps(target_user)
+        if steps is None:
+            return None
+        return "'s ".join(steps)
 
     def generational_span(
             self,
@@ -581,8 +938,7 @@ class FamilyTreeMember:
             add_parent: bool = False,
             add_partners: bool = True,
             expand_upwards: bool = False,
-            all_people: Union[set, None] = None,
-            recursive_depth: int = 0) -> Dict[int, List[FamilyTreeMember]]:
+            all_people: Union[Set[int], None] = None) -> Dict[int, List[FamilyTreeMember]]:
         """
         Gets a list of every user related to this one.
         If "add_parent" and "expand_upwards" are True, then it
@@ -592,21 +948,20 @@ class FamilyTreeMember:
         Parameters
         ----------
         people_dict : Union[dict, None], optional
-            The dict of users who are currently in the tree
-            (so as to avoid recursion).
+            The dict of users who are currently in the tree.
         depth : int, optional
             The current generation of the tree span.
         add_parent : bool, optional
             Whether or not to add the parent of this user to the
             people list.
+        add_partners : bool, optional
+            Whether or not to add the partners of this user to the
+            people list.
         expand_upwards : bool, optional
             Whether or not to expand upwards in the tree.
-        all_people : Union[set, None], optional
-            A set of all people who this recursive function would
-            look at.
-        recursive_depth : int, optional
-            How far into the recursion you have gone - this is so we
-            don't get recursion errors.
+        all_people : Union[Set[int], None], optional
+            A set of the IDs of people who have already been added,
+            and shouldn't be looked at again.
 
         Returns
         -------
@@ -614,62 +969,75 @@ class FamilyTreeMember:
             A dictionary of each generation of users.
         """
 
-        # Don't add yourself again
         if people_dict is None:
             people_dict = {}
         if all_people is None:
             all_people = set()
-        if self.id in all_people:
-            return people_dict
-        if recursive_depth >= 500:
-            return people_dict
-        all_people.add(self.id)
+        walk = self._walk(
+            all_people,
+            generational=True,
+            depth=depth,
+            add_parent=add_parent,
+            add_partners=add_partners,
+            expand_upwards=expand_upwards,
+        )
+        for person, person_depth in walk:
+            people_dict.setdefault(person_depth, list()).append(person)
+        return people_dict
 
-        # Add to dict
-        x = people_dict.setdefault(depth, list())
-        x.append(self)
+    def get_generations(
+            self,
+            expand_upwards: bool = False) -> Tuple[Dict[int, List[FamilyTreeMember]], Dict[int, int]]:
+        """
+        Gets the generational span of the tree that this user is in (from
+        the user's root), alongside the generation of each user in it.
 
-        # Add your children
-        for child in self.children:
-            people_dict = child.generational_span(
-                people_dict,
-                depth=depth + 1,
-                add_parent=False,
-                add_partners=True,
-                expand_upwards=expand_upwards,
-                all_people=all_people,
-                recursive_depth=recursive_depth + 1,
-            )
+        The generations are cached until someone in the family changes,
+        so drawing the same tree again doesn't need the family to be
+        walked again.
 
-        # Add your partner
-        if add_partners:
-            for partner in self.partners:
-                people_dict = partner.generational_span(
-                    people_dict,
-                    depth=depth,
-                    add_parent=True,
-                    add_partners=False,
-                    expand_upwards=expand_upwards,
-                    all_people=all_people,
-                    recursive_depth=recursive_depth + 1,
-                )
-
-        # Add your parent
-        if expand_upwards and add_parent and self._parent:
-            parent = self.parent
-            assert parent
-            people_dict = parent.generational_span(
-                people_dict,
-                depth=depth - 1,
-                add_parent=True,
-                add_partners=True,
+        Parameters
+        ----------
+        expand_upwards : bool, optional
+            Whether or not to expand upwards in the tree, adding the
+            parents of partners etc.
+
+        Returns
+        -------
+        Tuple[Dict[int, List[FamilyTreeMember]], Dict[int, int]]
+            A dictionary of each generation of users (which is yours to
+            change), and a dictionary of user ID to generation.
+        """
+
+        root_user = self.get_root()
+        key = (self._guild_id, root_user.id, expand_upwards)
+        cached = self.generation_cache.get(key)
+
+        # Walk the tree and cache the IDs in it
+        if cached is None:
+            gen_span = root_user.generational_span(
                 expand_upwards=expand_upwards,
-                all_people=all_people,
-                recursive_depth=recursive_depth + 1,
+                add_parent=expand_upwards,
             )
-
-        # Remove dupes, should they be in there
-        return people_dict
+            generations = {
+                depth: tuple(i.id for i in depth_list)
+                for depth, depth_list in gen_span.items()
+            }
+            depths = {
+                i: depth
+                for depth, ids in generations.items()
+                for i in ids
+            }
+            self.generation_cache.set(key, generations, depths)
+            return gen_span, depths
+
+        # Get the members back out from the cached IDs
+        generations, depths = cached
+        gen_span = {
+            depth: [*self._get_many(ids)]
+            for depth, ids in generations.items()
+        }
+        return gen_span, depths
 
     async def to_dot_script(
             self,
@@ -692,9 +1060,10 @@ class FamilyTreeMember:
             The generated DOT code.
         """
 
-        root_user = self.get_root()
-        gen_span = root_user.generational_span()
-        return await self.to_dot_script_from_generational_span(bot, gen_span, customised_tree_user)
+        gen_span, depths = self.get_generations()
+        return await self.to_dot_script_from_generational_span(
+            bot, gen_span, customised_tree_user, depths=depths,
+        )
 
     async def to_full_dot_script(
             self,
@@ -717,9 +1086,10 @@ class FamilyTreeMember:
             The generated DOT code.
         """
 
-        root_user = self.get_root()
-        gen_span = root_user.generational_span(expand_upwards=True, add_parent=True)
-        return await self.to_dot_script_from_generational_span(bot, gen_span, customised_tree_user)
+        gen_span, depths = self.get_generations(expand_upwards=True)
+        return await self.to_dot_script_from_generational_span(
+            bot, gen_span, customised_tree_user, depths=depths,
+        )
 
     def to_graphviz_label(
             self,
@@ -742,10 +1112,17 @@ class FamilyTreeMember:
             self,
             bot: types.Bot,
             gen_span: Dict[int, List[FamilyTreeMember]],
-            customised_tree_user: CustomisedTreeUser) -> str:
+            customised_tree_user: CustomisedTreeUser,
+            *,
+            depths: Optional[Dict[int, int]] = None) -> str:
         """
         Generates the DOT script from a given generational span.
 
+        The script only depends on the span, the customisations, and the
+        names of the users in it - the same tree always gives the same
+        script, byte for byte, so it can be used to cache the rendered
+        image or to see whether a tree has changed.
+
         Parameters
         ----------
         bot : types.Bot
@@ -755,6 +1132,10 @@ class FamilyTreeMember:
         customised_tree_user : CustomisedTreeUser
             The customised tree object that should be used to alter how the
             dot script looks.
+        depths : Optional[Dict[int, int]], optional
+            The generation of each user ID in the span, as given by
+            :func:`get_generations`. If this isn't given then the span
+            is searched for this user.
 
         Returns
         -------
@@ -764,10 +1145,13 @@ class FamilyTreeMember:
 
         # Find my own depth
         my_depth: int = 0
-        for depth, depth_list in gen_span.items():
-            if self in depth_list:
-                my_depth = depth
-                break
+        if depths is not None:
+            my_depth = depths.get(self.id, 0)
+        else:
+            for depth, depth_list in gen_span.items():
+                if self in depth_list:
+                    my_depth = depth
+                    break
 
         # Add my partner and parent
         for partner in self.partners:
@@ -782,8 +1166,26 @@ class FamilyTreeMember:
         # Long var names suck
         ctu = customised_tree_user
 
+        # The script is built up as a list of strings and joined at the
+        # end, and the edges we've added are kept in sets so we don't
+        # need to search through the script to see if they're there
+        all_text: List[str] = []
+        partner_links: Set[Tuple[int, int]] = set()
+        parent_links: Set[int] = set()
+        child_links: Set[Tuple[int, int]] = set()
+
+        # Get the names of everyone who could be in the tree in one go
+        name_ids: Set[int] = set()
+        for generation in gen_span.values():
+            for person in generation:
+                name_ids.add(person.id)
+                for partner in person.partners:
+                    name_ids.add(partner.id)
+                    name_ids.update(partner._partners)
+        names = await DiscordNameManager.fetch_names_by_ids(bot, name_ids)
+
         # Make some initial digraph stuff
-        all_text: str = (
+        all_text.append(
             "digraph {"
             f"node [shape=box,fontcolor={ctu.hex['font']},"
             f"color={ctu.hex['edge']},"
@@ -807,28 +1209,24 @@ class FamilyTreeMember:
             # Make sure you don't add a spouse twice (as they will
             # be added both by the partner loop and they'll be in the
             # generation list)
-            added_already: List[FamilyTreeMember] = []
-
-            # # Add a ranking for this generation; only necessary if this
-            # # if our first runthrough (the child adding section adds this
-            # # on subsequent loops)
-            # all_text += "{rank=same;"
-
+            added_already: Set[int] = set()
 
             # Go through each person in the generation
             for person in generation:
 
                 # Don't add a person twice
-                if person in added_already:
+                if person.id in added_already:
                     continue
-                added_already.append(person)
+                added_already.add(person.id)
 
-                # Work out who the user's partners are
+                # Work out who the user's partners are - their own partners
+                # (which are sorted by ID), then their partners' partners,
+                # without any repeats
                 previous_partner = None
                 filtered_possible_partners = [*person.partners]
                 for p in filtered_possible_partners.copy():
                     filtered_possible_partners.extend(p.partners)
-                filtered_possible_partners = [*list(set(filtered_possible_partners))]
+                filtered_possible_partners = [*dict.fromkeys(filtered_possible_partners)]
                 try:
                     filtered_possible_partners.remove(person)
                 except ValueError:
@@ -836,54 +1234,43 @@ class FamilyTreeMember:
                 filtered_possible_partners.insert(0, person)
 
                 # Add the user's partners
-                all_text += f"subgraph cluster{get_cluster_name()}{{peripheries=0;{{rank=same;"
+                all_text.append(f"subgraph {get_cluster_name(generation_number, person.id)}{{peripheries=0;{{rank=same;")
                 for partner in filtered_possible_partners:
-                    name = (
-                        (
-                            await DiscordNameManager
-                            .fetch_name_by_id(bot, partner.id)
-                        )
-                        .replace('"', '\\"')
-                    )
+                    name = names[partner.id].replace('"', '\\"')
                     if partner == self:
-                        all_text += partner.to_graphviz_label(name, ctu)
+                        all_text.append(partner.to_graphviz_label(name, ctu))
                     else:
-                        all_text += partner.to_graphviz_label(name)
+                        all_text.append(partner.to_graphviz_label(name))
                     if previous_partner is None:
                         previous_partner = partner
                         continue
-                    partner_link = f"{previous_partner.id} -> {partner.id};"
-                    alt_partner_link = f"{partner.id} -> {previous_partner.id};"
-                    if (
-                            partner_link not in all_text
-                            and alt_partner_link not in all_text
-                            and partner != previous_partner):
-                        all_text += partner_link
-                    added_already.append(partner)
+                    link = (
+                        min(previous_partner.id, partner.id),
+                        max(previous_partner.id, partner.id),
+                    )
+                    if link not in partner_links and partner != previous_partner:
+                        partner_links.add(link)
+                        all_text.append(f"{previous_partner.id} -> {partner.id};")
+                    added_already.add(partner.id)
                     previous_partner = partner
-                all_text += "}" + "}"
-
-            # # Close off the generation and open a new ranking for
-            # # adding children links
-            # all_text += "}"
+                all_text.append("}" + "}")
 
             # Go through the people in the generation and see if they have
             # any children to add
             for person in generation:
                 if person._children:
-                    all_text += f"p{person.id} {self.INVISIBLE};"
+                    all_text.append(f"p{person.id} {self.INVISIBLE};")
 
             # Add the lines from parent to node to child
             for person in generation:
-                if person._children:
-                    new_text = f"{person.id}:s -> p{person.id}:c;"
-                    if new_text not in all_text:
-                        all_text += new_text
+                if person._children and person.id not in parent_links:
+                    parent_links.add(person.id)
+                    all_text.append(f"{person.id}:s -> p{person.id}:c;")
                 for child in person.children:
-                    new_text = f"p{person.id}:c -> {child.id}:n;"
-                    if new_text not in all_text:
-                        all_text += new_text
+                    if (person.id, child.id) not in child_links:
+                        child_links.add((person.id, child.id))
+                        all_text.append(f"p{person.id}:c -> {child.id}:n;")
 
         # And we're done!
-        all_text += "}"
-        return all_text
+        all_text.append("}")
+        return "".join(all_text)
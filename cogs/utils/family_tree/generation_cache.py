@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Optional,
+    Tuple,
+)
+
+from cogs.utils.family_tree.member_lru_cache import MemberLRUCache
+
+if TYPE_CHECKING:
+    GenerationKey = Tuple[int, int, bool]
+    Generations = Dict[int, Tuple[int, ...]]
+    GenerationValue = Tuple[Generations, Dict[int, int]]
+
+
+__all__ = (
+    'GenerationCache',
+)
+
+
+class GenerationCache(MemberLRUCache["GenerationKey", "GenerationValue"]):
+    """
+    A bounded LRU cache of the generations in a family tree, keyed by
+    ``(guild_id, root_id, full)``, where ``full`` is whether the tree
+    was expanded upwards (ie it's a ``fulltree``).
+
+    Each entry holds the user IDs in each generation (in the order
+    that :func:`FamilyTreeMember.generational_span` gives them) and the
+    generation of each user. Only IDs are kept so that cached trees never
+    hold onto old member objects. Each tree is tracked against everyone
+    in it.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, max_size: int = 1_000):
+        super().__init__(max_size)
+
+    def _get_member_ids(self, key: GenerationKey, value: GenerationValue) -> Iterable[int]:
+        return value[1]
+
+    def get(self, key: GenerationKey) -> Optional[GenerationValue]:  # type: ignore[override]
+        """
+        Get a cached tree, marking it as recently used.
+
+        Parameters
+        ----------
+        key : Tuple[int, int, bool]
+            The ``(guild_id, root_id, full)`` of the tree.
+
+        Returns
+        -------
+        Optional[Tuple[Dict[int, Tuple[int, ...]], Dict[int, int]]]
+            The user IDs in each generation and the generation of each
+            user, or ``None`` if the tree isn't cached.
+        """
+
+        return super().get(key)
+
+    def set(
+            self,
+            key: GenerationKey,
+            generations: Generations,
+            depths: Dict[int, int]) -> None:
+        """
+        Cache the generations of a tree, evicting the least recently used
+        if the cache is full.
+        """
+
+        self._set(key, (generations, depths))
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Set,
+    Tuple,
+    TypeVar,
+)
+import abc
+import collections
+
+if TYPE_CHECKING:
+    MemberKey = Tuple[int, int]
+
+
+__all__ = (
+    'MemberLRUCache',
+)
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class MemberLRUCache(abc.ABC, Generic[K, V]):
+    """
+    A bounded LRU cache where every entry is tracked against the users that
+    it's about, so that when a family changes we can drop everything cached
+    about the people in it (and nothing else).
+
+    Keys have to start with the guild ID. Subclasses say which users an
+    entry is about by implementing :func:`_get_member_ids`.
+    """
+
+    __slots__ = (
+        'max_size',
+        '_cache',
+        '_by_member',
+        'hits',
+        'misses',
+        'evictions',
+        'invalidations',
+    )
+
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self._cache: collections.OrderedDict[K, V] = collections.OrderedDict()
+        self._by_member: Dict[MemberKey, Set[K]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.invalidations: int = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @abc.abstractmethod
+    def _get_member_ids(self, key: K, value: V) -> Iterable[int]:
+        """
+        Get the IDs of the users that a cached entry is about.
+        """
+
+    def get(self, key: K, default: Any = None) -> Any:
+        """
+        Get a cached entry, marking it as recently used.
+        """
+
+        try:
+            value = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _set(self, key: K, value: V) -> None:
+        """
+        Cache an entry against each of its users, evicting the least
+        recently used if the cache is full.
+        """
+
+        if key in self._cache:
+            self._remove(key)
+        self._cache[key] = value
+        guild_id = key[0]  # type: ignore
+        for user_id in self._get_member_ids(key, value):
+            self._by_member.setdefault((user_id, guild_id), set()).add(key)
+        while len(self._cache) > self.max_size:
+            self._remove(next(iter(self._cache)))
+            self.evictions += 1
+
+    def _remove(self, key: K) -> None:
+        """
+        Remove an entry from the cache and from the member tracking.
+        """
+
+        value = self._cache.pop(key)
+        guild_id = key[0]  # type: ignore
+        for user_id in self._get_member_ids(key, value):
+            member_key = (user_id, guild_id)
+            keys = self._by_member.get(member_key)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._by_member[member_key]
+
+    def invalidate(self, member_keys: Iterable[MemberKey]) -> None:
+        """
+        Drop every cached entry about any of the given users.
+
+        Parameters
+        ----------
+        member_keys : Iterable[Tuple[int, int]]
+            The ``(discord_id, guild_id)`` pairs of the users.
+        """
+
+        for member_key in member_keys:
+            keys = self._by_member.get(member_key)
+            if not keys:
+                continue
+            for key in list(keys):
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_guild(self, guild_id: int) -> None:
+        """
+        Drop every cached entry for a given guild.
+        """
+
+        for key in [i for i in self._cache if i[0] == guild_id]:  # type: ignore
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        """
+        Remove every entry, without resetting the hit, miss, eviction and
+        invalidation counters.
+        """
+
+        self._cache.clear()
+        self._by_member.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the size of the cache and its counters.
+        """
+
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Iterable,
+    Optional,
+    Tuple,
+)
+
+from cogs.utils.family_tree.member_lru_cache import MemberLRUCache
+
+if TYPE_CHECKING:
+    RelationKey = Tuple[int, int, int]
+
+
+__all__ = (
+    'RelationCache',
+)
+
+
+class RelationCache(MemberLRUCache["RelationKey", Optional[str]]):
+    """
+    A bounded LRU cache of relationship strings between two users, keyed
+    by ``(guild_id, user_id, other_id)``. Each pair is tracked against both
+    of the users in it.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, max_size: int = 10_000):
+        super().__init__(max_size)
+
+    def _get_member_ids(self, key: RelationKey, value: Optional[str]) -> Iterable[int]:
+        return key[1:]
+
+    def get(self, key: RelationKey, default: Any = None) -> Any:
+        """
+        Get a cached relation, marking it as recently used.
+
+        Parameters
+        ----------
+        key : Tuple[int, int, int]
+            The ``(guild_id, user_id, other_id)`` of the relation.
+        default : Any, optional
+            What to return if the relation isn't cached. Since ``None`` is
+            a valid relation, you'll want to pass a sentinel here.
+
+        Returns
+        -------
+        Any
+            The cached relation string, or the default.
+        """
+
+        return super().get(key, default)
+
+    def set(self, key: RelationKey, value: Optional[str]) -> None:
+        """
+        Cache the relation between two users (or ``None`` if they aren't
+        related), evicting the least recently used if the cache is full.
+        """
+
+        self._set(key, value)
@@ -1,3 +1,6 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Tuple, Union
 import re
 
 
@@ -10,63 +13,69 @@ class RelationshipStringSimplifier(object):
     """
     A general static class for simplifying a list of relations from
     a set of two users.
+
+    The steps between two users are reduced as tokens first (cutting out
+    things like "child's parent"), and the rest of the rules are then run
+    over the reduced string. Since there are only so many shapes that a
+    relation can take, the finished strings are kept in a lookup table
+    keyed by the steps, so most relations are a single dictionary lookup.
     """
 
-    # Operations to cut down reduncencies
-    pre_operations = [
-        lambda x: x.replace("parent's partner", "parent"),
-        lambda x: x.replace("partner's child", "child"),
-        lambda x: x.replace("child's parent", ""),
-        lambda x: x.replace(" 's", ""),
-        lambda x: x.replace("  ", " "),
-        lambda x: x if not x.startswith("'s") else x[2:],  # Strip out leading `'s`
-        lambda x: x.strip(),  # Strip leading and trailing whitespace
-    ]
+    # Token pairs to cut down redundancies; each pass goes through these
+    # in order. An empty replacement means that the pair is cut out
+    # entirely.
+    pre_operations: Tuple[Tuple[Tuple[str, str], Tuple[str, ...]], ...] = (
+        (("parent", "partner"), ("parent",)),
+        (("partner", "child"), ("child",)),
+        (("child", "parent"), ()),
+    )
+    pre_operation_passes: int = 5
 
     # Operations to replace phrases ("parent's child") with others ("sibling")
-    operations = [
-        lambda x: x.replace("parent's sibling", "aunt/uncle"),
-        lambda x: x.replace("aunt/uncle's child", "cousin"),
-        lambda x: x.replace("parent's child", "sibling"),
-        lambda x: x.replace("sibling's child", "niece/nephew"),
-        lambda x: x.replace("sibling's partner's child", "niece/nephew"),
-        lambda x: x.replace("parent's niece/nephew", "cousin"),
-        lambda x: x.replace("aunt/uncle's child", "cousin"),
-        lambda x: x.replace("niece/nephew's sibling", "niece/nephew"),
-        lambda x: x.replace("niece/nephew's child", "grandniece/nephew"),
-        lambda x: x.replace("grandgrandniece/nephew", "great grandniece/nephew"),
-        lambda x: x.replace("partner's parent", "parent-in-law")
-    ]
+    operations: Tuple[Tuple[str, str], ...] = (
+        ("parent's sibling", "aunt/uncle"),
+        ("aunt/uncle's child", "cousin"),
+        ("parent's child", "sibling"),
+        ("sibling's child", "niece/nephew"),
+        ("sibling's partner's child", "niece/nephew"),
+        ("parent's niece/nephew", "cousin"),
+        ("aunt/uncle's child", "cousin"),
+        ("niece/nephew's sibling", "niece/nephew"),
+        ("niece/nephew's child", "grandniece/nephew"),
+        ("grandgrandniece/nephew", "great grandniece/nephew"),
+        ("partner's parent", "parent-in-law"),
+    )
 
     # Operations to shorten strings of the same word ("child's child")
     # into more appropriate forms ("grandchild")
-    short_operations = [
-        lambda x: re.sub(
-            r"((?:child's )+)child",
+    short_operations: Tuple[Tuple[re.Pattern, Union[str, Callable[[re.Match], str]]], ...] = (
+        (
+            re.compile(r"((?:child's )+)child"),
             lambda m: ("great " * (m.group(1).count(" ") - 1)) + "grandchild",
-            x,
         ),
-        lambda x: re.sub(
-            r"((?:parent's )+)parent",
+        (
+            re.compile(r"((?:parent's )+)parent"),
             lambda m: ("great " * (m.group(1).count(" ") - 1)) + "grandparent",
-            x,
         ),
-        lambda x: x.replace("grandsibling", "great aunt/uncle"),
-        lambda x: re.sub(r"sibling's (\d+(?:st|nd|rd|th) cousin)", r"\1", x),
-    ]
+        (re.compile(r"grandsibling"), "great aunt/uncle"),
+        (re.compile(r"sibling's (\d+(?:st|nd|rd|th) cousin)"), r"\1"),
+    )
 
     # Operations to strip out anything that shouldn't really be
-    # there, eg double spaces or trailing whitepsace
-    post_operations = [
-        lambda x: x.replace(" 's", ""),
-        lambda x: x.replace("  ", " "),
-        lambda x: x if not x.startswith("'s") else x[2:],
-        lambda x: x.strip(),
-    ]
+    # there, eg double spaces or trailing whitepsace (leading "'s" and
+    # whitespace get stripped after these)
+    post_operations: Tuple[Tuple[str, str], ...] = (
+        (" 's", ""),
+        ("  ", " "),
+    )
 
     # Get all the regex ready
     cousin_matcher = re.compile(r"(?:parent's)(?: (?:parent|child)(?:'s)?)+ child")
 
+    # The finished strings for each set of steps that we've seen
+    max_cached_steps: int = 10_000
+    _simplified: Dict[Tuple[str, ...], str] = {}
+
     @classmethod
     def get_cousin_string(cls, k) -> str:
         """
@@ -109,23 +118,104 @@ class RelationshipStringSimplifier(object):
         return (cousin_string + times_removed).strip()
 
     @classmethod
-    def simplify(cls, string:str) -> str:
+    def _reduce_steps(cls, steps: Tuple[str, ...]) -> str:
         """
-        Runs the given input through the shortening operations a
-        number of times so as to shorten the input to a nice
-        family relationship string.
+        Run the pre-operations over a set of steps, giving back the
+        relation string that the rest of the operations work on.
+        """
+
+        tokens: List[str] = list(steps)
+        dangling = False
+        for _ in range(cls.pre_operation_passes):
+            changed = False
+            for (first, second), replacement in cls.pre_operations:
+                reduced: List[str] = []
+                index, length = 0, len(tokens)
+                removed_last = False
+                while index < length:
+                    token = tokens[index]
+                    if token == first and index + 1 < length and tokens[index + 1] == second:
+                        reduced.extend(replacement)
+                        index += 2
+                        removed_last = not replacement and index == length
+                        continue
+                    reduced.append(token)
+                    index += 1
+                if len(reduced) == length:
+                    continue
+                changed = True
+                tokens = reduced
+
+                # A pair being cut from the very end of a relation leaves
+                # the "'s" from the step before it hanging
+                dangling = (dangling or removed_last) and bool(tokens)
+            if not changed:
+                break
+        return "'s ".join(tokens) + ("'s" if dangling else "")
+
+    @classmethod
+    def _simplify_reduced(cls, string: str) -> str:
+        """
+        Run the phrase and shortening operations over a reduced
+        relation string.
         """
 
-        for _ in range(5):
-            for o in cls.pre_operations:
-                string = o(string)
         string = cls.cousin_matcher.sub(cls.get_cousin_string, string)
-        for o in cls.operations:
-            string = o(string)
-        for o in cls.short_operations:
-            string = o(string)
-        for o in cls.post_operations:
-            string = o(string)
-        for o in cls.short_operations:
-            string = o(string)
+        for old, new in cls.operations:
+            string = string.replace(old, new)
+        string = cls._shorten(string)
+        for old, new in cls.post_operations:
+            string = string.replace(old, new)
+        if string.startswith("'s"):
+            string = string[2:]
+        return cls._shorten(string.strip())
+
+    @classmethod
+    def _shorten(cls, string: str) -> str:
+        """
+        Run the short operations over a string.
+        """
+
+        for pattern, replacement in cls.short_operations:
+            string = pattern.sub(replacement, string)
         return string
+
+    @classmethod
+    def simplify_steps(cls, steps: Tuple[str, ...]) -> str:
+        """
+        Simplify a list of relation steps (eg ``("parent", "child")``)
+        into a nice family relationship string (eg ``"sibling"``).
+
+        Parameters
+        ----------
+        steps : Tuple[str, ...]
+            The steps from one user to another, as given by
+            :func:`FamilyTreeMember.get_relation_steps`.
+
+        Returns
+        -------
+        str
+            The simplified relationship string.
+        """
+
+        try:
+            return cls._simplified[steps]
+        except KeyError:
+            pass
+        simplified = cls._simplify_reduced(cls._reduce_steps(steps))
+        if len(cls._simplified) >= cls.max_cached_steps:
+            cls._simplified.clear()
+        cls._simplified[steps] = simplified
+        return simplified
+
+    @classmethod
+    def simplify(cls, string: str) -> str:
+        """
+        Simplify an unshortened relation string (as given by
+        :func:`FamilyTreeMember.get_unshortened_relation`) into a nice
+        family relationship string.
+        """
+
+        if not string:
+            return cls.simplify_steps(())
+        return cls.simplify_steps(tuple(string.split("'s ")))
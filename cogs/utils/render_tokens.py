@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Union
+import abc
+import asyncio
+import fcntl
+import os
+import socket
+import time
+import uuid
+
+from discord.ext import vbu
+
+
+__all__ = (
+    'RenderTokenPool',
+    'FileRenderTokenPool',
+    'RedisRenderTokenPool',
+)
+
+
+# How long to wait between tries at taking a token when they're all in use
+TOKEN_POLL_SECONDS = 0.05
+
+
+class RenderTokenPool(abc.ABC):
+    """
+    A fixed number of tokens shared by every process on a host, one of
+    which has to be held for each tree being rendered, so that the host as
+    a whole never runs more than ``size`` renders at once.
+    """
+
+    def __init__(self, size: int):
+        self.size: int = size
+
+    @abc.abstractmethod
+    async def acquire(self) -> Optional[Union[int, str]]:
+        """
+        Wait for a token to be free and take it.
+
+        Returns
+        -------
+        Optional[Union[int, str]]
+            The token, to be given back to :func:`release`. This is
+            ``None`` if the pool couldn't be reached, in which case the
+            render goes ahead without one.
+        """
+
+    @abc.abstractmethod
+    async def release(self, token: Optional[Union[int, str]]) -> None:
+        """
+        Give back a token taken with :func:`acquire`.
+        """
+
+    @abc.abstractmethod
+    async def in_use(self) -> int:
+        """
+        Get how many tokens are taken, across every process on the host.
+        """
+
+
+class FileRenderTokenPool(RenderTokenPool):
+    """
+    A token pool made of lock files in a directory - each token is an
+    exclusive ``flock`` on one of ``size`` files. The kernel drops the lock
+    if the process holding it dies, so a crash never loses a token.
+    """
+
+    def __init__(self, directory: str, size: int):
+        super().__init__(size)
+        self.directory: str = directory
+        self._held: Dict[int, int] = {}  # Token: file descriptor
+
+    def _open(self, token: int) -> int:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.open(
+            os.path.join(self.directory, f"token-{token}.lock"),
+            os.O_RDWR | os.O_CREAT,
+            0o666,
+        )
+
+    def _try_acquire(self) -> Optional[int]:
+        """
+        Take the first free token, if there is one.
+        """
+
+        for token in range(self.size):
+            if token in self._held:
+                continue
+            fd = self._open(token)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            self._held[token] = fd
+            return token
+        return None
+
+    async def acquire(self) -> Optional[int]:
+        while (token := self._try_acquire()) is None:
+            await asyncio.sleep(TOKEN_POLL_SECONDS)
+        return token
+
+    async def release(self, token: Optional[Union[int, str]]) -> None:
+        fd = self._held.pop(token, None)  # type: ignore
+        if fd is None:
+            return
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    async def in_use(self) -> int:
+        count = len(self._held)
+        for token in range(self.size):
+            if token in self._held:
+                continue
+            fd = self._open(token)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                count += 1
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        return count
+
+
+class RedisRenderTokenPool(RenderTokenPool):
+    """
+    A token pool kept in Redis as a sorted set of token holders, scored by
+    when their lease runs out. Leases are longer than a render can take,
+    so a token held by a process that died is freed once its lease is up
+    - ``lease`` has to be longer than the render timeout. The key includes
+    the hostname, so each host has its own pool.
+    """
+
+    # The prefix for the sorted set of token holders in Redis
+    REDIS_KEY_PREFIX = "TreeRenderTokens-"
+
+    # Clear out expired holders, then take a token if there's one free.
+    # KEYS: the pool; ARGV: now, lease end, size, holder, key expiry
+    ACQUIRE_SCRIPT = """
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+        if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+            redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+            redis.call('EXPIRE', KEYS[1], ARGV[5])
+            return 1
+        end
+        return 0
+    """
+
+    def __init__(self, size: int, lease: float = 60.0):
+        super().__init__(size)
+        self.lease: float = lease
+        self.key: str = f"{self.REDIS_KEY_PREFIX}{socket.gethostname()}"
+
+    async def acquire(self) -> Optional[str]:
+        holder = f"{os.getpid()}-{uuid.uuid4().hex}"
+        while True:
+            now = time.time()
+            try:
+                async with vbu.Redis() as re:
+                    taken = await re.conn.eval(
+                        self.ACQUIRE_SCRIPT,
+                        keys=[self.key],
+                        args=[now, now + self.lease, self.size, holder, int(self.lease) + 1],
+                    )
+            except Exception:
+                return None  # Render anyway rather than not at all
+            if taken:
+                return holder
+            await asyncio.sleep(TOKEN_POLL_SECONDS)
+
+    async def release(self, token: Optional[Union[int, str]]) -> None:
+        if token is None:
+            return
+        try:
+            async with vbu.Redis() as re:
+                await re.conn.zrem(self.key, token)
+        except Exception:
+            pass  # The lease runs out on its own
+
+    async def in_use(self) -> int:
+        try:
+            async with vbu.Redis() as re:
+                return await re.conn.zcount(self.key, time.time())
+        except Exception:
+            return 0
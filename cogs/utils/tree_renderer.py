@@ -0,0 +1,565 @@
+from __future__ import annotations
+
+from typing import Deque, Dict, List, Optional, Union
+import asyncio
+import collections
+import hashlib
+import itertools
+import time
+
+from discord.ext import vbu
+
+from cogs.utils.render_tokens import RenderTokenPool
+
+
+__all__ = (
+    'RenderQueueFull',
+    'RenderTooLarge',
+    'RenderCache',
+    'TreeRenderer',
+)
+
+
+# The format that large trees are drawn in when the renderer is busy -
+# no antialiasing, which is a good deal quicker to draw
+DOWNGRADED_RENDER_FORMAT = "png:gd"
+
+# How full the render queue needs to be before the renderer counts as busy
+BUSY_QUEUE_FRACTION = 0.5
+
+# How many of the most recent renders the queue latency is worked out from
+QUEUE_LATENCY_SAMPLES = 100
+
+# How long to wait for Graphviz to exit after it's been killed
+DOT_KILL_WAIT_SECONDS = 1.0
+
+
+class RenderQueueFull(Exception):
+    """
+    The error raised when a tree is sent to be rendered but there are
+    already too many trees waiting.
+    """
+
+
+class RenderTooLarge(RenderQueueFull):
+    """
+    The error raised when a tree is too large to be rendered while the
+    renderer is busy.
+    """
+
+
+class RenderJob:
+    """
+    A single tree waiting to be rendered. Jobs are ordered by tier (highest
+    first), and then by when they were queued.
+    """
+
+    __slots__ = (
+        'tier',
+        'sequence',
+        'cost',
+        'dot',
+        'format',
+        'future',
+        'queued_at',
+    )
+
+    def __init__(
+            self,
+            tier: int,
+            sequence: int,
+            cost: int,
+            dot: bytes,
+            format: str,
+            future: asyncio.Future):
+        self.tier: int = tier
+        self.sequence: int = sequence
+        self.cost: int = cost
+        self.dot: bytes = dot
+        self.format: str = format
+        self.future: asyncio.Future = future
+        self.queued_at: float = time.monotonic()
+
+    def __lt__(self, other: RenderJob) -> bool:
+        return (-self.tier, self.sequence) < (-other.tier, other.sequence)
+
+
+class RenderCache:
+    """
+    A bounded LRU cache of rendered trees, keyed by a hash of the DOT
+    script and format that they were rendered from. The same script
+    always gives the same image, so entries never need to be invalidated
+    - a change to the family or its customisations is a different script,
+    and so a different key. The cache is bounded by the total size of
+    the images in it rather than how many there are.
+    """
+
+    __slots__ = (
+        'max_bytes',
+        '_cache',
+        '_bytes',
+        'hits',
+        'redis_hits',
+        'misses',
+        'evictions',
+    )
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes: int = max_bytes
+        self._cache: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        self._bytes: int = 0
+        self.hits: int = 0
+        self.redis_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @staticmethod
+    def get_key(dot: bytes, format: str) -> str:
+        """
+        Get the cache key for a DOT script rendered to a given format.
+        """
+
+        return hashlib.sha256(format.encode() + b"\0" + dot).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Get a cached image, marking it as recently used.
+        """
+
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+        return image
+
+    def add(self, key: str, image: bytes) -> None:
+        """
+        Cache an image, evicting the least recently used until the cache
+        fits in its size again. Images bigger than the whole cache aren't
+        kept.
+        """
+
+        if len(image) > self.max_bytes:
+            return
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._cache[key] = image
+        self._bytes += len(image)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drop every cached image from memory. Images in Redis are kept.
+        """
+
+        self._cache.clear()
+        self._bytes = 0
+
+    def nbytes(self) -> int:
+        """
+        Get the total size of the cached images.
+        """
+
+        return self._bytes
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Get the number and total size of the cached images, and how many
+        renders were served from memory, from Redis, or not at all.
+        """
+
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._cache),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class TreeRenderer:
+    """
+    A bounded pool of long-lived workers that render DOT scripts with
+    Graphviz, fed through a priority queue so that higher tiers are
+    drawn first. However many trees are asked for, only ``workers`` are
+    rendered at once; once ``max_queue_size`` are waiting, any more are
+    turned away with a :class:`RenderQueueFull`.
+
+    Scripts are piped into Graphviz and the image is read back from it,
+    so nothing is written to the disk. Rendered images are kept in a
+    :class:`RenderCache` (and, if ``redis_ttl`` is set, in Redis for that
+    many seconds so other clusters can use them), and a script that's
+    already being rendered is only rendered once however many times it's
+    asked for.
+
+    Each render comes with an estimated cost (the size of the family being
+    drawn). Once the queue is at least half full, trees costing
+    ``large_cost`` or more are drawn without antialiasing if they're for a
+    donator, and turned away with a :class:`RenderTooLarge` otherwise.
+
+    The ``workers`` limit is only for this process. If ``tokens`` is given
+    then every render also has to hold a token from that pool, which is
+    shared by every process on the host, so the host as a whole is capped
+    too. Every token being taken also counts as busy.
+    """
+
+    # The prefix for rendered images kept in Redis
+    REDIS_KEY_PREFIX = "TreeRender-"
+
+    def __init__(
+            self,
+            workers: int = 4,
+            max_queue_size: int = 50,
+            timeout: float = 30.0,
+            cache_size: int = 64 * 1024 * 1024,
+            redis_ttl: int = 0,
+            large_cost: int = 250,
+            tokens: Optional[RenderTokenPool] = None):
+        self.worker_count: int = workers
+        self.max_queue_size: int = max_queue_size
+        self.timeout: float = timeout
+        self.large_cost: int = large_cost
+        self.cache: RenderCache = RenderCache(cache_size)
+        self.redis_ttl: int = redis_ttl
+        self.tokens: Optional[RenderTokenPool] = tokens
+        self._in_progress: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = collections.Counter()
+        self._queue: Optional[asyncio.PriorityQueue[RenderJob]] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+        self.waiting: Dict[int, int] = collections.Counter()
+        self.waiting_cost: int = 0
+        self.queue_latencies: Deque[float] = collections.deque(maxlen=QUEUE_LATENCY_SAMPLES)
+        self.active: int = 0
+        self.rendered: int = 0
+        self.failed: int = 0
+        self.rejected: int = 0
+        self.rejected_large: int = 0
+        self.downgraded: int = 0
+        self.timeouts: int = 0
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def start(self) -> None:
+        """
+        Start the workers.
+        """
+
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue(self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.worker_count)
+        ]
+
+    async def stop(self) -> None:
+        """
+        Stop the workers, cancelling anything that's still waiting to
+        be rendered.
+        """
+
+        queue, self._queue = self._queue, None
+        if queue is None:
+            return
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while not queue.empty():
+            queue.get_nowait().future.cancel()
+        self.waiting.clear()
+        self.waiting_cost = 0
+
+    def queue_depth(self) -> int:
+        """
+        Get how many trees are waiting to be rendered.
+        """
+
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def is_busy(self) -> bool:
+        """
+        See whether enough trees are waiting (or, with a host-wide token
+        pool, whether the host is rendering as many trees as it can) that
+        large ones should be held back.
+        """
+
+        if self.queue_depth() >= self.max_queue_size * BUSY_QUEUE_FRACTION:
+            return True
+        if self.tokens is None:
+            return False
+        return await self.tokens.in_use() >= self.tokens.size
+
+    async def render(
+            self,
+            dot: str,
+            *,
+            tier: int = 0,
+            cost: int = 0,
+            format: str = "png:cairo") -> bytes:
+        """
+        Render a DOT script to an image, waiting for a worker to be free.
+
+        Parameters
+        ----------
+        dot : str
+            The DOT script to render.
+        tier : int, optional
+            The priority of the render - trees with a higher tier are
+            rendered before any with a lower one.
+        cost : int, optional
+            An estimate of how much work the render is, as the number of
+            people in the tree.
+        format : str, optional
+            The Graphviz output format to render to. This may be swapped
+            for a quicker one if the tree is large and we're busy.
+
+        Returns
+        -------
+        bytes
+            The rendered image. This is empty if Graphviz couldn't
+            render the script.
+
+        Raises
+        ------
+        RenderQueueFull
+            If there are too many trees waiting to be rendered already.
+        RenderTooLarge
+            If the tree is too large to render while we're busy.
+        asyncio.TimeoutError
+            If Graphviz took too long to render the tree.
+        """
+
+        if self._queue is None:
+            raise RuntimeError("The tree renderer hasn't been started")
+        dot_bytes = dot.encode('utf-8')
+        key = RenderCache.get_key(dot_bytes, format)
+
+        # See if we've drawn it already
+        image = await self._get_cached_render(key)
+        if image is not None:
+            return image
+
+        # If we're busy then large trees are drawn without antialiasing
+        # for donators, and turned away for everyone else
+        downgraded = False
+        if cost >= self.large_cost and await self.is_busy():
+            if tier <= 0:
+                self.rejected += 1
+                self.rejected_large += 1
+                raise RenderTooLarge()
+            downgraded = True
+            format = DOWNGRADED_RENDER_FORMAT
+            key = RenderCache.get_key(dot_bytes, format)
+            image = await self._get_cached_render(key)
+            if image is not None:
+                return image
+        self.cache.misses += 1
+
+        # See if it's being drawn right now, and queue it up if not
+        future = self._in_progress.get(key)
+        if future is None:
+            job = RenderJob(
+                tier,
+                next(self._sequence),
+                cost,
+                dot_bytes,
+                format,
+                asyncio.get_running_loop().create_future(),
+            )
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self.rejected += 1
+                raise RenderQueueFull()
+            self.waiting[tier] += 1
+            self.waiting_cost += cost
+            self.downgraded += downgraded
+            future = self._in_progress[key] = job.future
+            future.add_done_callback(lambda f: self._render_done(key, f))
+
+        # If everyone who asked for it gives up then the render is
+        # cancelled, and the worker skips it
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1:
+                future.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def _render_done(self, key: str, future: asyncio.Future) -> None:
+        """
+        Cache a finished render.
+        """
+
+        self._in_progress.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        image = future.result()
+        if not image:
+            return
+        self.cache.add(key, image)
+        if self.redis_ttl and vbu.RedisConnection.enabled:
+            asyncio.create_task(self._store_cached_render(key, image))
+
+    async def _get_cached_render(self, key: str) -> Optional[bytes]:
+        """
+        Get a rendered image from the local cache, or from Redis if we're
+        keeping them there.
+        """
+
+        image = self.cache.get(key)
+        if image is not None:
+            self.cache.hits += 1
+            return image
+        image = await self._fetch_cached_render(key)
+        if image is not None:
+            self.cache.redis_hits += 1
+            self.cache.add(key, image)
+        return image
+
+    async def _fetch_cached_render(self, key: str) -> Optional[bytes]:
+        """
+        Get a rendered image from Redis, if we're keeping them there.
+        """
+
+        if not self.redis_ttl or not vbu.RedisConnection.enabled:
+            return None
+        try:
+            async with vbu.Redis() as re:
+                return await re.conn.get(f"{self.REDIS_KEY_PREFIX}{key}")
+        except Exception:
+            return None  # The cache is only a shortcut
+
+    async def _store_cached_render(self, key: str, image: bytes) -> None:
+        """
+        Keep a rendered image in Redis for other clusters to use.
+        """
+
+        try:
+            async with vbu.Redis() as re:
+                await re.conn.set(f"{self.REDIS_KEY_PREFIX}{key}", image, expire=self.redis_ttl)
+        except Exception:
+            pass  # The cache is only a shortcut
+
+    async def _worker(self) -> None:
+        """
+        Render trees from the queue, one at a time, forever.
+        """
+
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            job = await queue.get()
+            self.waiting[job.tier] -= 1
+            self.waiting_cost -= job.cost
+            if job.future.done():
+                continue
+
+            # Wait for the host to have room for another render
+            token = None
+            if self.tokens is not None:
+                try:
+                    token = await self.tokens.acquire()
+                except asyncio.CancelledError:
+                    job.future.cancel()
+                    raise
+                if job.future.done():
+                    await self.tokens.release(token)
+                    continue
+            self.queue_latencies.append(time.monotonic() - job.queued_at)
+            self.active += 1
+            try:
+                image = await self._render_job(job)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if image:
+                    self.rendered += 1
+                else:
+                    self.failed += 1
+                if not job.future.done():
+                    job.future.set_result(image)
+            finally:
+                self.active -= 1
+                if self.tokens is not None:
+                    await self.tokens.release(token)
+
+    async def _render_job(self, job: RenderJob) -> bytes:
+        """
+        Run Graphviz for a single job, giving back whatever it wrote.
+        """
+
+        # http://www.graphviz.org/doc/info/output.html#d:png
+        dot = await asyncio.create_subprocess_exec(
+            'dot',
+            f'-T{job.format}',
+            '-Gcharset=UTF-8',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        try:
+            image, _ = await asyncio.wait_for(dot.communicate(job.dot), self.timeout)
+            return image
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            if dot.returncode is None:
+                try:
+                    dot.kill()
+                except ProcessLookupError:
+                    pass  # It already died
+
+                # Reap it (even if we're being cancelled) so that its pipes
+                # are closed before the worker gives back its token
+                try:
+                    await asyncio.wait_for(asyncio.shield(dot.wait()), DOT_KILL_WAIT_SECONDS)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    pass
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Get the worker, queue and outcome counters for the renderer. The
+        queue latencies are how long the most recent renders waited for a
+        worker (and a host-wide token), in milliseconds.
+        """
+
+        latencies = self.queue_latencies
+        return {
+            "workers": self.worker_count,
+            "queue_depth": self.queue_depth(),
+            "queue_cost": self.waiting_cost,
+            "queue_latency_avg_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "queue_latency_max_ms": 1000 * max(latencies) if latencies else 0.0,
+            "active": self.active,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "rejected_large": self.rejected_large,
+            "downgraded": self.downgraded,
+            "timeouts": self.timeouts,
+        }
@@ -8,12 +8,16 @@ __all__ = (
     'ParentageDB',
     'MarriagesDB',
     'FamilyTreeMemberPayload',
+    'FamilyTreeDeltaPayload',
+    'GuildFamiliesPayload',
+    'SharedFamilyStorePayload',
     'GuildPrefixPayload',
     'FamilyMaxMembersPayload',
     'IncestAllowedPayload',
     'MaxChildrenPayload',
     'GifsEnabledPayload',
     'SendUserMessagePayload',
+    'BlockedUserPayload',
     'GuildConfig',
     'MarriageBotConfig',
     'Bot',
@@ -42,6 +46,21 @@ class FamilyTreeMemberPayload(TypedDict):
     guild_id: int
 
 
+class FamilyTreeDeltaPayload(TypedDict):
+    origin: str
+    guild_id: int
+    sequence: int
+    deltas: List[list]
+
+
+class GuildFamiliesPayload(TypedDict):
+    guild_id: int
+
+
+class SharedFamilyStorePayload(TypedDict):
+    watermark: float
+
+
 class GuildPrefixPayload(TypedDict):
     guild_id: int
     prefix: str
@@ -72,6 +91,11 @@ class SendUserMessagePayload(TypedDict):
     content: str
 
 
+class BlockedUserPayload(TypedDict):
+    user_id: int
+    blocked_user_id: int
+
+
 class GuildConfig(TypedDict):
     guild_id: int
     prefix: str
@@ -89,8 +113,23 @@ class APIKeysConfig(TypedDict):
 
 class MarriageBotConfig(vbu.types.BotConfig):
     max_family_members: int
-    tree_file_location: str
     is_server_specific: bool
+    compact_family_cache: bool
+    lazy_load_guild_families: bool
+    family_snapshot_file: str
+    shared_family_store_file: str
+    shared_family_store_owner: bool
+    family_delta_stream: str
+    family_delta_stream_max_length: int
+    name_cache_size: int
+    name_cache_ttl: int
+    tree_render_workers: int
+    tree_render_queue_size: int
+    tree_render_cache_size: int
+    tree_render_cache_redis_ttl: int
+    tree_render_large_family_size: int
+    tree_render_host_workers: int
+    tree_render_token_directory: str
     api_keys: APIKeysConfig
 
 
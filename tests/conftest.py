@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_family_cache():
+    """
+    Make sure every test starts (and leaves) with nobody cached.
+    """
+
+    FamilyTreeMember.all_users.clear()
+    FamilyTreeMember.relation_cache.clear()
+    FamilyTreeMember.generation_cache.clear()
+    yield
+    FamilyTreeMember.all_users.clear()
+    FamilyTreeMember.relation_cache.clear()
+    FamilyTreeMember.generation_cache.clear()
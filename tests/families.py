@@ -0,0 +1,51 @@
+"""
+Helpers for caching families to test against.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, List, Tuple
+import random
+
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+
+__all__ = (
+    'make_family',
+    'make_random_family',
+)
+
+
+def make_family(
+        partnerships: Iterable[Tuple[int, int]] = (),
+        parents: Iterable[Tuple[int, int]] = (),
+        guild_id: int = 0) -> None:
+    """
+    Cache a family from its ``(user_id, partner_id)`` and
+    ``(parent_id, child_id)`` pairs.
+    """
+
+    for user_id, partner_id in partnerships:
+        user = FamilyTreeMember.get(user_id, guild_id)
+        user.add_partner(partner_id, return_added=True).add_partner(user)
+    for parent_id, child_id in parents:
+        parent = FamilyTreeMember.get(parent_id, guild_id)
+        parent.add_child(child_id, return_added=True).parent = parent
+
+
+def make_random_family(size: int, first_id: int, seed: int, guild_id: int = 0) -> List[int]:
+    """
+    Cache a random family where each person is the child or partner of
+    someone added shortly before them, giving back everyone's IDs.
+    """
+
+    rng = random.Random(seed)
+    partnerships, parents = [], []
+    for user_id in range(first_id + 1, first_id + size):
+        other_id = rng.randint(max(first_id, user_id - 20), user_id - 1)
+        if rng.random() < 0.7:
+            parents.append((other_id, user_id))
+        else:
+            partnerships.append((other_id, user_id))
+    make_family(partnerships, parents, guild_id)
+    return list(range(first_id, first_id + size))
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import pytest
+
+from cogs.cache_handler import CacheHandler
+from cogs.utils.family_tree.compact_store import CompactFamilyStore
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+from families import make_family
+
+
+def make_store(guild_id: int) -> CompactFamilyStore:
+    return CompactFamilyStore.from_rows(
+        [{"guild_id": guild_id, "user_id": 1, "partner_id": 2}],
+        [{"guild_id": guild_id, "parent_id": 1, "child_id": 3}],
+    )
+
+
+@pytest.mark.parametrize("is_server_specific", [False, True])
+def test_save_and_load(tmp_path, is_server_specific):
+    filename = str(tmp_path / "store.bin")
+    make_store(5 if is_server_specific else 0).save(filename, 123.5, is_server_specific)
+    loaded = CompactFamilyStore.load(filename)
+    assert loaded is not None
+    store, watermark, loaded_is_server_specific = loaded
+    assert watermark == 123.5
+    assert loaded_is_server_specific is is_server_specific
+    assert list(store.ids) == [1, 2, 3]
+    assert list(store.get_children(0)) == [3]
+
+
+def test_load_rejects_other_versions(tmp_path):
+    filename = str(tmp_path / "store.bin")
+    make_store(0).save(filename, 1.0, False)
+    with open(filename, "r+b") as a:
+        a.seek(len(CompactFamilyStore.MAGIC))
+        a.write((CompactFamilyStore.VERSION - 1).to_bytes(4, "little"))
+    assert CompactFamilyStore.load(filename) is None
+
+
+class Bot:
+
+    def __init__(self, **config):
+        self.config = config
+
+
+@pytest.mark.parametrize("store_is_server_specific, store_guild_id, bot_is_server_specific", [
+    (True, 5, False),  # Written by a server specific bot
+    (False, 0, True),  # Written by the main bot
+    (False, 5, False),  # Has guilds that the main bot doesn't cache
+    (True, 0, True),  # Has guild 0 in a server specific store
+])
+def test_shared_store_for_other_bots_is_rejected(
+        tmp_path,
+        store_is_server_specific,
+        store_guild_id,
+        bot_is_server_specific):
+    filename = str(tmp_path / "store.bin")
+    make_store(store_guild_id).save(filename, 1.0, store_is_server_specific)
+    handler = object.__new__(CacheHandler)
+    handler.bot = Bot(
+        shared_family_store_file=filename,
+        is_server_specific=bot_is_server_specific,
+    )
+    handler.logger = logging.getLogger("test")
+    assert asyncio.run(handler.load_shared_family_store(None, "")) is False
+
+
+class Database:
+    """
+    Answers the queries that remapping the shared store makes, pausing on
+    the family changes query until it's told to carry on.
+    """
+
+    def __init__(self):
+        self.reading = asyncio.Event()
+        self.carry_on = asyncio.Event()
+
+    async def __call__(self, sql: str, *args):
+        if "EXTRACT(EPOCH" in sql:
+            return [{"now": 100.0}]
+        if "family_changes" in sql:
+            self.reading.set()
+            await self.carry_on.wait()
+            return [{"guild_id": 0, "user_id": 1}, {"guild_id": 0, "user_id": 4}]
+        if "marriages" in sql:
+            return [
+                {"guild_id": 0, "user_id": 1, "partner_id": 2},
+                {"guild_id": 0, "user_id": 1, "partner_id": 4},
+            ]
+        return [{"guild_id": 0, "parent_id": 1, "child_id": 3}]
+
+
+def test_remap_keeps_serving_the_old_cache_until_the_swap(tmp_path):
+    filename = str(tmp_path / "store.bin")
+    make_store(0).save(filename, 1.0, False)
+    handler = object.__new__(CacheHandler)
+    handler.bot = Bot(shared_family_store_file=filename)
+    handler.logger = logging.getLogger("test")
+    handler.shared_family_store_watermark = None
+    make_family(partnerships=[(1, 2)], parents=[(1, 3)])
+
+    async def run():
+        db = Database()
+        remap = asyncio.create_task(handler.load_shared_family_store(db, "guild_id = 0"))
+        await db.reading.wait()
+
+        # The old cache is still there while the changes are read, and
+        # updates are held back rather than lost in the swap
+        assert FamilyTreeMember.all_users.get((1, 0)) is not None
+        update = {"discord_id": 3, "children": [6], "parent_id": 1, "partners": [], "guild_id": 0}
+        assert FamilyTreeMember.all_users.defer_update(update)
+        db.carry_on.set()
+        assert await remap
+
+    asyncio.run(run())
+    all_users = FamilyTreeMember.all_users
+    assert all_users.guild(0).store is not None
+    assert sorted(i.id for i in FamilyTreeMember.get(1).partners) == [2, 4]
+    assert [i.id for i in FamilyTreeMember.get(3).children] == [6]
+    assert not all_users.guild(0).loading and all_users.guild(0).loaded
+
+
+@pytest.mark.parametrize("config_key, load", [
+    ("shared_family_store_file", CacheHandler.load_shared_family_store),
+    ("family_snapshot_file", CacheHandler.load_family_snapshot),
+])
+def test_unreadable_files_fall_back_to_the_database(tmp_path, config_key, load):
+    handler = object.__new__(CacheHandler)
+    handler.bot = Bot(**{config_key: str(tmp_path)})  # A directory can't be mapped
+    handler.logger = logging.getLogger("test")
+    assert asyncio.run(load(handler, None, "")) is False
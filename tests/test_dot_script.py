@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import os
+
+import pytest
+
+from cogs.utils.customised_tree_user import CustomisedTreeUser
+from cogs.utils.discord_name_manager import DiscordNameManager
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+from families import make_family
+
+
+# Set this to write the golden files from the current output rather than
+# checking against them
+UPDATE_GOLDEN = bool(os.getenv("UPDATE_GOLDEN"))
+GOLDEN_DIRECTORY = os.path.join(os.path.dirname(__file__), "golden")
+
+
+# Three generations - grandparents, a polycule with children from two of
+# its members, a remarried child whose partner has parents of their own
+# (which only the fulltree shows), and grandchildren
+PARTNERSHIPS = [
+    (10, 11),
+    (20, 21), (21, 22), (22, 20),
+    (30, 31), (31, 32),
+    (50, 51),
+]
+PARENTS = [
+    (10, 20), (11, 23),
+    (20, 30), (20, 33), (22, 34),
+    (30, 40), (32, 41), (33, 42), (33, 43),
+    (50, 31), (50, 52),
+]
+
+
+@pytest.fixture(autouse=True)
+def family():
+    make_family(PARTNERSHIPS, PARENTS)
+    DiscordNameManager.cached_names.clear()
+    user_ids = {i for pair in PARTNERSHIPS + PARENTS for i in pair}
+    for user_id in user_ids:
+        DiscordNameManager.get(user_id).name = f'User "{user_id}"'
+    yield
+    DiscordNameManager.cached_names.clear()
+
+
+CUSTOMISED = dict(
+    edge=0x123456,
+    node=0xABCDEF,
+    font=0x000001,
+    highlighted_font=0xFF0000,
+    highlighted_node=0x00FF00,
+    background=-1,
+    direction="LR",
+)
+
+
+@pytest.mark.parametrize("name, user_id, full, customisation", [
+    ("tree_default", 30, False, {}),
+    ("fulltree_default", 30, True, {}),
+    ("tree_customised", 30, False, CUSTOMISED),
+    ("fulltree_customised", 30, True, CUSTOMISED),
+    ("tree_partner_highlighted", 21, False, {}),
+    ("fulltree_leaf_highlighted", 43, True, CUSTOMISED),
+])
+def test_dot_script_matches_golden(name, user_id, full, customisation):
+    user = FamilyTreeMember.get(user_id)
+    ctu = CustomisedTreeUser(user_id, **customisation)
+    if full:
+        script = asyncio.run(user.to_full_dot_script(None, ctu))
+    else:
+        script = asyncio.run(user.to_dot_script(None, ctu))
+
+    # The same tree has to give the same script every time, including
+    # from the generation cache
+    assert script == asyncio.run(user.to_full_dot_script(None, ctu) if full else user.to_dot_script(None, ctu))
+
+    filename = os.path.join(GOLDEN_DIRECTORY, f"{name}.dot")
+    if UPDATE_GOLDEN:
+        with open(filename, "wb") as a:
+            a.write(script.encode("utf-8"))
+    with open(filename, "rb") as a:
+        assert script.encode("utf-8") == a.read()
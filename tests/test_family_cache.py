@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+from families import make_family
+
+
+PARTNERSHIPS = [(1, 2), (3, 4), (5, 6)]
+PARENTS = [(1, 3), (2, 5), (3, 7), (4, 8)]
+
+
+def test_iter_relations_matches_relations():
+    make_family(PARTNERSHIPS, PARENTS)
+    guild_cache = FamilyTreeMember.all_users.guild(0)
+    partnerships, parents = [], []
+    chunks = sum(1 for _ in guild_cache.iter_relations(partnerships, parents, chunk_size=3))
+    assert chunks == len(guild_cache) // 3
+    assert (partnerships, parents) == guild_cache.relations()
+    assert sorted(partnerships) == PARTNERSHIPS
+    assert sorted(parents) == PARENTS
+
+
+def test_iter_relations_survives_changes_between_chunks():
+    make_family(PARTNERSHIPS, PARENTS)
+    guild_cache = FamilyTreeMember.all_users.guild(0)
+    partnerships, parents = [], []
+    for index, _ in enumerate(guild_cache.iter_relations(partnerships, parents, chunk_size=1)):
+        FamilyTreeMember.get(100 + index).add_child(200 + index, return_added=True).parent = 100 + index
+    assert (1, 3) in parents
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import pytest
+
+from cogs.utils.family_tree.generation_cache import GenerationCache
+from cogs.utils.family_tree.member_lru_cache import MemberLRUCache
+from cogs.utils.family_tree.relation_cache import RelationCache
+
+
+MISSING = object()
+
+
+def test_relation_cache_evicts_least_recently_used():
+    cache = RelationCache(max_size=2)
+    cache.set((0, 1, 2), "partner")
+    cache.set((0, 1, 3), None)
+    assert cache.get((0, 1, 2), MISSING) == "partner"
+    cache.set((0, 2, 3), "child")
+    assert cache.get((0, 1, 3), MISSING) is MISSING
+    assert cache.get((0, 2, 3), MISSING) == "child"
+    assert cache.stats() == {
+        "size": 2,
+        "max_size": 2,
+        "hits": 2,
+        "misses": 1,
+        "evictions": 1,
+        "invalidations": 0,
+    }
+    assert (3, 0) in cache._by_member and (1, 0) in cache._by_member
+
+
+def test_relation_cache_invalidates_both_users():
+    cache = RelationCache()
+    cache.set((0, 1, 2), "partner")
+    cache.set((0, 3, 4), "child")
+    cache.set((1, 1, 2), "parent")
+    cache.invalidate([(2, 0)])
+    assert cache.get((0, 1, 2), MISSING) is MISSING
+    assert cache.get((0, 3, 4), MISSING) == "child"
+    assert cache.get((1, 1, 2), MISSING) == "parent"
+    cache.invalidate_guild(1)
+    assert len(cache) == 1
+    assert set(cache._by_member) == {(3, 0), (4, 0)}
+
+
+def test_generation_cache_tracks_everyone_in_the_tree():
+    cache = GenerationCache(max_size=2)
+    cache.set((0, 1, False), {0: (1,), 1: (2, 3)}, {1: 0, 2: 1, 3: 1})
+    cache.set((0, 5, True), {0: (5, 6)}, {5: 0, 6: 0})
+    cache.invalidate([(3, 0)])
+    assert cache.get((0, 1, False)) is None
+    assert cache.get((0, 5, True)) == ({0: (5, 6)}, {5: 0, 6: 0})
+    assert cache.invalidations == 1
+
+    # Replacing a tree drops the tracking for people no longer in it
+    cache.set((0, 5, True), {0: (5,)}, {5: 0})
+    assert set(cache._by_member) == {(5, 0)}
+    cache.set((1, 5, True), {0: (5,)}, {5: 0})
+    cache.set((1, 7, True), {0: (7,)}, {7: 0})
+    assert cache.evictions == 1
+    assert cache.get((0, 5, True)) is None
+    cache.clear()
+    assert len(cache) == 0 and not cache._by_member
+
+
+def test_subclasses_have_to_say_who_entries_are_about():
+    class NoMembers(MemberLRUCache):
+        pass
+
+    with pytest.raises(TypeError):
+        NoMembers(max_size=1)
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from typing import Iterable, Tuple
+import itertools
+import random
+
+import pytest
+
+from cogs.utils.family_tree.family_tree_member import FamilyTreeMember
+
+from families import make_family, make_random_family
+import reference
+
+
+def follows_steps(user: FamilyTreeMember, target: FamilyTreeMember, steps: Tuple[str, ...]) -> bool:
+    """
+    Whether there's a way of getting from one user to another by following
+    the given steps.
+    """
+
+    people = {user}
+    for step in steps:
+        next_people = set()
+        for person in people:
+            if step == "parent" and person.parent:
+                next_people.add(person.parent)
+            elif step == "partner":
+                next_people.update(person.partners)
+            elif step == "child":
+                next_people.update(person.children)
+        people = next_people
+    return target in people
+
+
+def assert_matches_reference(user_ids: Iterable[int], guild_id: int = 0) -> None:
+    """
+    Check every pair of the given users against the old depth-first
+    search - they have to agree on who's related, and the new path can
+    never be longer than the old one.
+    """
+
+    users = [FamilyTreeMember.get(i, guild_id) for i in user_ids]
+    for user, target in itertools.permutations(users, 2):
+        old = reference.get_unshortened_relation(user, target)
+        steps = user.get_relation_steps(target)
+        assert (steps is None) == (old is None), (user, target)
+        assert user.is_family_with(target) == (old is not None), (user, target)
+        if old is None:
+            continue
+        assert steps is not None
+        assert len(steps) <= len(old.split("'s ")), (user, target)
+        assert follows_steps(user, target, steps), (user, target, steps)
+        assert user.get_unshortened_relation(target) == "'s ".join(steps)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_family(seed):
+    user_ids = make_random_family(40, 1, seed)
+    assert_matches_reference(user_ids)
+
+
+def test_cross_family_pairs():
+    family_a = make_random_family(15, 1, 0)
+    family_b = make_random_family(15, 100, 1)
+    assert_matches_reference(family_a + family_b)
+    user = FamilyTreeMember.get(family_a[0])
+    other = FamilyTreeMember.get(family_b[-1])
+    assert user.get_relation_steps(other) is None
+    assert user.get_relation(other) is None
+
+
+def test_cross_guild_pairs():
+    make_family(partnerships=[(1, 2)], parents=[(1, 3)], guild_id=0)
+    make_family(partnerships=[(1, 2)], parents=[(1, 3)], guild_id=1)
+    user = FamilyTreeMember.get(1, 0)
+    other = FamilyTreeMember.get(3, 1)
+    assert not user.is_family_with(other)
+    assert user.get_relation_steps(other) is None
+
+
+def test_partner_cycles():
+    make_family(
+        partnerships=[
+            (1, 2), (2, 3), (3, 1),  # A three person polycule
+            (4, 5), (5, 6),  # Two children with each other's partners
+            (6, 1),  # A child marrying back into the parents
+        ],
+        parents=[
+            (1, 4), (2, 5), (3, 6),
+            (4, 7), (6, 8), (8, 9),
+        ],
+    )
+    assert_matches_reference(range(1, 10))
+    user = FamilyTreeMember.get(1)
+    assert user.get_relation_steps(FamilyTreeMember.get(6)) == ("partner",)
+
+
+def test_shortest_path_beats_depth_first():
+    make_family(partnerships=[(2, 3), (4, 3)], parents=[(1, 2), (1, 4)])
+    user = FamilyTreeMember.get(2)
+    target = FamilyTreeMember.get(3)
+    assert reference.get_unshortened_relation(user, target) == "parent's child's partner"
+    assert user.get_relation_steps(target) == ("partner",)
+    assert_matches_reference(range(1, 5))
+
+
+def test_dirty_rebuild_after_divorce():
+    make_family(partnerships=[(1, 2)], parents=[(1, 3), (2, 4), (4, 5)])
+    assert FamilyTreeMember.get(1).family_member_count == 5
+
+    # Divorcing splits the family in two
+    FamilyTreeMember.get(1).remove_partner(2)
+    FamilyTreeMember.get(2).remove_partner(1)
+    assert_matches_reference(range(1, 6))
+    assert FamilyTreeMember.get(1).family_member_count == 2
+    assert FamilyTreeMember.get(5).family_member_count == 3
+
+    # And marrying again joins them back up
+    make_family(partnerships=[(3, 4)])
+    assert_matches_reference(range(1, 6))
+    assert FamilyTreeMember.get(1).family_member_count == 5
+
+
+def test_dirty_rebuild_after_disown():
+    user_ids = make_random_family(30, 1, 3)
+    assert_matches_reference(user_ids)
+
+    # Disown a handful of children, checking after every other change and
+    # after a batch of changes with no lookups in between
+    rng = random.Random(3)
+    children = [i for i in user_ids if FamilyTreeMember.get(i).parent]
+    for index, child_id in enumerate(rng.sample(children, 6)):
+        child = FamilyTreeMember.get(child_id)
+        parent = child.parent
+        assert parent
+        parent.remove_child(child)
+        child.parent = None
+        if index % 2:
+            assert_matches_reference(user_ids)
+    assert_matches_reference(user_ids)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import itertools
+
+import pytest
+
+from cogs.utils.family_tree.relationship_string_simplifier import RelationshipStringSimplifier
+
+import reference
+
+
+# Every path of up to this many steps is checked against the old simplifier
+MAX_PATH_LENGTH = 8
+
+
+PATHS = [()] + [
+    path
+    for length in range(1, MAX_PATH_LENGTH + 1)
+    for path in itertools.product(("parent", "partner", "child"), repeat=length)
+]
+
+
+@pytest.mark.parametrize("length", range(MAX_PATH_LENGTH + 1))
+def test_matches_old_simplifier(length):
+    mismatches = []
+    for path in PATHS:
+        if len(path) != length:
+            continue
+        string = "'s ".join(path)
+        expected = reference.RelationshipStringSimplifier.simplify(string)
+        if RelationshipStringSimplifier.simplify_steps(path) != expected:
+            mismatches.append((path, expected, RelationshipStringSimplifier.simplify_steps(path)))
+        elif RelationshipStringSimplifier.simplify(string) != expected:
+            mismatches.append((path, expected, RelationshipStringSimplifier.simplify(string)))
+    assert not mismatches
+
+
+def test_cached_results_match():
+    path = ("parent", "parent", "child", "child")
+    first = RelationshipStringSimplifier.simplify_steps(path)
+    assert RelationshipStringSimplifier.simplify_steps(path) == first == "cousin"
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from cogs.utils.render_tokens import FileRenderTokenPool, RenderTokenPool
+from cogs.utils.tree_renderer import TreeRenderer, RenderTooLarge
+
+
+class CountingRenderer(TreeRenderer):
+    """
+    A renderer that counts how many renders are running rather than
+    running Graphviz.
+    """
+
+    running_now = 0
+    most_at_once = 0
+
+    async def _render_job(self, job) -> bytes:
+        CountingRenderer.running_now += 1
+        CountingRenderer.most_at_once = max(CountingRenderer.most_at_once, CountingRenderer.running_now)
+        await asyncio.sleep(0.02)
+        CountingRenderer.running_now -= 1
+        return job.dot
+
+
+def test_file_pool_is_shared_between_instances(tmp_path):
+    async def run():
+        first = FileRenderTokenPool(str(tmp_path), 2)
+        second = FileRenderTokenPool(str(tmp_path), 2)
+        a = await first.acquire()
+        b = await second.acquire()
+        assert a != b
+        assert await first.in_use() == 2
+        assert await second.in_use() == 2
+
+        # Both tokens are taken, so the next one waits for a release
+        waiting = asyncio.create_task(first.acquire())
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        await second.release(b)
+        assert await asyncio.wait_for(waiting, 1) == b
+        await first.release(a)
+        await first.release(b)
+        assert await second.in_use() == 0
+
+    asyncio.run(run())
+
+
+def test_renderers_share_the_host_cap(tmp_path):
+    CountingRenderer.running_now = CountingRenderer.most_at_once = 0
+
+    async def run():
+        renderers = [
+            CountingRenderer(workers=4, tokens=FileRenderTokenPool(str(tmp_path), 3))
+            for _ in range(2)
+        ]
+        for renderer in renderers:
+            renderer.start()
+        try:
+            images = await asyncio.gather(*(
+                renderers[i % 2].render(f"digraph {{{i}}}")
+                for i in range(16)
+            ))
+        finally:
+            for renderer in renderers:
+                await renderer.stop()
+        assert images == [f"digraph {{{i}}}".encode() for i in range(16)]
+
+    asyncio.run(run())
+    assert CountingRenderer.most_at_once == 3
+
+
+def test_large_trees_are_held_back_while_the_host_is_full(tmp_path):
+    async def run():
+        other = FileRenderTokenPool(str(tmp_path), 1)
+        token = await other.acquire()
+        renderer = CountingRenderer(workers=4, large_cost=10, tokens=FileRenderTokenPool(str(tmp_path), 1))
+        renderer.start()
+        try:
+            assert await renderer.is_busy()
+            with pytest.raises(RenderTooLarge):
+                await renderer.render("digraph {}", cost=10)
+            await other.release(token)
+            assert not await renderer.is_busy()
+            assert await renderer.render("digraph {}", cost=10) == b"digraph {}"
+        finally:
+            await renderer.stop()
+
+    asyncio.run(run())
+
+
+def test_the_base_pool_cant_be_built():
+    with pytest.raises(TypeError):
+        RenderTokenPool(1)  # type: ignore
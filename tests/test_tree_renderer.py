@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import stat
+
+import pytest
+
+from cogs.utils.tree_renderer import TreeRenderer
+
+
+@pytest.fixture
+def slow_dot(tmp_path, monkeypatch):
+    """
+    Put a ``dot`` that never finishes first on the path, and give back
+    every process that the renderer starts.
+    """
+
+    dot = tmp_path / "dot"
+    dot.write_text("#!/bin/sh\nexec sleep 60\n")
+    dot.chmod(dot.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    processes = []
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def record(*args, **kwargs):
+        process = await create_subprocess_exec(*args, **kwargs)
+        processes.append(process)
+        return process
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", record)
+    return processes
+
+
+def test_timed_out_renders_are_reaped(slow_dot):
+    async def run():
+        renderer = TreeRenderer(workers=1, timeout=0.2)
+        renderer.start()
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await renderer.render("digraph {}")
+        finally:
+            await renderer.stop()
+
+    asyncio.run(run())
+    assert len(slow_dot) == 1
+    assert slow_dot[0].returncode is not None
+
+
+def test_cancelled_renders_are_reaped(slow_dot):
+    async def run():
+        renderer = TreeRenderer(workers=1, timeout=30)
+        renderer.start()
+        render = asyncio.create_task(renderer.render("digraph {}"))
+        while not slow_dot:
+            await asyncio.sleep(0.01)
+        await renderer.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await render
+
+    asyncio.run(run())
+    assert slow_dot[0].returncode is not None